@@ -0,0 +1,838 @@
+# -*- coding: utf-8 -*-
+"""
+compile fitted pipelines into numpy-only inference plans for low latency
+scoring of single records
+
+@author: roger luo
+
+function
+-----
+
+compile_pipeline:
+    walk steps of a fitted pipeline (egg. from pipe_main) and return an
+    Inference_plan of precomputed lookups, masks & coefficients
+
+scorecard_sql:
+    return SQL query/view scoring a table in database by CASE WHEN
+    expressions of a fitted pipeline with linear final estimator, egg.
+    'cleanNA_woe5_LogisticRegression'
+
+class
+-----
+
+Inference_plan:
+    score a fixed-order array or a dict record without pandas/sklearn calls;
+    single records are scored by plain python loops over precomputed lists,
+    batches by numpy
+
+supported steps
+-----
+- Split_cls, Woe_encoder, Oht_encoder (drop=None), Ordi_encoder
+- StandardScaler, MinMaxScaler, MaxAbsScaler, RobustScaler
+- feature selectors with get_support (SelectFromModel, RFE,
+  GenericUnivariateSelect)
+- resamplers, skipped as at predict time
+- final estimator: linear classifiers (predict_proba for LogisticRegression,
+  LinearDiscriminantAnalysis & log-loss SGDClassifier), DecisionTree,
+  RandomForest & ExtraTrees classifiers
+
+.. note::
+    object columns are taken as they are, a numeric string of an object
+    column is not converted to number as _check_df of a batch may do; in
+    SQL columns are used as typed in database
+"""
+import re
+import math
+
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from sklearn.preprocessing import (StandardScaler, MinMaxScaler, MaxAbsScaler,
+                                   RobustScaler)
+from sklearn.linear_model import (LogisticRegression, SGDClassifier,
+                                  RidgeClassifier, Perceptron,
+                                  PassiveAggressiveClassifier)
+from sklearn.svm import LinearSVC
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+
+from lw_mlearn.lw_preprocess import (Split_cls, Woe_encoder, Oht_encoder,
+                                     Ordi_encoder, _woe_na)
+
+_NAN = float('nan')
+
+
+class _PASS():
+    '''category of columns passed through by encoders, categories may be None,
+    class is kept by pickle
+    '''
+
+
+_LINEAR = (LogisticRegression, SGDClassifier, RidgeClassifier, Perceptron,
+           PassiveAggressiveClassifier, LinearSVC, LinearDiscriminantAnalysis)
+
+# identifier quote of SQL dialects
+_QUOTES = {'oracle': '"', 'postgresql': '"', 'sqlite': '"', 'mysql': '`'}
+
+
+def compile_pipeline(estimator):
+    '''compile fitted pipeline (or single estimator) into Inference_plan
+
+    parameters
+    ----
+    estimator
+        - fitted pipeline, final step is a supported classifier or a
+        transformer
+
+    return
+    ----
+    Inference_plan
+    '''
+    steps = getattr(estimator, 'steps', [('estimator', estimator)])
+    steps = [(k, v) for k, v in steps if v is not None and v != 'passthrough']
+    final_name, final = steps[-1]
+    if not hasattr(final, 'predict'):
+        final = None
+    else:
+        steps = steps[:-1]
+
+    ops = []
+    labels = None
+    input_labels = None
+    for name, step in steps:
+        if hasattr(step, 'fit_resample') or hasattr(step, 'fit_sample'):
+            continue
+        if isinstance(step, (Split_cls, Woe_encoder, Oht_encoder,
+                             Ordi_encoder)):
+            if not hasattr(step, 'input_labels'):
+                raise ValueError("step '{}' not fitted".format(name))
+            if labels is None:
+                labels = input_labels = list(step.input_labels)
+            op, labels = _compile_clean(step, labels)
+        else:
+            op = _compile_array(step, name)
+            labels = list(range(op.n_out))
+        ops.append(op)
+
+    if final is not None:
+        final = _compile_final(final, final_name)
+    return Inference_plan(input_labels, ops, final, labels)
+
+
+def scorecard_sql(estimator, table, dialect='oracle', score_name='score',
+                  id_cols=None, view=None):
+    '''return SQL scoring table by fitted pipeline with linear final
+    estimator, see Inference_plan.to_sql
+
+    egg. scorecard_sql(ML_model.estimator, 'applicant', dialect=engine)
+    '''
+    return compile_pipeline(estimator).to_sql(table, dialect, score_name,
+                                              id_cols, view)
+
+
+class Inference_plan():
+    '''numpy-only inference plan of a fitted pipeline, see compile_pipeline
+
+    attributes
+    ----
+    input_labels
+        - column names of input in order, None if pipeline starts with
+        array steps (input is positional)
+    feature_names
+        - labels of features fed to final estimator
+    classes_
+        - classes of final estimator
+
+    method
+    ----
+    transform:
+        return 2-D float array fed to final estimator
+    predict_proba:
+        return 2-D array of class probabilities as predict_proba of pipeline
+    decision_function:
+        return decision values of linear final estimator
+    score_record:
+        return probability of positive class (last of classes_) of a single
+        record, fast path for real-time scoring
+    to_sql:
+        return SQL query/view scoring a database table, for linear final
+        estimator
+    '''
+
+    def __init__(self, input_labels, ops, final, feature_names):
+        self.input_labels = input_labels
+        self.ops = ops
+        self.final = final
+        self.feature_names = feature_names
+        self.classes_ = getattr(final, 'classes_', None)
+
+    def transform(self, X):
+        '''return 2-D float array of X transformed by steps before final
+        estimator
+
+        X
+            - DataFrame, 2-D array in order of input_labels, dict record or
+            1-D array of a single record
+        '''
+        if _is_record(X):
+            vals = self._record_vals(X)
+            for op in self.ops:
+                vals = op.record(vals)
+            return np.array([vals], dtype=float)
+        cols, n = self._columns(X)
+        for op in self.ops:
+            cols = op.batch(cols, n)
+        if len(cols) == 0:
+            return np.empty((n, 0))
+        return np.column_stack([_as_float(i) for i in cols])
+
+    def predict_proba(self, X):
+        '''return class probabilities of X, 2-D array of shape
+        (n_samples, n_classes)
+        '''
+        self._check_final('predict_proba')
+        if _is_record(X):
+            return np.array([self.final.record(self._run_record(X))])
+        return self.final.batch(self.transform(X))
+
+    def decision_function(self, X):
+        '''return decision values of X for linear final estimator
+        '''
+        if not isinstance(self.final, _Linear):
+            raise AttributeError('decision_function available only for '
+                                 'linear final estimator')
+        if _is_record(X):
+            return np.array([self.final.decision(self._run_record(X))])
+        return self.final.batch_decision(self.transform(X))
+
+    def score_record(self, record):
+        '''return probability of positive class (last of classes_) of a
+        single record
+
+        record
+            - dict {column: value}, missing keys are treated as NaN; or 1-D
+            sequence in order of input_labels
+        '''
+        self._check_final('predict_proba')
+        return self.final.record(self._run_record(record))[-1]
+
+    def to_sql(self, table, dialect='oracle', score_name='score',
+               id_cols=None, view=None):
+        '''return SQL scoring table in database, each feature is a CASE WHEN
+        expression of input columns, score is probability of positive class
+        (decision value if final estimator has no predict_proba)
+
+        parameters
+        ----
+        table
+            - table name or sub query in parentheses, must have columns of
+            input_labels
+        dialect
+            - 'oracle', 'mysql', 'postgresql', 'sqlite' or SQL_engine
+            instance
+        score_name
+            - column name of score
+        id_cols
+            - list of columns of table selected along with score
+        view
+            - if not None, return 'CREATE VIEW view AS SELECT ...'
+
+        return
+        ----
+        str, SQL statement
+        '''
+        if not isinstance(self.final, _Linear):
+            raise ValueError('to_sql available only for linear final '
+                             'estimator')
+        if self.input_labels is None:
+            raise ValueError('plan has no input_labels to name columns')
+        if hasattr(dialect, '_engine_url'):
+            dialect = dialect._engine_url['dialect']
+        if dialect not in _QUOTES:
+            raise ValueError("dialect must be one of {}".format(
+                list(_QUOTES)))
+        exprs = [_sql_name(i, dialect) for i in self.input_labels]
+        for op in self.ops:
+            exprs = op.sql(exprs)
+        score = self.final.sql(exprs)
+        cols = [_sql_name(i, dialect) for i in (id_cols or [])]
+        cols.append('{} AS {}'.format(score, _sql_name(score_name, dialect)))
+        query = 'SELECT {}\nFROM {}'.format(',\n'.join(cols), table)
+        if view is not None:
+            query = 'CREATE VIEW {} AS\n{}'.format(
+                _sql_name(view, dialect), query)
+        return query
+
+    def _run_record(self, record):
+        vals = self._record_vals(record)
+        for op in self.ops:
+            vals = op.record(vals)
+        return vals
+
+    def _check_final(self, method):
+        if self.final is None:
+            raise AttributeError('pipeline has no final estimator')
+        if method == 'predict_proba' and not self.final.proba:
+            raise AttributeError('{} has no predict_proba'.format(
+                self.final.name))
+
+    def _record_vals(self, record):
+        '''return list of record values in order of input_labels
+        '''
+        if isinstance(record, dict):
+            if self.input_labels is None:
+                raise ValueError('plan has no input_labels, input record as '
+                                 '1-D sequence')
+            return [record.get(i, _NAN) for i in self.input_labels]
+        vals = record.tolist() if hasattr(record, 'tolist') else list(record)
+        self._check_width(len(vals))
+        return vals
+
+    def _columns(self, X):
+        '''return list of 1-D columns in order of input_labels & number of
+        rows
+        '''
+        if isinstance(X, pd.DataFrame):
+            X = X.loc[:, ~X.columns.duplicated()]
+            n = len(X)
+            if self.input_labels is None:
+                self._check_width(X.shape[1])
+                return [X.iloc[:, i].values for i in range(X.shape[1])], n
+            return [X[i].values if i in X.columns else np.full(n, _NAN)
+                    for i in self.input_labels], n
+        X = np.asarray(X)
+        if X.ndim != 2:
+            raise ValueError('X must be 2-D array, got {}-D'.format(X.ndim))
+        self._check_width(X.shape[1])
+        return [X[:, i] for i in range(X.shape[1])], X.shape[0]
+
+    def _check_width(self, n):
+        if self.input_labels is not None and n != len(self.input_labels):
+            raise ValueError('expect {} input columns in order of '
+                             'input_labels, got {}'.format(
+                                 len(self.input_labels), n))
+
+
+def _is_record(X):
+    if isinstance(X, dict):
+        return True
+    if isinstance(X, (pd.DataFrame, pd.Series)):
+        return False
+    return np.ndim(X) == 1
+
+
+def _to_float(v):
+    '''convert scalar to float, NaN if not convertible
+    '''
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return _NAN
+
+
+def _as_float(col):
+    '''convert 1-D array to float array, NaN if not convertible
+    '''
+    if col.dtype.kind in 'biuf':
+        return col.astype(float)
+    return np.array([_to_float(i) for i in col.tolist()], dtype=float)
+
+
+def _take(vals, pos):
+    return [vals[i] if i >= 0 else _NAN for i in pos]
+
+
+def _take_cols(cols, pos, n):
+    return [cols[i] if i >= 0 else np.full(n, _NAN) for i in pos]
+
+
+def _sql_name(name, dialect):
+    '''quote name if it is not a plain identifier, plain names are left
+    unquoted to be case insensitive (egg. upper case in oracle)
+    '''
+    name = str(name)
+    if re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name):
+        return name
+    q = _QUOTES[dialect]
+    return q + name.replace(q, q * 2) + q
+
+
+def _sql_value(v):
+    '''return SQL literal of number or string
+    '''
+    if isinstance(v, str):
+        return "'" + v.replace("'", "''") + "'"
+    v = float(v)
+    if not math.isfinite(v):
+        raise ValueError('{} can not be SQL literal'.format(v))
+    return repr(v)
+
+
+def _sql_eq(e, v):
+    if v is None:
+        return '{} IS NULL'.format(e)
+    return '{} = {}'.format(e, _sql_value(v))
+
+
+def _positions(labels, wanted):
+    '''return positions of wanted labels in labels, -1 for missing
+    '''
+    index = {k: i for i, k in enumerate(labels)}
+    return [index.get(i, -1) for i in wanted]
+
+
+# --steps
+def _compile_clean(step, labels):
+    '''return op & output labels of Base_clean step, input columns are
+    reindexed to step input_labels as _filter_labels does
+    '''
+    pos = _positions(labels, step.input_labels)
+    if isinstance(step, Split_cls):
+        return _Split(step, pos), list(step.out_labels)
+    if isinstance(step, Woe_encoder):
+        op = _Woe(step, pos)
+        return op, op.labels
+    if isinstance(step, Oht_encoder):
+        return _Onehot(step, pos), list(step.out_labels)
+    return _Ordinal(step, pos), list(step.out_labels)
+
+
+def _compile_array(step, name):
+    '''return op of transformer returning array
+    '''
+    if isinstance(step, StandardScaler):
+        n = len(_first(step.scale_, step.mean_))
+        a = 1 / step.scale_ if step.with_std else np.ones(n)
+        b = -step.mean_ * a if step.with_mean else np.zeros(n)
+        return _Affine(a, b)
+    if isinstance(step, MinMaxScaler):
+        return _Affine(step.scale_, step.min_)
+    if isinstance(step, MaxAbsScaler):
+        return _Affine(1 / step.scale_, np.zeros(len(step.scale_)))
+    if isinstance(step, RobustScaler):
+        n = len(_first(step.scale_, step.center_))
+        a = 1 / step.scale_ if step.with_scaling else np.ones(n)
+        b = -step.center_ * a if step.with_centering else np.zeros(n)
+        return _Affine(a, b)
+    if hasattr(step, 'get_support'):
+        return _Select(step.get_support(indices=True))
+    raise ValueError("step '{}' ({}) not supported by compile_pipeline".format(
+        name, step.__class__.__name__))
+
+
+def _first(*arrays):
+    return next(i for i in arrays if i is not None)
+
+
+class _Split():
+    '''Split_cls: output columns in out_labels order, numeric columns
+    converted to float, NaN imputed by fitted imputer values (None of object
+    columns is kept as SimpleImputer does)
+    '''
+
+    def __init__(self, step, pos):
+        index = {k: i for i, k in enumerate(step.input_labels)}
+        objcols, numcols = list(step.objcols), list(step.numcols)
+        self.pos, self.numeric, self.fills = [], [], []
+        for i in step.out_labels:
+            if i in objcols:
+                imputer, k, numeric = step.obj_na, objcols.index(i), False
+            elif i in numcols:
+                imputer, k, numeric = step.num_na, numcols.index(i), True
+            else:
+                raise ValueError("datetime column '{}' of Split_cls not "
+                                 "supported by compile_pipeline".format(i))
+            self.pos.append(pos[index[i]])
+            self.numeric.append(numeric)
+            self.fills.append(None if imputer is None else
+                              imputer.statistics_[k])
+
+    def record(self, vals):
+        out = []
+        for p, numeric, fill in zip(self.pos, self.numeric, self.fills):
+            v = vals[p] if p >= 0 else _NAN
+            if numeric:
+                v = _to_float(v)
+            if fill is not None and v != v:
+                v = fill
+            out.append(v)
+        return out
+
+    def batch(self, cols, n):
+        out = []
+        for col, numeric, fill in zip(_take_cols(cols, self.pos, n),
+                                      self.numeric, self.fills):
+            if numeric:
+                col = _as_float(col)
+                if fill is not None:
+                    col = np.where(np.isnan(col), fill, col)
+            elif fill is not None:
+                col = col.astype(object)
+                col[[i != i for i in col.tolist()]] = fill
+            out.append(col)
+        return out
+
+    def sql(self, exprs):
+        # NULL of object columns is read as None by read_df, not imputed
+        out = []
+        for p, numeric, fill in zip(self.pos, self.numeric, self.fills):
+            e = exprs[p] if p >= 0 else 'NULL'
+            if numeric and fill is not None:
+                e = 'COALESCE({}, {})'.format(e, _sql_value(fill))
+            out.append(e)
+        return out
+
+
+class _Woe():
+    '''Woe_encoder: binned columns looked up by bisect/searchsorted on right
+    bounds of intervals, categories by dict; NaN, out of intervals & unknown
+    categories get woe of NaN category or 0
+    '''
+
+    def __init__(self, step, pos):
+        self.labels, self.pos, self.specs = [], [], []
+        for i, p in zip(step.input_labels, pos):
+            if i not in step.woe_map:
+                continue
+            mapper, na = _woe_na(step.woe_map[i])
+            fill = 0.0 if na is None else float(na)
+            if i in step.edges:
+                # bounds of interval categories are those rounded by pd.cut,
+                # not edges
+                bins = sorted((k for k in mapper if isinstance(k, pd.Interval)),
+                              key=lambda x: x.right)
+                spec = (True, [float(k.left) for k in bins],
+                        [float(k.right) for k in bins],
+                        [float(mapper[k]) for k in bins], fill)
+            else:
+                spec = (False, {k: float(v) for k, v in mapper.items()}, None,
+                        None, fill)
+            self.labels.append(i)
+            self.pos.append(p)
+            self.specs.append(spec)
+
+    def record(self, vals):
+        out = []
+        for p, (binned, left, right, woes, fill) in zip(self.pos,
+                                                         self.specs):
+            v = vals[p] if p >= 0 else _NAN
+            if binned:
+                v = _to_float(v)
+                i = bisect_left(right, v) if v == v else len(right)
+                out.append(woes[i] if i < len(right) and v > left[i] else
+                           fill)
+            else:
+                out.append(left.get(v, fill))
+        return out
+
+    def batch(self, cols, n):
+        out = []
+        for col, (binned, left, right, woes, fill) in zip(
+                _take_cols(cols, self.pos, n), self.specs):
+            if binned:
+                x = _as_float(col)
+                i = np.searchsorted(right, x, side='left')
+                valid = i < len(right)
+                valid[valid] = x[valid] > np.asarray(left)[i[valid]]
+                rst = np.full(n, fill)
+                rst[valid] = np.asarray(woes)[i[valid]]
+            else:
+                rst = np.array([left.get(v, fill) for v in col.tolist()],
+                               dtype=float)
+            out.append(rst)
+        return out
+
+    def sql(self, exprs):
+        out = []
+        for p, (binned, left, right, woes, fill) in zip(self.pos,
+                                                         self.specs):
+            e = exprs[p] if p >= 0 else 'NULL'
+            whens = []
+            if binned:
+                for a, b, w in zip(left, right, woes):
+                    cond = [i for i in ['{} > {}'.format(e, repr(a))
+                                        if a > -np.inf else None,
+                                        '{} <= {}'.format(e, repr(b))
+                                        if b < np.inf else None] if i]
+                    cond = ' AND '.join(cond) or '{} IS NOT NULL'.format(e)
+                    whens.append('WHEN {} THEN {}'.format(cond,
+                                                          _sql_value(w)))
+            else:
+                whens = ['WHEN {} THEN {}'.format(_sql_eq(e, k),
+                                                  _sql_value(w))
+                         for k, w in left.items()]
+            if whens:
+                out.append('CASE {} ELSE {} END'.format(' '.join(whens),
+                                                        _sql_value(fill)))
+            else:
+                out.append(_sql_value(fill))
+        return out
+
+
+class _Onehot():
+    '''Oht_encoder: 1.0 where value equals category, unknown categories are
+    all zeros, other columns passed through
+    '''
+
+    def __init__(self, step, pos):
+        if step.get_params()['drop'] is not None:
+            raise ValueError('Oht_encoder with drop not supported by '
+                             'compile_pipeline')
+        index = {k: i for i, k in enumerate(step.input_labels)}
+        specs = {}
+        fnames = iter(step.encoder_fnames)
+        for col, cats in zip(step.obj_cols, step.encoder.categories_):
+            for c in cats:
+                specs[next(fnames)] = (pos[index[col]], c)
+        for col in step.not_obj:
+            specs[col] = (pos[index[col]], _PASS)
+        self.specs = [specs.get(i, (-1, _PASS)) for i in step.out_labels]
+
+    def record(self, vals):
+        out = []
+        for p, c in self.specs:
+            v = vals[p] if p >= 0 else _NAN
+            out.append(v if c is _PASS else float(v == c))
+        return out
+
+    def batch(self, cols, n):
+        out = []
+        for p, c in self.specs:
+            col = cols[p] if p >= 0 else np.full(n, _NAN)
+            out.append(col if c is _PASS else (col == c).astype(float))
+        return out
+
+    def sql(self, exprs):
+        out = []
+        for p, c in self.specs:
+            e = exprs[p] if p >= 0 else 'NULL'
+            out.append(e if c is _PASS else
+                       'CASE WHEN {} THEN 1 ELSE 0 END'.format(
+                           _sql_eq(e, c)))
+        return out
+
+
+class _Ordinal():
+    '''Ordi_encoder: index of category, unknown categories NaN, other
+    columns passed through
+    '''
+
+    def __init__(self, step, pos):
+        index = {k: i for i, k in enumerate(step.input_labels)}
+        specs = {}
+        for col, cats in zip(step.obj_cols, step.encoder.categories_):
+            specs[col] = (pos[index[col]],
+                          {c: float(i) for i, c in enumerate(cats)})
+        for col in step.not_obj:
+            specs[col] = (pos[index[col]], None)
+        self.specs = [specs.get(i, (-1, None)) for i in step.out_labels]
+
+    def record(self, vals):
+        out = []
+        for p, m in self.specs:
+            v = vals[p] if p >= 0 else _NAN
+            out.append(v if m is None else m.get(v, _NAN))
+        return out
+
+    def batch(self, cols, n):
+        out = []
+        for p, m in self.specs:
+            col = cols[p] if p >= 0 else np.full(n, _NAN)
+            if m is not None:
+                col = np.array([m.get(v, _NAN) for v in col.tolist()],
+                               dtype=float)
+            out.append(col)
+        return out
+
+    def sql(self, exprs):
+        out = []
+        for p, m in self.specs:
+            e = exprs[p] if p >= 0 else 'NULL'
+            if m is not None:
+                e = 'CASE {} END'.format(' '.join(
+                    'WHEN {} THEN {}'.format(_sql_eq(e, k), repr(v))
+                    for k, v in m.items())) if m else 'NULL'
+            out.append(e)
+        return out
+
+
+class _Affine():
+    '''scalers: x * a + b of each column
+    '''
+
+    def __init__(self, a, b):
+        self.a = np.asarray(a, dtype=float)
+        self.b = np.asarray(b, dtype=float)
+        self._ab = list(zip(self.a.tolist(), self.b.tolist()))
+        self.n_out = len(self.a)
+
+    def record(self, vals):
+        self._check(len(vals))
+        return [float(x) * a + b for x, (a, b) in zip(vals, self._ab)]
+
+    def batch(self, cols, n):
+        self._check(len(cols))
+        return [_as_float(c) * a + b for c, a, b in zip(cols, self.a, self.b)]
+
+    def sql(self, exprs):
+        self._check(len(exprs))
+        return ['({}) * {} + {}'.format(e, repr(a), repr(b))
+                for e, (a, b) in zip(exprs, self._ab)]
+
+    def _check(self, n):
+        if n != self.n_out:
+            raise ValueError('scaler expects {} columns, got {}'.format(
+                self.n_out, n))
+
+
+class _Select():
+    '''feature selectors: keep columns of support mask
+    '''
+
+    def __init__(self, indices):
+        self.pos = [int(i) for i in indices]
+        self.n_out = len(self.pos)
+
+    def record(self, vals):
+        return [vals[i] for i in self.pos]
+
+    def batch(self, cols, n):
+        return [cols[i] for i in self.pos]
+
+    def sql(self, exprs):
+        return [exprs[i] for i in self.pos]
+
+
+# --final estimators
+def _compile_final(estimator, name):
+    if isinstance(estimator, _LINEAR):
+        return _Linear(estimator)
+    if isinstance(estimator, DecisionTreeClassifier):
+        return _Trees(estimator, [estimator])
+    if isinstance(estimator, (RandomForestClassifier, ExtraTreesClassifier)):
+        return _Trees(estimator, estimator.estimators_)
+    raise ValueError("final estimator '{}' ({}) not supported by "
+                     "compile_pipeline".format(name,
+                                               estimator.__class__.__name__))
+
+
+def _expit(x):
+    return 1 / (1 + np.exp(-x))
+
+
+class _Linear():
+    '''binary linear classifier: decision = x.coef + intercept, probability
+    by logistic function
+    '''
+
+    def __init__(self, estimator):
+        coef = np.asarray(estimator.coef_, dtype=float)
+        if coef.shape[0] != 1:
+            raise ValueError('only binary linear classifier supported by '
+                             'compile_pipeline')
+        self.name = estimator.__class__.__name__
+        self.classes_ = estimator.classes_
+        self.coef = coef.ravel()
+        self.intercept = float(np.ravel(estimator.intercept_)[0])
+        self._coef = self.coef.tolist()
+        if isinstance(estimator, LogisticRegression):
+            self.proba = True
+            # binary softmax of [-d, d]
+            self.factor = 2.0 if getattr(estimator, 'multi_class', None) \
+                == 'multinomial' else 1.0
+        elif isinstance(estimator, SGDClassifier):
+            self.proba = estimator.loss in ('log', 'log_loss')
+            self.factor = 1.0
+        else:
+            self.proba = isinstance(estimator, LinearDiscriminantAnalysis)
+            self.factor = 1.0
+
+    def decision(self, vals):
+        if len(vals) != len(self._coef):
+            raise ValueError('{} expects {} features, got {}'.format(
+                self.name, len(self._coef), len(vals)))
+        return sum([w * x for w, x in zip(self._coef, vals)], self.intercept)
+
+    def record(self, vals):
+        p = float(_expit(self.factor * self.decision(vals)))
+        return [1 - p, p]
+
+    def batch_decision(self, X):
+        return X.dot(self.coef) + self.intercept
+
+    def batch(self, X):
+        p = _expit(self.factor * self.batch_decision(X))
+        return np.column_stack([1 - p, p])
+
+    def sql(self, exprs):
+        '''return SQL of probability (decision value if no predict_proba),
+        features of 0 coefficient are left out
+        '''
+        if len(exprs) != len(self._coef):
+            raise ValueError('{} expects {} features, got {}'.format(
+                self.name, len(self._coef), len(exprs)))
+        terms = [repr(self.intercept)]
+        terms += ['{} * ({})'.format(repr(w), e)
+                  for w, e in zip(self._coef, exprs) if w != 0]
+        z = '\n + '.join(terms)
+        if not self.proba:
+            return '({})'.format(z)
+        if self.factor != 1:
+            z = '{} * ({})'.format(repr(self.factor), z)
+        return '1.0 / (1.0 + EXP(-({})))'.format(z)
+
+
+class _Trees():
+    '''decision tree or average of forest trees, features compared as float32
+    as sklearn trees do
+    '''
+
+    def __init__(self, estimator, trees):
+        self.name = estimator.__class__.__name__
+        self.classes_ = estimator.classes_
+        self.proba = True
+        self.trees = []
+        for i in trees:
+            t = i.tree_
+            value = t.value[:, 0, :].astype(float)
+            value = value / value.sum(axis=1, keepdims=True)
+            self.trees.append((t.children_left.astype(int),
+                               t.children_right.astype(int),
+                               t.feature.astype(int),
+                               t.threshold.astype(float), value))
+        self._lists = [tuple(a.tolist() for a in i) for i in self.trees]
+
+    def record(self, vals):
+        x = np.asarray(vals, dtype=np.float32).tolist()
+        proba = None
+        for left, right, feature, threshold, value in self._lists:
+            node = 0
+            while left[node] != -1:
+                if x[feature[node]] <= threshold[node]:
+                    node = left[node]
+                else:
+                    node = right[node]
+            if proba is None:
+                proba = list(value[node])
+            else:
+                proba = [a + b for a, b in zip(proba, value[node])]
+        n = len(self._lists)
+        return [i / n for i in proba]
+
+    def batch(self, X):
+        X = X.astype(np.float32).astype(float)
+        rows = np.arange(len(X))
+        proba = 0
+        for left, right, feature, threshold, value in self.trees:
+            node = np.zeros(len(X), dtype=int)
+            active = left[node] != -1
+            while active.any():
+                r, nd = rows[active], node[active]
+                go_left = X[r, feature[nd]] <= threshold[nd]
+                node[r] = np.where(go_left, left[nd], right[nd])
+                active[r] = left[node[r]] != -1
+            proba = proba + value[node]
+        return proba / len(self.trees)
@@ -15,27 +15,49 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import copy
+import time
+import pickle
+import tempfile
+import uuid
 
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from scipy import interp
 from sklearn.utils import validation, check_consistent_length
-from sklearn.base import BaseEstimator
+from sklearn.base import BaseEstimator, clone
 from sklearn.model_selection import _split
 from sklearn.model_selection import (GridSearchCV, RandomizedSearchCV,
                                      cross_val_score, cross_validate)
 from sklearn.model_selection import _validation
-from sklearn.metrics import roc_curve, auc
-from functools import wraps
+from functools import wraps, partial
+from contextlib import nullcontext
+from joblib import load as joblib_load
 from shutil import rmtree
 
-from lw_mlearn.utilis.utilis import get_flat_list, get_kwargs
+from lw_mlearn.utilis.utilis import (get_flat_list, get_kwargs,
+                                     get_fingerprint)
 from lw_mlearn.utilis.plotter import (plotter_auc, plotter_cv_results_, 
-                                      plotter_score_path)
+                                      plotter_score_path, non_interactive)
 from lw_mlearn.utilis.read_write import Objs_management
+from lw_mlearn.utilis.stream import iter_chunks, Chunk_writer
+from lw_mlearn.utilis.dataset import dump_dataset, Dataset_ref
+from lw_mlearn.utilis.memory import get_memory_cache, Memory_cache
+from lw_mlearn.utilis.scheduler import Process_scheduler, limit_n_jobs
+from lw_mlearn.utilis.profiler import (profile_steps, profile_context, 
+                                       profile_records)
 from lw_mlearn.lw_preprocess import (pipe_main, pipe_grid, _binning, 
                             selected_fearturename,
                             plotter_lift_curve, 
-                            get_custom_scorer)
+                            get_custom_scorer, binary_metrics)
 from lw_mlearn.utilis.docstring import Appender, dedent
+from lw_mlearn.lw_search import Halving_search, Tpe_search, Path_search
+
+# artifacts produced under each evaluation mode of ML_model
+_ARTIFACTS = {
+    'full': ('plot', 'sheet', 'data'),
+    'scores': ('data',),
+    'none': (),
+}
 
 class ML_model(BaseEstimator):
     '''quantifying predictions of an estimator
@@ -50,6 +72,21 @@ class ML_model(BaseEstimator):
         - random state seed, 0 default
     pos_label
             - positive label default 1
+    async_write
+        - bool, if True, plots/spreadsheets/pickles are written in background
+        threads, call flush() to wait for them, default False
+    artifacts
+        - str, evaluation mode of run_xxx methods, default 'full'
+        - 'full': dump plots, spreadsheets, datasets and model files, figures
+        are drawn with interactive mode off
+        - 'scores': no figures are constructed and no spreadsheets exported,
+        only datasets and model files are dumped
+        - 'none': no figures and no files, only scores are calculated and 
+        kept in analysis_results
+    profile
+        - bool, if True, estimator is wrapped as Profiled_pipeline recording
+        time & memory of calls of its steps, see profile_results, default 
+        False
        
     attributes
     ----------
@@ -66,6 +103,13 @@ class ML_model(BaseEstimator):
         - averaged score for test set returned by run_anlysis
     trainscore
         - averaged score for train set returned by run_anlysis
+    analysis_results
+        - dict of DataFrames calculated by run_xxx methods, keys:
+        'gridcv', 'search', 'train', 'train_lift', 'test', 'test_lift',
+        'profile'
+    profile_results
+        - DataFrame of time & memory of steps recorded during run_analysis
+        per stage, fold, step & method, if profile=True
     
     method
     ---------
@@ -77,10 +121,19 @@ class ML_model(BaseEstimator):
         perform grid search of param_grid, update self esimator estimator
     rand_searchcv:
         perform randomized search of param_grid, update self estimator
+    halving_searchcv:
+        perform successive halving search of param_grid, update self 
+        estimator
+    bayes_searchcv:
+        perform sequential model-based (tpe) search of param_distributions,
+        update self estimator
     fit:
         perform fit of estimator
     predict:
         perform predict of estimator 
+    score_stream:
+        score data source chunk by chunk in worker processes, stream 
+        results to sink
         
     plot_auc_test:
         plot auc of test data
@@ -90,11 +143,33 @@ class ML_model(BaseEstimator):
         plot lift curve of model
     plot_gridcv:
         plot  grid seach cv results of model
+    flush:
+        wait for background writes, return failed writes
+    load_checkpoint:
+        return instance checkpointed by run_analysis, to resume analysis
+    save:
+        dump estimator, construction settings & self instance into path
+    load:
+        return instance saved under path
+        
+    .. note::
+        continuous predictions of self.estimator are memoized by (fit version,
+        fingerprint of X, method) so that plots & scores of the same dataset 
+        predict only once, cache is cleared by fit/grid_searchcv/rand_searchcv
+        
+    .. note::
+        estimator is dumped once into '.pipe' file by joblib, '.instance' &
+        '.param' files refer to it and estimator of an unpickled instance is
+        read from path on first access
     '''
     @staticmethod
     def from_config(config):
         ''' return ML_model instance from saved configuration parameters
         '''
+        config = dict(config)
+        ref = config.get('estimator')
+        if isinstance(ref, _Estimator_ref):
+            config['estimator'] = ref.load(config.get('path', 'model'))
         return ML_model(**config)
 
     def __init__(self,
@@ -102,7 +177,10 @@ class ML_model(BaseEstimator):
                  path='model',
                  seed=0,
                  verbose=1,
-                 pos_label=1):
+                 pos_label=1,
+                 async_write=False,
+                 artifacts='full',
+                 profile=False):
         ''' if estimator is None, try to read an '.pipe' estimator from path, 
         and if there's no such '.pipe', use a dummy classifier instead
         '''
@@ -110,34 +188,119 @@ class ML_model(BaseEstimator):
         self.verbose = verbose
         self.pos_label = pos_label
         self.seed = seed
+        self.async_write = async_write
+        if artifacts not in _ARTIFACTS:
+            raise ValueError("artifacts must be one of {}, got '{}'".format(
+                list(_ARTIFACTS), artifacts))
+        self.artifacts = artifacts
+        self.profile = profile
         self.gridcv_results = None
+        self.analysis_results = {}
+        self._clear_cache()
 
         if estimator is not None:
             if isinstance(estimator, str):
-                self.estimator = pipe_main(estimator)
+                self.estimator = pipe_main(estimator, profile=profile)
             elif hasattr(estimator, '_estimator_type'):
                 self.estimator = estimator
+                if profile:
+                    self.estimator = profile_steps(estimator)
             else:
                 raise ValueError('invalid estimator input type: {}'.format(
                     estimator.__class__.__name__))
         else:
-            gen, _ = self.folder.read_all(suffix='.pipe')
-            if len(gen) > 0:
-                self.estimator = gen[0]
+            estimator = self.folder.read_all(suffix='.pipe', lazy=True,
+                                             cache_size=0).first()
+            if estimator is not None:
+                self.estimator = estimator
                 print('estimator {} has been read from {}'.format(
                     self.estimator.__class__.__name__, self.folder.path_))
             else:
                 self.estimator = pipe_main('dummy')
                 print('no estimator input, use a dummy classifier ... \n')
 
-    def _shut_temp_folder(self):
-        '''shut temp folder directory
+    def __getstate__(self):
+        '''exclude cached predictions & writer threads from pickled state
+        '''
+        state = dict(super().__getstate__())
+        state.pop('_pre_cache', None)
+        state.pop('_folder', None)
+        return state
+
+    def __setstate__(self, state):
+        '''defer reading of estimator referred to by saved instance until
+        first access
+        '''
+        ref = state.get('estimator')
+        if isinstance(ref, _Estimator_ref):
+            state = dict(state)
+            state['_estimator_ref'] = state.pop('estimator')
+        super().__setstate__(state)
+
+    def __getattr__(self, name):
+        '''read estimator from file under self.path on first access
         '''
-        if getattr(self.estimator, 'memory') is not None:
-            while os.path.exists(self.estimator.memory):
-                rmtree(self.estimator.memory, ignore_errors=True)
+        ref = self.__dict__.get('_estimator_ref')
+        if name == 'estimator' and ref is not None:
+            self.estimator = ref.load(self.path)
+            del self.__dict__['_estimator_ref']
+            return self.estimator
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            self.__class__.__name__, name))
+
+    def _clear_cache(self):
+        '''invalidate cached predictions, to call when estimator is refitted 
+        or replaced
+        '''
+        self._fit_version = getattr(self, '_fit_version', 0) + 1
+        self._pre_cache = OrderedDict()
 
-            print('%s has been removed' % self.estimator.memory)
+    def _predict_cached(self, X, method, max_size=4, fingerprint=None):
+        '''return output of self.estimator's method on X, memoized by 
+        (fit version, fingerprint of X, method); each entry holds the 
+        estimator that produced it and is used only for that same estimator
+        
+        max_size
+            - number of predictions to keep, least recently used dropped
+        fingerprint
+            - fingerprint of X if already computed, see get_fingerprint
+        '''
+        cache = getattr(self, '_pre_cache', None)
+        if cache is None:
+            self._clear_cache()
+            cache = self._pre_cache
+        if fingerprint is None:
+            fingerprint = get_fingerprint(X)
+        key = (self._fit_version, fingerprint, method)
+        entry = cache.get(key)
+        if entry is not None and entry[0] is self.estimator:
+            cache.move_to_end(key)
+        else:
+            entry = (self.estimator, getattr(self.estimator, method)(X))
+            cache[key] = entry
+            cache.move_to_end(key)
+            while len(cache) > max_size:
+                cache.popitem(last=False)
+        return entry[1]
+
+    def _artifact_on(self, kind):
+        '''return True if artifacts of kind ('plot', 'sheet', 'data') are 
+        produced under self.artifacts mode
+        '''
+        return kind in _ARTIFACTS[getattr(self, 'artifacts', 'full')]
+
+    def _shut_temp_folder(self):
+        '''shut temp folder directory, or detach in-memory cache from 
+        estimator (cached steps are kept for other searches & models)
+        '''
+        memory = getattr(self.estimator, 'memory', None)
+        if isinstance(memory, str):
+            while os.path.exists(memory):
+                rmtree(memory, ignore_errors=True)
+            print('%s has been removed' % memory)
+        elif isinstance(memory, Memory_cache) and self.verbose > 0:
+            print('pipeline memory cache: ', memory.stats())
+        if memory is not None:
             self.estimator.memory = None
 
     def _check_fitted(self, estimator):
@@ -156,48 +319,73 @@ class ML_model(BaseEstimator):
             raise ValueError(' estimator should only output binary classes...')
 
         if hasattr(estimator, 'decision_function'):
-            method = getattr(estimator, 'decision_function')
-            y_pre = method(X)
+            method = 'decision_function'
         elif hasattr(estimator, 'predict_proba'):
-            method = getattr(estimator, 'predict_proba')
-            y_pre = method(X)
+            method = 'predict_proba'
         else:
             raise ValueError('estimator have no continuous predictions')
 
+        if estimator is self.estimator:
+            y_pre = self._predict_cached(X, method)
+        else:
+            y_pre = getattr(estimator, method)(X)
+
         if np.ndim(y_pre) > 1:
             y_pre = y_pre[:, self.pos_label]
         return y_pre
 
     def _get_dataset(self, suffix):
-        '''return list of obj read from 'data' folder given suffix type
+        '''return first obj read from 'data' folder given suffix type, 
+        other files are not read
         '''
-        gen, _ = self.folder.read_all(suffix, path='data')
-        if len(gen) == 0:
+        obj = self.folder.read_all(suffix, path='data', lazy=True,
+                                   cache_size=0).first()
+        if obj is None:
             raise FileNotFoundError(
                 "file with '{}' suffix not found in 'data' folder... \n".
                 format(suffix))
-        return gen
+        return obj
+
+    def _write_trainset(self, train_set):
+        '''write train_set into 'data/0.traindata', skipped if the same data
+        has been written by self, egg. by previous stage of run_analysis
+        '''
+        key = get_fingerprint(train_set)
+        if getattr(self, '_trainset_key', None) != key:
+            self.folder.write(train_set, 'data/0.traindata')
+            self._trainset_key = key
 
     def _get_scorer(self, scoring):
-        ''' return sklearn scorer, including custom scorer
+        ''' return sklearn scorer, including custom scorer, see _get_scorer
         '''
-        scorer = {}
-        sk_scoring = []
-        custom_scorer = get_custom_scorer()
-        for i in get_flat_list(scoring):
-            if i in custom_scorer:
-                scorer.update({i: custom_scorer[i]})
-            else:
-                sk_scoring.append(i)
-        if len(sk_scoring) > 0:
-            s, _ = _validation._check_multimetric_scoring(self.estimator,
-                                                          scoring=sk_scoring)
-            scorer.update(s)
-        return scorer
+        return _get_scorer(self.estimator, scoring)
 
     @property
     def folder(self):
-        return Objs_management(self.path)
+        '''read_write object of self.path, kept for the life of self so that
+        background writes can be flushed
+        '''
+        folder = getattr(self, '_folder', None)
+        if folder is None or folder.path_ != os.path.relpath(self.path):
+            if folder is not None:
+                folder.close()
+            max_workers = 2 if getattr(self, 'async_write', False) else None
+            folder = Objs_management(self.path, max_workers=max_workers,
+                                     manifest=True)
+            self._folder = folder
+        return folder
+
+    def flush(self):
+        '''wait for background writes of self.folder to finish
+        
+        return
+        ----
+        list of (file, error) of failed writes
+        '''
+        folder = getattr(self, '_folder', None)
+        if folder is None:
+            return []
+        return folder.flush()
 
     def plot_auc_test(self,
                       X,
@@ -206,7 +394,9 @@ class ML_model(BaseEstimator):
                       groups=None,
                       title=None,
                       ax=None,
-                      save_fig=False):
+                      save_fig=False,
+                      return_splits=False,
+                      plot=True):
         '''plot roc_auc curve for given fitted estimator, must have continuous
         predictons (decision_function or predict_proba) to evaluate model by
         roc_auc metrics(iterables of X, y can be passed or X, y 
@@ -221,46 +411,53 @@ class ML_model(BaseEstimator):
             - if cv>1, generate splits by StratifyKfold method
         title
             - title added to plot header as to indicate (X, y)
+        return_splits
+            - if True, return test data of splits, default False
+        plot
+            - if False, only calculate auc and return None as ax
         return
         --------
         ax, mean-auc, std-auc,
        
         data_splits:
-           list of test data set in the form of DataFrame (combined X & y)
+           list of test data set in the form of DataFrame (combined X & y), 
+           None if return_splits is False
         '''
-        L = locals().copy()
-        L.pop('self')
         estimator = self.estimator
-        # split test set by cv
+        self._check_fitted(estimator)
+        data_splits = [] if return_splits else None
         if cv > 1:
-            xs = []
+            # predict X once, split predictions by cv test index
+            validation.check_consistent_length(X, y)
+            y_pre = self._pre_continueous(estimator, X)
             ys = []
-            data_splits = tuple(
-                _split_cv(X, y=y, cv=cv, groups=groups,
-                          random_state=self.seed))
-            for x_set, y_set in data_splits:
-                xs.append(x_set[1])
-                ys.append(y_set[1])
-            L.update({'X': xs, 'y': ys, 'cv': 1})
-            return self.plot_auc_test(**L)
+            y_pres = []
+            for _, test_index in _cv_index(X, y, groups, cv, self.seed):
+                ys.append(_split.safe_indexing(y, test_index))
+                y_pres.append(y_pre[test_index])
+                if return_splits:
+                    data_splits.append(
+                        _combine_xy(*_take_index(test_index, X, y)))
+        else:
+            xs = get_flat_list(X)
+            ys = get_flat_list(y)
+            validation.check_consistent_length(xs, ys)
+            y_pres = [self._pre_continueous(estimator, x0) for x0 in xs]
+            if return_splits:
+                data_splits = [_combine_xy(*item) for item in zip(xs, ys)]
 
-        self._check_fitted(estimator)
-        X = get_flat_list(X)
-        y = get_flat_list(y)
-        validation.check_consistent_length(X, y)
         fprs = []
         tprs = []
         aucs = []
         n_sample = 0
-        for i in range(len(X)):
-            x0 = X[i]
-            y0 = y[i]
-            y_pre = self._pre_continueous(estimator, x0)
-            fpr, tpr, threshhold = roc_curve(y0, y_pre, drop_intermediate=True)
-            fprs.append(fpr)
-            tprs.append(tpr)
-            aucs.append(auc(fpr, tpr))
-            n_sample += len(x0)
+        for y0, y_pre in zip(ys, y_pres):
+            scores, curve = binary_metrics(y0, y_pre, return_curve=True)
+            fprs.append(curve['fpr'].values)
+            tprs.append(curve['tpr'].values)
+            aucs.append(scores['roc_auc'])
+            n_sample += len(y0)
+        if not plot:
+            return None, np.mean(aucs), np.std(aucs), data_splits
         # -- plot
         if ax is None:
             fig, ax = plt.subplots(1, 1)
@@ -274,11 +471,6 @@ class ML_model(BaseEstimator):
             header = '-'.join([title, header])
         ax.set_title(header)
 
-        data_splits = [
-            pd.concat((pd.DataFrame(i) for i in item), axis=1)
-            for item in zip(X, y)
-        ]
-
         if save_fig is True:
             if isinstance(title, str):
                 plot_name = 'plots/roc_test_' + title + '.pdf'
@@ -296,6 +488,8 @@ class ML_model(BaseEstimator):
                          title=None,
                          ax=None,
                          save_fig=False,
+                         return_splits=False,
+                         plot=True,
                          **fit_params):
         '''fit & plot roc_auc of an estimator, must have continuous
         predictons (to assess hyper parameter settings performance)
@@ -309,6 +503,10 @@ class ML_model(BaseEstimator):
             - if cv>1, generate splits by StratifyKfold method
         title
             - title added to plot header
+        return_splits
+            - if True, return test data of splits, default False
+        plot
+            - if False, only calculate auc and return None as ax
         fit_params
             -other fit parameters
         return
@@ -316,7 +514,8 @@ class ML_model(BaseEstimator):
         ax, mean_auc, std_auc,
         
         data_splits:
-            list of test data set in the form of DataFrame
+            list of test data set in the form of DataFrame, None if 
+            return_splits is False
         '''
 
         estimator = self.estimator
@@ -327,26 +526,27 @@ class ML_model(BaseEstimator):
         fpr_ = []
         tpr_ = []
         mean_fpr = np.linspace(0, 1, 100)
-        data_splits = list(
-            _split_cv(X, y=y, cv=cv, groups=groups, random_state=self.seed))
-
-        for x_set, y_set in data_splits:
-            xx = x_set[0]
-            yy = y_set[0]
-            clf.fit(xx, yy, **fit_params)
+        data_splits = [] if return_splits else None
+        # folds are materialized one at a time, only as clf consumes them
+        for x_set, y_set in _split_cv(X, y=y, cv=cv, groups=groups,
+                                      random_state=self.seed):
+            clf.fit(x_set[0], y_set[0], **fit_params)
             y_pre = self._pre_continueous(clf, x_set[1])
-            fpr, tpr, threshhold = roc_curve(y_set[1],
-                                             y_pre,
-                                             drop_intermediate=True)
+            if return_splits:
+                data_splits.append(_combine_xy(x_set[1], y_set[1]))
+            scores, curve = binary_metrics(y_set[1], y_pre, return_curve=True)
+            fpr = curve['fpr'].values
+            tpr = curve['tpr'].values
             tprs.append(interp(mean_fpr, fpr, tpr))
             fpr_.append(fpr)
             tpr_.append(tpr)
             tprs[-1][0] = 0.0
-            roc_auc = auc(fpr, tpr)
-            aucs.append(roc_auc)
+            aucs.append(scores['roc_auc'])
 
         mean_auc = np.mean(aucs)
         std_auc = np.std(aucs)
+        if not plot:
+            return None, mean_auc, std_auc, data_splits
         # -- plot
         if ax is None:
             fig, ax = plt.subplots(1, 1)
@@ -365,7 +565,7 @@ class ML_model(BaseEstimator):
                 plot_name = 'plots/roc_train.pdf'
             self.folder.write(plt.gcf(), plot_name)
             plt.close()
-        return ax, mean_auc, std_auc, _get_splits_combined(data_splits)
+        return ax, mean_auc, std_auc, data_splits
 
     def plot_lift(self,
                   X,
@@ -378,6 +578,7 @@ class ML_model(BaseEstimator):
                   ax=None,
                   title=None,
                   save_fig=False,
+                  plot=True,
                   **tree_kwargs):
         '''plot list curve of (X, y) data, update self bins
         
@@ -409,6 +610,8 @@ class ML_model(BaseEstimator):
             - if True/None return arrays of labels (or can be passed )       
         title
             - title XXX of plot, output format: 'XXX' + estimator's name
+        plot
+            - if False, only calculate lift data & bins and return None as ax
         return
         ----
         ax,  plotted_data;
@@ -431,7 +634,7 @@ class ML_model(BaseEstimator):
         if not (title is None):
             header = ' - '.join([title, header])
 
-        if ax is None:
+        if ax is None and plot:
             fig, ax = plt.subplots(1, 1)
         ax, y_cut, bins, plotted_data = plotter_lift_curve(
             y_pre,
@@ -442,19 +645,22 @@ class ML_model(BaseEstimator):
             max_leaf_nodes=max_leaf_nodes,
             labels=labels,
             ax=ax,
+            plot=plot,
             **tree_kwargs)
         # update self bins
         self.estimator.bins = bins
 
-        if save_fig is True:
+        if save_fig is True and plot:
             title = 0 if title is None else str(title)
             self.folder.write(plt.gcf(), 'plots/lift{}.pdf'.format(title))
             plt.close()
         return ax, plotted_data
 
-    def plot_gridcv(self, title=None, save_fig=False):
+    def plot_gridcv(self, title=None, save_fig=False, plot=True):
         '''plot grid seatch cv results
         '''
+        if not plot:
+            return
         header = '-'.join([_get_estimator_name(self.estimator), 'gridcv'])
         if title is None:
             pass
@@ -517,19 +723,17 @@ class ML_model(BaseEstimator):
     def test_score(self, X, y, cv, scoring):
         '''return test scores of estimator 
         '''
-        # test scores
-        data_splits = _split_cv(X, y=y, cv=cv, random_state=self.seed)
-        # get_scorers = _validation._check_multimetric_scoring
-        # scorer, _ = get_scorers(self.estimator, scoring=scoring)
-        # is_multimetric = not callable(scorer)
+        # test scores, X predicted once and scored by cv test index
+        self._check_fitted(self.estimator)
+        validation.check_consistent_length(X, y)
         scorer = self._get_scorer(scoring)
         is_multimetric = not callable(scorer)
+        proxy = _Prediction_proxy(self, X)
         scores = []
-        for item in data_splits:
-            x0 = item[0][1]
-            y0 = item[1][1]
+        for _, test_index in _cv_index(X, y, cv=cv, random_state=self.seed):
+            y0 = _split.safe_indexing(y, test_index)
             scores.append(
-                _validation._score(self.estimator, x0, y0, scorer,
+                _validation._score(proxy, test_index, y0, scorer,
                                    is_multimetric))
         scores = pd.DataFrame(scores).reset_index(drop=True)
         return scores
@@ -545,10 +749,17 @@ class ML_model(BaseEstimator):
                       return_train_score=True,
                       n_jobs=2,
                       fit_params={},
+                      warm_path=False,
                       **kwargs):
         '''tune hyper parameters of estimator by searching param_grid
         , update self.estimator & self.gridcv_results
         
+        warm_path
+            - if True and param_grid searches n_estimators of an ensemble, 
+            evaluate n_estimators along path (see Path_search), fitting the
+            largest ensemble once per fold, else use GridSearchCV;
+            default False
+        
         return
         -----
         cv_results as DataFrame
@@ -560,15 +771,22 @@ class ML_model(BaseEstimator):
         scorer = self._get_scorer(scoring)
         # --
         estimator = self.estimator
-        grid = GridSearchCV(estimator,
-                            scoring=scorer,
-                            **get_kwargs(GridSearchCV, **L),
-                            **kwargs)
+        if warm_path and Path_search.applicable(estimator, param_grid):
+            grid = Path_search(estimator,
+                               scoring=scorer,
+                               verbose=self.verbose,
+                               **get_kwargs(Path_search, **L, **kwargs))
+        else:
+            grid = GridSearchCV(estimator,
+                                scoring=scorer,
+                                **get_kwargs(GridSearchCV, **L),
+                                **kwargs)
 
         grid.fit(X, y, **fit_params)
         cv_results = pd.DataFrame(grid.cv_results_)
         self.estimator = grid.best_estimator_
         self.gridcv_results = cv_results
+        self._clear_cache()
         return cv_results
 
     @wraps(RandomizedSearchCV)
@@ -599,12 +817,105 @@ class ML_model(BaseEstimator):
         grid.fit(X, y, **fit_params)
         cv_results = pd.DataFrame(grid.cv_results_)
         self.set_params(estimator=grid.best_estimator_)
+        self._clear_cache()
         return cv_results
 
+    def halving_searchcv(self,
+                         X,
+                         y,
+                         param_grid,
+                         scoring='roc_auc',
+                         cv=3,
+                         refit='roc_auc',
+                         factor=3,
+                         resource='auto',
+                         min_resources=None,
+                         return_train_score=True,
+                         n_jobs=2,
+                         fit_params={},
+                         **kwargs):
+        '''tune hyper parameters of estimator by successive halving search of
+        param_grid over n_samples or n_estimators (see Halving_search), 
+        update self.estimator & self.gridcv_results
+        
+        return
+        -----
+        cv_results as DataFrame, 1 row per candidate at the last rung it 
+        reached
+        '''
+        L = locals().copy()
+        L.pop('self')
+        L.pop('fit_params')
+        L.pop('scoring')
+        scorer = self._get_scorer(scoring)
+        # --
+        grid = Halving_search(self.estimator,
+                              scoring=scorer,
+                              random_state=self.seed,
+                              verbose=self.verbose,
+                              **get_kwargs(Halving_search, **L),
+                              **kwargs)
+        grid.fit(X, y, **fit_params)
+        self.estimator = grid.best_estimator_
+        self.gridcv_results = grid.cv_results_
+        self.search_summary = {
+            'n_candidates': grid.n_candidates_,
+            'n_evaluated': grid.n_evaluated_,
+            'n_skipped': grid.n_skipped_,
+            'n_fits': grid.n_fits_,
+            'cost_ratio': grid.cost_ratio_
+        }
+        self._clear_cache()
+        return grid.cv_results_
+
+    def bayes_searchcv(self,
+                       X,
+                       y,
+                       param_distributions,
+                       scoring='roc_auc',
+                       cv=3,
+                       refit='roc_auc',
+                       n_iter=30,
+                       batch_size=2,
+                       n_initial=10,
+                       time_budget=None,
+                       return_train_score=True,
+                       n_jobs=2,
+                       fit_params={},
+                       **kwargs):
+        '''tune hyper parameters of estimator by tree-structured parzen 
+        estimator search of param_distributions (see Tpe_search), batches of
+        batch_size candidates are evaluated in parallel until n_iter 
+        candidates or time_budget seconds, update self.estimator & 
+        self.gridcv_results
+        
+        return
+        -----
+        cv_results as DataFrame
+        '''
+        L = locals().copy()
+        L.pop('self')
+        L.pop('fit_params')
+        L.pop('scoring')
+        scorer = self._get_scorer(scoring)
+        # --
+        grid = Tpe_search(self.estimator,
+                          scoring=scorer,
+                          random_state=self.seed,
+                          verbose=self.verbose,
+                          **get_kwargs(Tpe_search, **L),
+                          **kwargs)
+        grid.fit(X, y, **fit_params)
+        self.estimator = grid.best_estimator_
+        self.gridcv_results = grid.cv_results_
+        self._clear_cache()
+        return grid.cv_results_
+
     def fit(self, X, y, **fit_params):
         '''perform fit of estimator
         '''
         self.estimator.fit(X, y, **fit_params)
+        self._clear_cache()
         return self
 
     def predit(self,
@@ -637,6 +948,77 @@ class ML_model(BaseEstimator):
                                    labels=False)
         return y_pre
 
+    def score_stream(self,
+                     source,
+                     chunksize=100000,
+                     n_jobs=1,
+                     sink=None,
+                     pre_method='predict_proba',
+                     pre_level=False,
+                     pos_label=1,
+                     id_cols=None):
+        '''score source by chunks of rows with fitted estimator, in bounded 
+        memory, results are streamed to sink in order of source
+        
+        source
+            - '.csv'/'.parquet' file, (SQL_engine, sql) tuple, DataFrame or
+            iterable of DataFrames, see utilis.stream.iter_chunks
+        chunksize
+            - number of rows of each chunk
+        n_jobs
+            - number of worker processes, -1 to use all cpus, default 1 to 
+            score in this process; at most 2 * n_jobs chunks are in flight
+        sink
+            - None, return DataFrame of all results
+            - '.csv'/'.parquet' file, (SQL_engine, table name) tuple or 
+            callable, see utilis.stream.Chunk_writer
+        pre_method, pos_label
+            - see predit
+        pre_level
+            - if True, add 'level' of score banded by self.estimator.bins
+        id_cols
+            - columns of source to keep in results, not passed to estimator
+            
+        return
+        ----
+        DataFrame of id_cols, 'score' (& 'level') if sink is None, else
+        number of rows scored
+        '''
+        self._check_fitted(self.estimator)
+        bins = None
+        if pre_level:
+            bins = getattr(self.estimator, 'bins', None)
+            if bins is None:
+                raise ValueError("'self.estimator.bins' is None, run "
+                                 "run_train/plot_lift first for pre_level")
+        id_cols = [] if id_cols is None else get_flat_list(id_cols)
+        args = (pre_method, pos_label, bins, id_cols)
+        n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        writer = Chunk_writer(sink)
+        try:
+            if n_jobs is None or n_jobs == 1:
+                for X in iter_chunks(source, chunksize):
+                    writer.write(_score_chunk(self.estimator, X, *args))
+            else:
+                token = uuid.uuid4().hex
+                score = partial(_pool_score_chunk, token)
+                pool = ProcessPoolExecutor(
+                    n_jobs, 
+                    initializer=_init_scorer,
+                    initargs=(token, pickle.dumps(self.estimator)))
+                with pool:
+                    pending = deque()
+                    for X in iter_chunks(source, chunksize):
+                        pending.append(pool.submit(score, X, *args))
+                        if len(pending) >= 2 * n_jobs:
+                            writer.write(pending.popleft().result())
+                    while pending:
+                        writer.write(pending.popleft().result())
+        finally:
+            rst = writer.close()
+        print('{} rows scored \n'.format(writer.n_rows))
+        return rst
+
     def run_train(self,
                   train_set=None,
                   title='Train',
@@ -647,6 +1029,7 @@ class ML_model(BaseEstimator):
                   fit_params={},
                   cv=3,
                   save_fig=True,
+                  save_splits=False,
                   **kwargs):
         '''
         - run train performance of an estimator; 
@@ -659,6 +1042,8 @@ class ML_model(BaseEstimator):
            n of cross validation folder, if cv==1, no cross validation        
         fit_params
             -other fit parameters of estimator
+        save_splits:
+            if True, dump test data of cv splits to spreadsheet, default False
             
         return
         ----
@@ -667,19 +1052,25 @@ class ML_model(BaseEstimator):
         '''
         L = locals().copy()
         L.pop('self')
+        L['plot'] = plot = self._artifact_on('plot')
+        L['save_fig'] = save_fig = save_fig and plot
         folder = self.folder
         # --
         title = title if title is not None else 0
         if train_set is None:
-            train_set = self._get_dataset('.traindata')[0]
-        else:
-            folder.write(train_set, 'data/0.traindata')
+            train_set = self._get_dataset('.traindata')
+        elif self._artifact_on('data'):
+            self._write_trainset(train_set)
 
         # trainning
         X = train_set[0]
         y = train_set[1]
-        traincv = self.plot_auc_traincv(
-            X, y, **get_kwargs(self.plot_auc_traincv, **L), **fit_params)
+        traincv = self.plot_auc_traincv(X,
+                                        y,
+                                        return_splits=save_splits,
+                                        **get_kwargs(self.plot_auc_traincv,
+                                                     **L),
+                                        **fit_params)
 
         self.fit(X, y, **fit_params)
         if any([max_leaf_nodes, q, bins]):
@@ -692,17 +1083,21 @@ class ML_model(BaseEstimator):
 
         cv_score = self.cv_validate(X, y, **get_kwargs(self.cv_validate, **L),
                                     **kwargs)
-        if self.verbose > 0:
-            print('train data & cv_score & cv_splits data are being saved...')
+        self.analysis_results.update(train=cv_score, train_lift=lift)
+        if self.verbose > 0 and self._artifact_on('sheet'):
+            print('train data & cv_score are being saved...')
             folder.write([lift, cv_score],
                          'spreadsheet/TrainPerfomance{}.xlsx'.format(title),
                          sheet_name=['liftcurve', 'train_score'])
-            folder.write(traincv[-1],
-                         'spreadsheet/TrainSplits{}.xlsx'.format(title))
-        fig = plotter_score_path(cv_score, title='TrainScore_path')
-        if save_fig is True:
-            folder.write(fig, 'plots/TrainScore_path.pdf')
-            plt.close()
+            if save_splits:
+                print('cv_splits data are being saved...')
+                folder.write(traincv[-1],
+                             'spreadsheet/TrainSplits{}.xlsx'.format(title))
+        if plot:
+            fig = plotter_score_path(cv_score, title='TrainScore_path')
+            if save_fig is True:
+                folder.write(fig, 'plots/TrainScore_path.pdf')
+                plt.close()
         return cv_score.mean()
 
     def run_test(self,
@@ -712,6 +1107,7 @@ class ML_model(BaseEstimator):
                  cv=3,
                  scoring=['roc_auc', 'KS', 'average_precision'],
                  save_fig=True,
+                 save_splits=False,
                  **kwargs):
         '''
         - run test performance of an estimator; 
@@ -722,6 +1118,8 @@ class ML_model(BaseEstimator):
             2 element tuple (X_test, y_test) or list of them
         title:
             title for test_set indicator
+        save_splits:
+            if True, dump test data of cv splits to spreadsheet, default False
         
         return
         ----
@@ -730,12 +1128,14 @@ class ML_model(BaseEstimator):
         L = locals().copy()
         L.pop('self')
         L.pop('title')
+        L['plot'] = plot = self._artifact_on('plot')
+        L['save_fig'] = save_fig = save_fig and plot
         folder = self.folder
         # --
 
         r = 0
         if test_set is None:
-            test_set, title = self._get_dataset('.testdata')[0]
+            test_set, title = self._get_dataset('.testdata')
             r -= 1
 
         test_set_list = get_flat_list(test_set)
@@ -744,11 +1144,12 @@ class ML_model(BaseEstimator):
         else:
             title_list = [str(i) for i in range(len(test_set_list))]
         check_consistent_length(test_set_list, title_list)
-        if r == 0:
+        if r == 0 and self._artifact_on('data'):
             folder.write([test_set_list, title_list],
                          'data/{}.testdata'.format(len(title_list)))
 
         testscore = []
+        testlift = []
         for i, j in zip(test_set_list, title_list):
             # test performance
             X_test = i[0]
@@ -757,6 +1158,7 @@ class ML_model(BaseEstimator):
             testcv = self.plot_auc_test(X_test,
                                         y_test,
                                         title=j,
+                                        return_splits=save_splits,
                                         **get_kwargs(self.plot_auc_test, **L,
                                                      **kwargs))
             # plot lift curve
@@ -769,26 +1171,34 @@ class ML_model(BaseEstimator):
             scores = self.test_score(X_test, y_test, cv=cv, scoring=scoring)
             scores['group'] = str(j)
             testscore.append(scores)
-            if self.verbose > 0:
-                print(
-                    'test cv_score & cv_splits test data are being saved... ')
-                folder.write(testcv[-1],
-                             file='spreadsheet/TestSplits{}.xlsx'.format(j))
-                if test_lift is None: 
-                    lift=pd.DataFrame()
-                else:
-                    lift = test_lift[-1]
+            if test_lift is None: 
+                lift=pd.DataFrame()
+            else:
+                lift = test_lift[-1].assign(group=str(j))
+            testlift.append(lift)
+            if self.verbose > 0 and self._artifact_on('sheet'):
+                print('test cv_score are being saved... ')
+                if save_splits:
+                    print('cv_splits test data are being saved... ')
+                    folder.write(
+                        testcv[-1],
+                        file='spreadsheet/TestSplits{}.xlsx'.format(j))
                 folder.write(
                     [lift, scores],
                     sheet_name=['lift_curve', 'test_score'],
                     file='spreadsheet/TestPerfomance{}.xlsx'.format(j))
 
         testscore_all = pd.concat(testscore, axis=0, ignore_index=True)
-        fig = plotter_score_path(testscore_all, title='score_path')
-        if save_fig is True:
-            folder.write(fig, 'plots/TestScore_path.pdf')
-            plt.close()
-        if self.verbose > 0 and len(testscore) > 1:
+        self.analysis_results.update(
+            test=testscore_all,
+            test_lift=pd.concat(testlift, axis=0, ignore_index=True))
+        if plot:
+            fig = plotter_score_path(testscore_all, title='score_path')
+            if save_fig is True:
+                folder.write(fig, 'plots/TestScore_path.pdf')
+                plt.close()
+        if (self.verbose > 0 and len(testscore) > 1 
+                and self._artifact_on('sheet')):
             folder.write(testscore_all, 'spreadsheet/TestPerformanceAll.xlsx')
 
         return testscore_all[scoring].mean()
@@ -802,6 +1212,8 @@ class ML_model(BaseEstimator):
                         fit_params={},
                         n_jobs=2,
                         save_fig=True,
+                        search='grid',
+                        warm_path=False,
                         **kwargs):
         '''
         - run sensitivity of param_grid (if param_grid=-1, use pre-difined); 
@@ -815,8 +1227,15 @@ class ML_model(BaseEstimator):
         param_grid:
             parameter grid space, if -1, use pipe_grid() to return predifined 
             param_grid
+        search:
+            'grid', exhaustive grid search of each sub param_grid
+            'halving', successive halving search of each sub param_grid, see
+            halving_searchcv
+        warm_path:
+            if True, sub param_grid of n_estimators is evaluated along path
+            by grid search, see grid_searchcv, default False
         **kwargs:
-            GridSearchCV keywords
+            GridSearchCV or Halving_search keywords
         '''
 
         L = locals().copy()
@@ -825,9 +1244,9 @@ class ML_model(BaseEstimator):
         folder = self.folder
         #--
         if train_set is None:
-            train_set = self._get_dataset('.traindata')[0]
-        else:
-            folder.write(train_set, 'data/0.traindata')
+            train_set = self._get_dataset('.traindata')
+        elif self._artifact_on('data'):
+            self._write_trainset(train_set)
 
         if param_grid is -1:
             param_grid = []
@@ -840,27 +1259,52 @@ class ML_model(BaseEstimator):
             print('no param_grid found, skip grid search')
             return
 
-        # memory cache
+        # in-memory cache of fitted pipeline steps, shared by sub-grids,
+        # models & run_analy iterations in this process
         if hasattr(self.estimator, 'memory'):
-            self.estimator.memory = os.path.relpath(
-                os.path.join(self.folder.path_, 'tempfolder'))
+            self.estimator.memory = get_memory_cache()
+
+        if search == 'grid':
+            search_cv = self.grid_searchcv
+        elif search == 'halving':
+            search_cv = self.halving_searchcv
+        else:
+            raise ValueError("search must be 'grid' or 'halving', got '{}'"
+                             .format(search))
 
         X, y = train_set
         cv_results = []
+        summary = []
         for i, grid in enumerate(get_flat_list(param_grid)):
-            self.grid_searchcv(X,
-                               y=y,
-                               param_grid=grid,
-                               **get_kwargs(self.grid_searchcv, **L),
-                               **kwargs)
-            self.plot_gridcv(save_fig=save_fig, title=str(i))
+            search_cv(X,
+                      y=y,
+                      param_grid=grid,
+                      **get_kwargs(search_cv, **L),
+                      **kwargs)
+            self.plot_gridcv(save_fig=save_fig, title=str(i),
+                             plot=self._artifact_on('plot'))
             cv_results.append(self.gridcv_results)
-
-        print('sensitivity results are being saved... ')
-        title = 0 if title is None else str(title)
-        folder.write(cv_results,
-                     'spreadsheet/GridcvResults{}.xlsx'.format(title))
-        self.save()
+            if search == 'halving':
+                summary.append(self.search_summary)
+            else:
+                n = len(self.gridcv_results)
+                summary.append({'n_candidates': n, 'n_evaluated': n,
+                                'n_skipped': 0})
+
+        summary = pd.DataFrame(summary)
+        print('{} of {} candidates evaluated, {} skipped by {} search \n'
+              .format(summary['n_evaluated'].sum(),
+                      summary['n_candidates'].sum(),
+                      summary['n_skipped'].sum(), search))
+        self.analysis_results['gridcv'] = cv_results
+        self.analysis_results['search'] = summary
+        if self._artifact_on('sheet'):
+            print('sensitivity results are being saved... ')
+            title = 0 if title is None else str(title)
+            folder.write(cv_results,
+                         'spreadsheet/GridcvResults{}.xlsx'.format(title))
+        if self._artifact_on('data'):
+            self.save()
         self._shut_temp_folder()
 
     def run_analysis(self,
@@ -874,6 +1318,8 @@ class ML_model(BaseEstimator):
                      grid_search=True,                    
                      train_test=True,
                      scoring=['roc_auc', 'KS'],
+                     n_jobs=2,
+                     checkpoint=None,
                      ):
         '''run analysis of estimator
         
@@ -897,6 +1343,16 @@ class ML_model(BaseEstimator):
         train_test bool:
             if True, perform run_train & run_test
         
+        n_jobs:
+            number of jobs of grid search
+        
+        checkpoint:
+            if not None, key of checkpoint, self is saved (see save) with 
+            the key & done stages after each stage (sensitivity, train, 
+            test), calling again with the same key on instance returned by
+            load_checkpoint resumes from the unfinished stages; nothing is
+            saved if artifacts is 'none'
+        
         q
             - number of equal frequency 
         bins
@@ -910,53 +1366,201 @@ class ML_model(BaseEstimator):
         
         return
         ------
-            self instance
+            self instance, calculated scores are kept in self.analysis_results
         
         '''
+        L = locals().copy()
+        L.pop('self')
+        if checkpoint is None or \
+                getattr(self, '_checkpoint_key', None) != checkpoint:
+            self._stages_done = []
+            self.analysis_results = {}
+            profile_records(clear=True, model=self.path)
+        self._checkpoint_key = checkpoint
+        if self._artifact_on('plot'):
+            # figures are only dumped to files, no need to render them
+            with non_interactive():
+                self._run_analysis(**L)
+        else:
+            self._run_analysis(**L)
+        return self
+
+    def _run_analysis(self, train_set, test_set, test_title, max_leaf_nodes,
+                      q, bins, cv, grid_search, train_test, scoring, n_jobs,
+                      checkpoint):
+        '''steps of run_analysis, stages in self._stages_done are skipped
+        '''
+        stages = []
         if grid_search:
-            self.run_sensitivity(train_set, scoring=scoring)
-        
+            stages.append('sensitivity')
         if train_test:
+            stages.append('train')
+            if test_set is None:
+                print('no test_set, skip run_test method ...\n')
+            else:
+                stages.append('test')
+        todo = [i for i in stages if i not in self._stages_done]
+        if len(todo) < len(stages):
+            print('stages {} done, skipped \n'.format(self._stages_done))
+
+        for stage in todo:
+            if getattr(self, 'profile', False):
+                context = profile_context(model=self.path, stage=stage)
+            else:
+                context = nullcontext()
+            with context:
+                self._run_stage(stage, train_set, test_set, test_title, 
+                                max_leaf_nodes, q, bins, cv, scoring, n_jobs)
+            self._stages_done.append(stage)
+            if checkpoint is not None and self._artifact_on('data'):
+                self.save()
+        
+        if getattr(self, 'profile', False):
+            profile = self.profile_results
+            self.analysis_results['profile'] = profile
+            if self._artifact_on('sheet') and len(profile) > 0:
+                self.folder.write(profile, 'spreadsheet/ProfileSteps.xlsx')
+
+        if self._artifact_on('data') and checkpoint is None:
+            self.save()
+
+    def _run_stage(self, stage, train_set, test_set, test_title, 
+                   max_leaf_nodes, q, bins, cv, scoring, n_jobs):
+        '''run one stage of run_analysis
+        '''
+        if stage == 'sensitivity':
+            self.run_sensitivity(train_set, scoring=scoring, n_jobs=n_jobs)
+        elif stage == 'train':
             self.trainscore = self.run_train(train_set,
                                              cv=cv,
                                              q=q,
                                              bins=bins,
                                              max_leaf_nodes=max_leaf_nodes)
             print('cv score = \n', self.trainscore, '\n')
-    
-            if test_set is None:
-                print('no test_set, skip run_test method ...\n')
-            else:
-                self.testscore = self.run_test(test_set,
-                                               title=test_title,
-                                               cv=cv,
-                                               use_self_bins=True)
-                print(self.testscore, '\n')
-            
-        self.save()
+        elif stage == 'test':
+            self.testscore = self.run_test(test_set,
+                                           title=test_title,
+                                           cv=cv,
+                                           use_self_bins=True)
+            print(self.testscore, '\n')
+
+    @property
+    def profile_results(self):
+        '''return DataFrame of recorded calls of steps during run_analysis,
+        aggregated per stage, fold, step & method
         
-        return self
+        .. note::
+            only calls in this process are recorded, grid search with 
+            n_jobs > 1 runs in worker processes
+        '''
+        records = profile_records(model=self.path)
+        if len(records) == 0:
+            return records
+        # fit ids numbered per stage as folds
+        records['fold'] = records.groupby('stage')['fit_id'].transform(
+            lambda x: x.rank(method='dense') - 1).astype(int)
+        keys = ['stage', 'fold', 'step', 'estimator', 'method']
+        group = records.groupby(keys, sort=False)
+        rst = group.agg({
+            'wall_time': 'sum',
+            'cpu_time': 'sum',
+            'peak_mb': 'max',
+            'rows_in': 'max',
+            'cols_in': 'max',
+            'rows_out': 'max',
+            'cols_out': 'max'
+        })
+        rst.insert(0, 'n_calls', group.size())
+        return rst.reset_index()
 
-    def save(self):
+    @staticmethod
+    def load_checkpoint(path, key):
+        '''return ML_model instance saved under path by run_analysis with
+        checkpoint=key, None if there's no such instance
+        '''
+        if not os.path.isdir(path):
+            return None
+        try:
+            model = ML_model.load(path)
+        except FileNotFoundError:
+            return None
+        if getattr(model, '_checkpoint_key', None) != key:
+            return None
+        print("'{}' loaded from checkpoint, stages done: {}".format(
+            path, model._stages_done))
+        return model
+
+    def save(self, compress=None):
         '''save current estimator instance, self instance 
         and self construction settings
+        
+        compress
+            - None, estimator is pickled, fastest to save & load
+            - 0, estimator is dumped by joblib uncompressed, so that its 
+            numpy arrays can be memory mapped by load
+            - 1 to 9, estimator is dumped by joblib compressed
+        
+        .. note::
+            estimator is written only if it has changed since last saved, 
+            '.param' & '.instance' files refer to the '.pipe' file
         '''
         folder = self.folder
+        name = _get_estimator_name(self.estimator)
         # save esimator
-        folder.write(self.estimator,
-                     _get_estimator_name(self.estimator) + '.pipe')
+        ref = self._dump_estimator(name + '.pipe', compress)
         # save parameters
-        folder.write(self.get_params(False),
+        folder.write(dict(self.get_params(False), estimator=ref),
                      self.__class__.__name__ +'.param')
         # save instance
-        folder.write(
-            self, self.__class__.__name__ +
-            _get_estimator_name(self.estimator) + '.instance')
+        self._dump_instance(self.__class__.__name__ + name + '.instance', ref)
+        folder.save_manifest()
+
+    def _dump_estimator(self, file, compress=None):
+        '''write self.estimator into file under self.path, return 
+        _Estimator_ref of file; the write is skipped by self.folder if the
+        same estimator has been written there
+        '''
+        self.folder.write(self.estimator, file, compress=compress)
+        return _Estimator_ref(file)
+
+    def _dump_instance(self, file, ref):
+        '''write self into file under self.path, with estimator replaced by
+        ref
+        '''
+        estimator = self.estimator
+        self.estimator = ref
+        try:
+            self.folder.write(self, file)
+        finally:
+            self.estimator = estimator
+
+    @staticmethod
+    def load(path, mmap_mode=None):
+        '''return ML_model instance saved under path by save
+        
+        mmap_mode
+            - egg. 'r' to memory map numpy arrays of estimator saved with 
+            compress=0, see joblib.load
+        '''
+        folder = Objs_management(path)
+        model = folder.read_all(suffix='.instance', lazy=True,
+                                cache_size=0).first()
+        if model is None:
+            raise FileNotFoundError(
+                "no '.instance' file found in '{}'".format(path))
+        model.path = path
+        ref = model.__dict__.get('_estimator_ref')
+        if ref is not None:
+            ref.mmap_mode = mmap_mode
+        return model
 
     def delete_model(self):
         '''delete self.folder.path_ folder containing model
         '''
+        self.flush()
         del self.folder.path_
+        self._folder.close()
+        self._folder = None
 
     @property
     def feature_names(self):  #need update
@@ -967,12 +1571,46 @@ class ML_model(BaseEstimator):
 @dedent  
 @Appender(ML_model.run_analysis.__doc__)
 def run_analy(X, y, test_set=None, model_list=None, verbose=0, 
-              dirs='analyzed_models', **kwargs):
+              dirs='analyzed_models', async_write=False, artifacts='full',
+              n_workers=1, cpu_budget=None, checkpoint=False, time_limit=None,
+              mem_limit=None, **kwargs):
     '''run analysis of a series of pre-defined models as returned by 
     get_default_estimators()
     
     dirs - str:
         directory to dump analyzed models
+    async_write - bool:
+        if True, artifacts are written in background threads while next 
+        models are analyzed, all writes are flushed before return
+    artifacts - str:
+        'full', 'scores' or 'none', see ML_model
+    n_workers - int:
+        number of models analyzed concurrently in worker processes, 
+        default 1 to analyze models one by one in this process; output of 
+        each worker is logged to dirs/<pipe>/analysis.log
+    cpu_budget - int:
+        total cpus of concurrently analyzed models, default os.cpu_count();
+        each model takes n_jobs (of grid search, default 2) cpus, inner 
+        n_jobs of estimators (xgboost, imblearn samplers etc.) are set to 1
+        to avoid oversubscription
+    checkpoint - bool:
+        if True, each model is saved under dirs/<pipe> after each stage, 
+        keyed by hash of (pipe, data, kwargs); rerun with the same key 
+        loads completed models and resumes partially completed ones from 
+        the unfinished stages, default False; not available if artifacts 
+        is 'none'
+    time_limit - float:
+        wall-clock limit of each model in seconds
+    mem_limit - float:
+        resident memory limit of each model in MB
+    
+    .. note::
+        if n_workers > 1 or time_limit/mem_limit is given, each model runs in
+        a supervised worker process, models exceeding limits are killed, and 
+        'status' ('ok', 'error', 'timeout', 'memory') & 'error' columns are 
+        added to returned frames, with a row of each failed model; data are
+        dumped once into a temporary memory-mapped store shared by workers,
+        see utilis.dataset
         
     return 
     ------
@@ -994,22 +1632,69 @@ def run_analy(X, y, test_set=None, model_list=None, verbose=0,
         l = get_default_estimators()
     else:
         l = model_list
+    ml_params = dict(verbose=verbose, async_write=async_write,
+                     artifacts=artifacts)
+    supervised = (n_workers not in (None, 1) or time_limit is not None
+                  or mem_limit is not None)
+    if not supervised:
+        models = [_analy_one(i, X, y, test_set, dirs, ml_params,
+                             checkpoint=checkpoint, **kwargs)
+                  for i in l]
+        errors = [e for m in models for e in m.flush()]
+        results = [_get_scores(m) for m in models]
+    else:
+        n_cpu = kwargs.get('n_jobs', 2)
+        scheduler = Process_scheduler(cpu_budget, 
+                                      max_workers=n_workers or 1,
+                                      time_limit=time_limit,
+                                      mem_limit=mem_limit)
+        data_dir = tempfile.mkdtemp(prefix='lw_data_')
+        try:
+            shared = _share_data(X, y, test_set, data_dir)
+            for i in l:
+                scheduler.submit(i,
+                                 _analy_worker,
+                                 args=(i,) + shared + (dirs, ml_params),
+                                 kwargs=dict(kwargs, n_cpu=n_cpu,
+                                             checkpoint=checkpoint),
+                                 n_cpu=n_cpu,
+                                 log_file=os.path.join(dirs, i, 
+                                                       'analysis.log'))
+            outcomes = scheduler.run()
+        finally:
+            rmtree(data_dir, ignore_errors=True)
+        errors = []
+        results = []
+        for i, v in outcomes.items():
+            if v['status'] == 'ok':
+                score, write_errors = v['result']
+                errors.extend(write_errors)
+                results.append(score)
+            else:
+                print("'{}' failed: {}".format(i, v['error']))
+                failed = pd.Series({'status': v['status'], 
+                                    'error': v['error']})
+                results.append((failed, 
+                                None if test_set is None else failed))
+
+    if len(errors) > 0:
+        print('{} artifacts failed to be written: \n'.format(len(errors)),
+              errors)
+
     trainscore = []
     testscore = []
-    for i in l:
-        path = os.path.join(dirs, i)
-        model = ML_model(i, path, verbose=verbose)
-        model.run_analysis((X, y), test_set, **kwargs)       
-        
-        print("\n '{}' complete".format(i))
-        if hasattr(model, 'testscore'):
-            score = model.testscore.copy()
-            score['pipe_testset'] = i
-            testscore.append(score)
-        if hasattr(model, 'trainscore'):
-            score = model.trainscore.copy()
-            score['pipe_trainset'] = i
-            trainscore.append(score)
+    for i, (train, test) in zip(l, results):
+        if supervised:
+            train, test = (_with_status(train), 
+                           None if test_set is None else _with_status(test))
+        if test is not None:
+            test = test.copy()
+            test['pipe_testset'] = i
+            testscore.append(test)
+        if train is not None:
+            train = train.copy()
+            train['pipe_trainset'] = i
+            trainscore.append(train)
     
     if len(trainscore) > 0:
         trainscore = pd.concat(trainscore, axis=1, ignore_index=True).T
@@ -1018,14 +1703,176 @@ def run_analy(X, y, test_set=None, model_list=None, verbose=0,
                 
     return trainscore, testscore
 
+def _analy_one(pipe, X, y, test_set, dirs, ml_params, n_cpu=None,
+               checkpoint=False, **kwargs):
+    '''run analysis of one pipe, return ML_model instance
+    
+    n_cpu
+        - if not None, n_jobs of estimator steps are limited to 
+        n_cpu // n_jobs of grid search
+    checkpoint
+        - if True, resume from checkpoint of the same pipe, data & kwargs
+    '''
+    path = os.path.join(dirs, pipe)
+    key = None
+    model = None
+    if checkpoint:
+        key = _checkpoint_key(pipe, X, y, test_set, ml_params, kwargs)
+        model = ML_model.load_checkpoint(path, key)
+    if model is None:
+        model = ML_model(pipe, path, **ml_params)
+    else:
+        model.set_params(**ml_params)
+    if n_cpu is not None:
+        limit_n_jobs(model.estimator, max(n_cpu // kwargs.get('n_jobs', 2), 1))
+    model.run_analysis((X, y), test_set, checkpoint=key, **kwargs)
+    print("\n '{}' complete".format(pipe))
+    return model
+
+def _checkpoint_key(pipe, X, y, test_set, ml_params, kwargs):
+    '''return checkpoint key of analysis, hash of pipe, artifacts mode, 
+    run_analysis kwargs & content of data
+    '''
+    spec = repr((pipe, ml_params.get('artifacts'), sorted(kwargs.items())))
+    data = [X, y] + [i for j in _test_sets(test_set) for i in j]
+    return get_fingerprint([spec] + data)
+
+def _test_sets(test_set):
+    '''return list of (X, y) of test_set, a (X, y) tuple or list of them
+    '''
+    if test_set is None:
+        return []
+    if isinstance(test_set, tuple):
+        return [test_set]
+    return get_flat_list(test_set)
+
+def _share_data(X, y, test_set, path):
+    '''dump train & test sets into dataset stores under path, return 
+    (X, y, test_set) with each (X, y) replaced by Dataset_ref, loaded copy
+    on write so that steps modifying data in place still work
+    '''
+    train = Dataset_ref(dump_dataset(X, y, os.path.join(path, 'train')), 'c')
+    refs = [Dataset_ref(dump_dataset(a, b, os.path.join(path, 
+                                                        'test{}'.format(n))), 
+                        'c')
+            for n, (a, b) in enumerate(_test_sets(test_set))]
+    if isinstance(test_set, tuple):
+        refs = refs[0]
+    return train, None, refs if test_set is not None else None
+
+def _load_shared(X, y, test_set):
+    '''return (X, y, test_set) with Dataset_ref loaded, see _share_data
+    '''
+    if isinstance(X, Dataset_ref):
+        X, y = X.load()
+    if isinstance(test_set, Dataset_ref):
+        test_set = test_set.load()
+    elif isinstance(test_set, list):
+        test_set = [i.load() if isinstance(i, Dataset_ref) else i 
+                    for i in test_set]
+    return X, y, test_set
+
+def _analy_worker(pipe, X, y, test_set, *args, **kwargs):
+    '''run _analy_one in a worker process, return 
+    ((trainscore, testscore), write errors)
+    '''
+    X, y, test_set = _load_shared(X, y, test_set)
+    model = _analy_one(pipe, X, y, test_set, *args, **kwargs)
+    errors = model.flush()
+    return _get_scores(model), errors
+
+def _get_scorer(estimator, scoring):
+    ''' return sklearn scorer dict of estimator, including custom scorer
+    
+    custom ranking metrics (roc_auc, KS, average_precision, gini, 
+    lift/gain) share one engine, predicted & sorted once per dataset
+    '''
+    scorer = {}
+    sk_scoring = []
+    custom_scorer = get_custom_scorer()
+    for i in get_flat_list(scoring):
+        if i in custom_scorer:
+            scorer.update({i: custom_scorer[i]})
+        else:
+            sk_scoring.append(i)
+    if len(sk_scoring) > 0:
+        s, _ = _validation._check_multimetric_scoring(estimator,
+                                                      scoring=sk_scoring)
+        scorer.update(s)
+    return scorer
+
+
+def _with_status(score):
+    '''return score with 'status' & 'error' fields of a supervised run, 
+    score missing is taken as error
+    '''
+    if score is None:
+        return pd.Series({'status': 'error', 'error': 'no score'})
+    if 'status' in score.index:
+        return score
+    score = score.copy()
+    score['status'] = 'ok'
+    score['error'] = None
+    return score
+
+# estimators of score_stream worker processes by token of their pool
+_SCORERS = {}
+
+def _init_scorer(token, estimator):
+    '''load pickled estimator once per score_stream worker process, 
+    estimators of earlier pools are dropped
+    '''
+    _SCORERS.clear()
+    _SCORERS[token] = pickle.loads(estimator)
+
+def _pool_score_chunk(token, X, *args):
+    '''score chunk X by estimator loaded for pool of token, see _score_chunk
+    '''
+    return _score_chunk(_SCORERS[token], X, *args)
+
+def _score_chunk(estimator, X, pre_method, pos_label, bins, id_cols):
+    '''return DataFrame of id_cols, 'score' (& 'level') of chunk X
+    '''
+    rst = pd.DataFrame(X[id_cols]).reset_index(drop=True)
+    if len(id_cols) > 0:
+        X = X.drop(columns=id_cols)
+    y_pre = getattr(estimator, pre_method)(X)
+    if np.ndim(y_pre) > 1:
+        y_pre = y_pre[:, pos_label]
+    rst['score'] = y_pre
+    if bins is not None:
+        rst['level'] = _binning(y_pre, bins=bins, labels=False)[0]
+    return rst
+
+def _get_scores(model):
+    '''return (trainscore, testscore) of analyzed model, None if missing
+    '''
+    return getattr(model, 'trainscore', None), getattr(model, 'testscore', None)
+
 def run_CVscores(X=None,
                  y=None,
                  cv=3,
                  scoring=['roc_auc', 'KS'],
-                 estimator_lis=None):
+                 estimator_lis=None,
+                 shared_prefix=False,
+                 time_limit=None,
+                 mem_limit=None):
     ''' return CV scores of a series of pre-defined piplines as returned by
     get_default_estimators()
     
+    shared_prefix - bool:
+        if True, pipelines are parsed into a prefix tree of steps, each 
+        distinct prefix is fitted once per fold and downstream steps branch
+        from its output, fit_time of a pipeline is the sum of its steps
+    time_limit - float:
+        wall-clock limit of each pipeline in seconds
+    mem_limit - float:
+        resident memory limit of each pipeline in MB
+        
+    .. note::
+        if time_limit/mem_limit is given, each pipeline runs in a supervised
+        worker process, see run_analy
+    
     return
     -------
     dataframe 
@@ -1036,17 +1883,172 @@ def run_CVscores(X=None,
     else:
         l = estimator_lis
 
+    supervised = time_limit is not None or mem_limit is not None
     if X is None:
         return set(l)
+    elif shared_prefix:
+        if supervised:
+            raise ValueError('time_limit/mem_limit are not supported with '
+                             'shared_prefix=True')
+        return _prefix_cv_scores(X, y, l, cv=cv, scoring=scoring)
+    elif supervised:
+        scheduler = Process_scheduler(max_workers=1, 
+                                      time_limit=time_limit,
+                                      mem_limit=mem_limit)
+        data_dir = tempfile.mkdtemp(prefix='lw_data_')
+        try:
+            data, _, _ = _share_data(X, y, None, data_dir)
+            for i in l:
+                scheduler.submit(i, _cv_worker, 
+                                 args=(i, data, None, cv, scoring))
+            outcomes = scheduler.run()
+        finally:
+            rmtree(data_dir, ignore_errors=True)
+        lis = []
+        for i, v in outcomes.items():
+            if v['status'] == 'ok':
+                scores = _with_status(v['result'])
+            else:
+                scores = pd.Series({'status': v['status'], 
+                                    'error': v['error']})
+            scores['pipe'] = i
+            lis.append(scores)
+        return pd.concat(lis, axis=1, ignore_index=True).T
     else:
         lis = []
         for i in l:
-            m = ML_model(estimator=i)
-            scores = m.cv_validate(X, y, cv=cv, scoring=scoring).mean()
+            scores = _cv_worker(i, X, y, cv, scoring)
             scores['pipe'] = i
             lis.append(scores)
         return pd.concat(lis, axis=1, ignore_index=True).T
 
+def _cv_worker(pipe, X, y, cv, scoring):
+    '''return averaged cv scores of pipe, X may be Dataset_ref
+    '''
+    X, y, _ = _load_shared(X, y, None)
+    m = ML_model(estimator=pipe)
+    return m.cv_validate(X, y, cv=cv, scoring=scoring).mean()
+
+def _prefix_tree(pipes):
+    '''parse pipe strings into prefix tree of steps
+    
+    return
+    ----
+    root node, each node is dict of 
+        - 'step': estimator of the node (None for root)
+        - 'children': {step key: child node}
+        - 'leaves': [(pipe, final estimator)] of pipes ending at the node
+    '''
+    root = {'step': None, 'children': OrderedDict(), 'leaves': []}
+    for pipe in pipes:
+        estimator = pipe_main(pipe)
+        steps = [i[1] for i in getattr(estimator, 'steps', [(pipe, estimator)])]
+        node = root
+        for key, step in zip(pipe.split('_')[:-1], steps[:-1]):
+            if key not in node['children']:
+                node['children'][key] = {'step': step,
+                                         'children': OrderedDict(),
+                                         'leaves': []}
+            node = node['children'][key]
+        node['leaves'].append((pipe, steps[-1]))
+    return root
+
+def _prefix_cv_scores(X, y, pipes, cv=3, scoring=['roc_auc', 'KS']):
+    '''return cv scores of pipes as run_CVscores, fitting each distinct 
+    prefix of steps once per fold
+    '''
+    root = _prefix_tree(pipes)
+    scorer = _get_scorer(pipe_main(pipes[0]), scoring)
+    cv = _split.check_cv(cv, y, classifier=True)
+    results = OrderedDict((i, []) for i in pipes)
+    for train_index, test_index in cv.split(X, y):
+        X_train, y_train = _take_index(train_index, X, y)
+        X_test, y_test = _take_index(test_index, X, y)
+        _fit_node(root, X_train, y_train, X_test, y_test, 0, scorer, results)
+
+    lis = []
+    for i in pipes:
+        scores = pd.DataFrame(results[i]).mean()
+        scores['pipe'] = i
+        lis.append(scores)
+    return pd.concat(lis, axis=1, ignore_index=True).T
+
+def _fit_node(node, X, y, X_test, y_test, fit_time, scorer, results):
+    '''score final estimators ending at node, then fit each child step on
+    output of node and recurse, only outputs along current path are kept
+    '''
+    for pipe, estimator in node['leaves']:
+        estimator = clone(estimator)
+        t0 = time.time()
+        estimator.fit(X, y)
+        t1 = time.time()
+        scores = _validation._score(estimator, X_test, y_test, scorer, True)
+        row = {'fit_time': fit_time + t1 - t0, 
+               'score_time': time.time() - t1}
+        row.update({'test_' + k: v for k, v in scores.items()})
+        results[pipe].append(row)
+
+    for child in node['children'].values():
+        step = clone(child['step'])
+        t0 = time.time()
+        if hasattr(step, 'fit_resample'):
+            # samplers only apply to train data, as in imblearn Pipeline
+            Xt, yt = step.fit_resample(X, y)
+            Xt_test = X_test
+        else:
+            Xt, yt = step.fit_transform(X, y), y
+            Xt_test = step.transform(X_test)
+        _fit_node(child, Xt, yt, Xt_test, y_test, 
+                  fit_time + time.time() - t0, scorer, results)
+
+
+class _Estimator_ref():
+    '''reference to estimator dumped into file, relative to model path, in
+    place of estimator in saved ML_model instance & parameters
+    '''
+
+    def __init__(self, file, mmap_mode=None):
+        self.file = file
+        self.mmap_mode = mmap_mode
+
+    def load(self, path):
+        file = os.path.join(path, self.file)
+        estimator = joblib_load(file, mmap_mode=self.mmap_mode)
+        print("<obj>: '{}' read from '{}'\n".format(
+            estimator.__class__.__name__, file))
+        return estimator
+
+
+class _Prediction_proxy():
+    '''stand-in for ML_model.estimator when scoring a bound dataset X, 
+    predict methods take row indices of X instead of data and serve 
+    predictions from ML_model prediction cache; X is fingerprinted once
+    '''
+    _estimator_type = 'classifier'
+
+    def __init__(self, model, X):
+        self.model = model
+        self.X = X
+        self.fingerprint = get_fingerprint(X)
+
+    def __getattr__(self, name):
+        if name in ('model', 'X', 'fingerprint'):
+            raise AttributeError(name)
+        return getattr(self.model.estimator, name)
+
+    def _predict(self, method, index):
+        return self.model._predict_cached(
+            self.X, method, fingerprint=self.fingerprint)[index]
+
+    def predict(self, index):
+        return self._predict('predict', index)
+
+    def predict_proba(self, index):
+        return self._predict('predict_proba', index)
+
+    def decision_function(self, index):
+        return self._predict('decision_function', index)
+
 
 def _reset_index(*array):
     '''reset_index for df or series, return list of *arrays
@@ -1078,6 +2080,10 @@ def _split_cv(*arrays, y=None, groups=None, cv=3, random_state=None):
     m - indices of folds [0 : cv-1]
     n - indice of variable/arrays [0 : n_arrays-1]
     k - indice of train(0)/test[1] set [0:1]
+    
+    .. note::
+        subsets of a fold are materialized only when the generator reaches 
+        it, use _cv_index to get positional indices without copying arrays
     '''
 
     n_arrays = len(arrays)
@@ -1090,25 +2096,42 @@ def _split_cv(*arrays, y=None, groups=None, cv=3, random_state=None):
         if y is not None:
             arrays.append(y)
         return [[(i, i) for i in arrays]]
-    # get cross validator
+    
     if y is not None:
         arrays.append(y)
+    arrays = _split.indexable(*arrays)
+    folds = _cv_index(arrays[0], y, groups, cv, random_state)
+    train_test = (list(
+        zip(_take_index(train, *arrays), _take_index(test, *arrays)))
+                  for train, test in folds)
+
+    return train_test
+
+
+def _cv_index(X, y=None, groups=None, cv=3, random_state=None):
+    '''return list of (train_index, test_index) positional indices of cv 
+    splits, stratified by y if y is not None; cv == 1 returns all samples
+    as both train and test
+    '''
+    if cv == 1:
+        index = np.arange(validation._num_samples(X))
+        return [(index, index)]
+    # get cross validator
+    if y is not None:
         cv = _split.check_cv(cv, y=y, classifier=True)
     else:
         cv = _split.check_cv(cv, classifier=False)
     # set random state
     if hasattr(cv, 'random_state'):
         cv.random_state = random_state
-    # reset_index pandas df or series
-    arrays = _reset_index(*arrays)
-    arrays = _split.indexable(*arrays)
-    # get indexing method
-    safe_index = _split.safe_indexing
-    train_test = ([
-        (safe_index(i, train_index), safe_index(i, test_index)) for i in arrays
-    ] for train_index, test_index in cv.split(arrays[0], y, groups))
+    return list(cv.split(X, y, groups))
 
-    return train_test
+
+def _take_index(index, *arrays):
+    '''return list of arrays subset by positional index, index of pandas 
+    df or series reset
+    '''
+    return _reset_index(*(_split.safe_indexing(i, index) for i in arrays))
 
 
 def _get_estimator_name(estimator):
@@ -1122,23 +2145,19 @@ def _get_estimator_name(estimator):
         raise TypeError('estimator is not an valid sklearn estimator')
 
 
+def _combine_xy(*arrays):
+    '''return arrays concatenated column-wise as one DataFrame
+    '''
+    return pd.concat((pd.DataFrame(i) for i in arrays), axis=1)
+
+
 def _get_splits_combined(xy_splits, ret_type='test'):
     '''return list of combined X&y DataFrame for cross validated test set
+    
+    xy_splits may be a generator as returned by _split_cv, consumed once
     '''
-    data_splits_test = [
-        pd.concat((pd.DataFrame(i[1]) for i in item), axis=1)
-        for item in xy_splits
-    ]
-
-    data_splits_train = [
-        pd.concat((pd.DataFrame(i[0]) for i in item), axis=1)
-        for item in xy_splits
-    ]
-
-    if ret_type == 'test':
-        return data_splits_test
-    if ret_type == 'train':
-        return data_splits_train
+    k = {'test': 1, 'train': 0}[ret_type]
+    return [_combine_xy(*(i[k] for i in item)) for item in xy_splits]
 
   
 def get_default_estimators(estimators='pipe'):
@@ -7,6 +7,7 @@ Created on Tue Dec 18 14:36:20 2018
 import pandas as pd
 import numpy as np
 import scipy.stats as stats
+import weakref
 
 from pandas.core.dtypes import api
 
@@ -38,8 +39,7 @@ from sklearn.decomposition import (
 
 from sklearn.kernel_approximation import RBFSampler, Nystroem
 
-from sklearn.metrics import roc_curve
-from sklearn.metrics import make_scorer
+from sklearn.metrics import roc_curve, get_scorer
 from sklearn.impute import SimpleImputer
 from sklearn.utils import validation
 from sklearn.utils.testing import all_estimators
@@ -86,6 +86,7 @@ from imblearn import FunctionSampler
 from lw_mlearn.utilis.utilis import (dec_iferror_getargs, get_kwargs,
                                      get_sk_estimators)
 from lw_mlearn.utilis.plotter import plt, plotter_rateVol
+from lw_mlearn.utilis.profiler import profile_steps
 
 
 def index_duplicated(string_list):
@@ -104,7 +105,7 @@ def index_duplicated(string_list):
         
     
     
-def pipe_main(pipe=None, return_clf=False):
+def pipe_main(pipe=None, return_clf=False, profile=False):
     '''pipeline construction using sklearn estimators, final step support only
     classifiers currently
     
@@ -118,6 +119,9 @@ def pipe_main(pipe=None, return_clf=False):
     pipe - str 
         - in the format of 'xx_xx' of which 'xx' means steps in pipeline,
           default None
+    profile - bool
+        - if True, return Profiled_pipeline recording time & memory of calls
+          of its steps, see utilis.profiler
     return
     ----
         1) pipeline instance of chosen steps
@@ -316,6 +320,8 @@ def pipe_main(pipe=None, return_clf=False):
         all_keys_dict.update(**clean, **encode, **scale, **feature_c,
                              **feature_m, **feature_u, **estimator, **resample)
         if len(l) < 2: 
+            if profile:
+                return profile_steps(all_keys_dict[l[0]])
             return all_keys_dict[l[0]]
         steps = []
         for i, j in zip(l, index_duplicated(l)):
@@ -324,6 +330,8 @@ def pipe_main(pipe=None, return_clf=False):
             else:
                 raise KeyError(
                     "'{}' invalid key for sklearn estimators".format(i))
+        if profile:
+            return profile_steps(Pipeline(steps))
         return Pipeline(steps)
 
     else:
@@ -981,12 +989,8 @@ class Woe_encoder(BaseEstimator, TransformerMixin, Base_clean):
         cols_notcoded = []
         for name, col in X.iteritems():
             if name in woe_map:
-                mapper = woe_map.get(name)
-                if mapper.get(np.nan) is not None:
-                    na = mapper.pop(np.nan)
-                    cols.append(col.map(mapper).fillna(na))
-                else:
-                    cols.append(col.map(mapper).fillna(0))
+                mapper, na = _woe_na(woe_map.get(name))
+                cols.append(col.map(mapper).fillna(0 if na is None else na))
             else:
                 cols_notcoded.append(col.name)
 
@@ -1000,6 +1004,20 @@ class Woe_encoder(BaseEstimator, TransformerMixin, Base_clean):
         '''
         plotter_woeiv_event(self.woe_iv, save_path, suffix, dw, up)
 
+def _woe_na(mapper):
+    '''return copy of woe mapper without NaN category & woe of NaN category
+    (None if not binned), woe_map itself is not changed
+    '''
+    na = None
+    rst = {}
+    for k, v in mapper.items():
+        if isinstance(k, float) and np.isnan(k):
+            na = v
+        else:
+            rst[k] = v
+    return rst, na
+
+
 def iv_single(X, y, **kwargs):
     '''return scalor 'IV' value for a pair of x, y vector, used as statiscs 
     function, kwargs see Woe_encoder
@@ -1562,6 +1580,7 @@ def plotter_lift_curve(y_pre,
                        ax,
                        header,
                        xlabel='xlabel',
+                       plot=True,
                        **kwargs):
     '''return lift curve of y_pre on y_true 
    
@@ -1588,6 +1607,8 @@ def plotter_lift_curve(y_pre,
         - title of plot
     xlabel
         - xlabel for xaxis
+    plot
+        - if False, only calculate lift data and return None as ax
     '''
     y_cut, bins = _binning(y_pre,
                            y_true=y_true,
@@ -1602,10 +1623,12 @@ def plotter_lift_curve(y_pre,
     df1[xlabel] = df_gb.sum().index.values
     df1['rate'] = (df_gb.sum() / df_gb.count()).values
     df1['vol'] = df_gb.count().values
+    plotted_data = df1.dropna()
+    if not plot:
+        return None, y_cut, bins, plotted_data
     # plot
     if ax is None:
         fig, ax = plt.subplots(1, 1)
-    plotted_data = df1.dropna()
     ax = plotter_rateVol(plotted_data, ax=ax)
     plt.title(header, fontsize=14)
     return ax, y_cut, bins, plotted_data
@@ -1663,11 +1686,222 @@ def psi_score(act, ex):
     return np.sum(delta * ln)
 
 
-def get_custom_scorer():
+def binary_metrics(y_true,
+                   y_score,
+                   pos_label=1,
+                   depths=(0.05, 0.1, 0.2),
+                   return_curve=False,
+                   drop_intermediate=True,
+                   sample_weight=None):
+    '''return ranking metrics of binary predictions computed in one pass, 
+    y_score is sorted only once to derive all of them
+    
+    y_true
+        - binary class labels
+    y_score
+        - continuous predictions, higher score for positive class
+    pos_label
+        - label of positive class
+    depths
+        - fractions of population ranked by score to calculate lift & gain at
+    return_curve
+        - bool, if True also return roc/ks curve
+    drop_intermediate
+        - drop collinear points of the curve, see roc_curve
+    sample_weight
+        - weights of samples, default None, depths are then fractions of
+        total weight
+    
+    return
+    ----
+    scores
+        - dict {'roc_auc', 'KS', 'average_precision', 'gini', 'lift{depth%}',
+        'gain{depth%}'}, egg. 'lift10' is lift of top 10% population
+    curve
+        - DataFrame of ['threshold', 'fpr', 'tpr', 'ks', 'depth', 
+        'precision'], only returned if return_curve is True
+    '''
+    y_true = np.ravel(y_true) == pos_label
+    y_score = np.ravel(y_score)
+    if sample_weight is None:
+        weight = np.ones(len(y_score))
+    else:
+        weight = np.ravel(sample_weight).astype(float)
+    validation.check_consistent_length(y_true, y_score, weight)
+    validation.assert_all_finite(y_score)
+    n = len(y_score)
+    # sort once, descending
+    order = np.argsort(y_score, kind='mergesort')[::-1]
+    y_score = y_score[order]
+    weight = weight[order]
+    cum_pos = np.cumsum(y_true[order] * weight)
+    cum_all = np.cumsum(weight)
+    total = cum_all[-1]
+    # last position of each distinct score as threshold
+    thresh_idx = np.r_[np.where(np.diff(y_score))[0], n - 1]
+    tps = cum_pos[thresh_idx]
+    fps = cum_all[thresh_idx] - tps
+    n_pos, n_neg = tps[-1], fps[-1]
+    if n_pos == 0 or n_neg == 0:
+        raise ValueError('Only one class present in y_true, metrics are '
+                         'not defined')
+
+    tpr = np.r_[0, tps / n_pos]
+    fpr = np.r_[0, fps / n_neg]
+    precision = tps / (tps + fps)
+    auc = np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1])) / 2
+    scores = {
+        'roc_auc': auc,
+        'KS': np.max(tpr - fpr),
+        'average_precision': np.sum(np.diff(tpr) * precision),
+        'gini': 2 * auc - 1,
+    }
+    for d in np.ravel(depths):
+        # first position where cumulated weight reaches depth
+        k = min(int(np.searchsorted(cum_all, d * total)), n - 1)
+        name = '{:g}'.format(100 * d)
+        scores['lift' + name] = cum_pos[k] / cum_all[k] / (n_pos / total)
+        scores['gain' + name] = cum_pos[k] / n_pos
+
+    if not return_curve:
+        return scores
+
+    threshold = y_score[thresh_idx]
+    if drop_intermediate and len(tps) > 2:
+        keep = np.where(
+            np.r_[True,
+                  np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True])[0]
+        tps, fps, threshold = tps[keep], fps[keep], threshold[keep]
+    curve = pd.DataFrame({
+        'threshold': np.r_[np.inf, threshold],
+        'fpr': np.r_[0, fps / n_neg],
+        'tpr': np.r_[0, tps / n_pos],
+        'depth': np.r_[0, (tps + fps) / total],
+        'precision': np.r_[np.nan, tps / (tps + fps)],
+    })
+    curve['ks'] = curve['tpr'] - curve['fpr']
+    curve = curve[['threshold', 'fpr', 'tpr', 'ks', 'depth', 'precision']]
+    return scores, curve
+
+
+# metrics of binary_metrics which are also sklearn scorers
+_SK_RANKING = ['roc_auc', 'average_precision']
+
+
+class _Binary_metrics_engine():
+    '''compute binary_metrics of an estimator's continuous predictions once
+    for each (estimator, X, y) and serve each metric from the result, shared
+    by scorers returned from get_custom_scorer
+    '''
+
+    def __init__(self, pos_label=1, depths=(0.05, 0.1, 0.2)):
+        self.pos_label = pos_label
+        self.depths = depths
+        self._last = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_last'] = None
+        return state
+
+    def applicable(self, estimator, y_true):
+        '''return True if estimator is a fitted binary classifier with
+        pos_label as one of its classes and y_true has at most 2 classes
+        '''
+        classes = getattr(estimator, 'classes_', None)
+        if classes is None or len(classes) != 2:
+            return False
+        return self.pos_label in list(classes) and \
+            len(np.unique(y_true)) <= 2
+
+    def score(self, estimator, X, y_true, name, sample_weight=None):
+        '''return metric 'name' of estimator on (X, y_true), recomputed when
+        called with other objects or when 'name' has already been served
+        '''
+        last = self._last
+        refs = (estimator, X, y_true, sample_weight)
+        if (last is None or name in last['served']
+                or any(r() is not i for r, i in zip(last['refs'], refs))):
+            # column of pos_label in predictions
+            pos = list(estimator.classes_).index(self.pos_label)
+            try:
+                y_score = estimator.decision_function(X)
+                if pos == 0:
+                    y_score = -y_score
+            except (NotImplementedError, AttributeError):
+                y_score = estimator.predict_proba(X)[:, pos]
+            if np.ndim(y_score) > 1:
+                raise ValueError('estimator should only output binary '
+                                 'classes...')
+            scores = binary_metrics(y_true, y_score, self.pos_label,
+                                    self.depths, sample_weight=sample_weight)
+            last = {
+                'refs': [_weak_ref(i) for i in refs],
+                'scores': scores,
+                'served': set()
+            }
+            self._last = last
+        last['served'].add(name)
+        return last['scores'][name]
+
+
+class _Metric_scorer():
+    '''scorer of one metric computed by a shared _Binary_metrics_engine, 
+    follows sklearn scorer signature scorer(estimator, X, y)
+    
+    fallback
+        - sklearn scorer of the same metric, used when engine is not 
+        applicable (egg. multiclass target), None to raise ValueError then
+    '''
+
+    def __init__(self, engine, name, fallback=None):
+        self.engine = engine
+        self.name = name
+        self.fallback = fallback
+
+    def __call__(self, estimator, X, y_true, sample_weight=None):
+        if self.engine.applicable(estimator, y_true):
+            return self.engine.score(estimator, X, y_true, self.name,
+                                     sample_weight)
+        if self.fallback is not None:
+            return self.fallback(estimator, X, y_true,
+                                 sample_weight=sample_weight)
+        raise ValueError("scorer '{}' is only defined for binary classifier"
+                         " with pos_label={}".format(self.name,
+                                                     self.engine.pos_label))
+
+    def __repr__(self):
+        return "make_scorer('{}', engine=binary_metrics)".format(self.name)
+
+
+def _weak_ref(obj):
+    '''return weak reference of obj, or a callable returning obj if obj 
+    does not support weak reference
+    '''
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return lambda: obj
+
+
+def get_custom_scorer(pos_label=1, depths=(0.05, 0.1, 0.2)):
     ''' return custom scorer dict, 'KS' scorer added
+    
+    ranking metrics of binary_metrics ('roc_auc', 'KS', 'average_precision', 
+    'gini', 'lift{depth%}', 'gain{depth%}') share one engine, so that asking
+    for several of them predicts & sorts scores only once per dataset; 
+    'roc_auc' & 'average_precision' fall back to sklearn scorers where the 
+    binary engine does not apply
     '''
+    engine = _Binary_metrics_engine(pos_label, depths)
+    names = ['roc_auc', 'KS', 'average_precision', 'gini']
+    for d in np.ravel(depths):
+        name = '{:g}'.format(100 * d)
+        names.extend(['lift' + name, 'gain' + name])
     scorer_dict = {}
-    scorer_dict['KS'] = make_scorer(ks_score, needs_threshold=True)
+    for i in names:
+        fallback = get_scorer(i) if i in _SK_RANKING else None
+        scorer_dict[i] = _Metric_scorer(engine, i, fallback)
 
     return scorer_dict
 
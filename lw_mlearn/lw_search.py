@@ -0,0 +1,978 @@
+# -*- coding: utf-8 -*-
+"""
+budgeted hyper-parameter search of sklearn estimators
+
+@author: roger luo
+
+class
+-----
+
+Halving_search:
+    successive halving over n_samples or an estimator parameter (eg.
+    n_estimators), only the best 1/factor candidates of each rung are
+    evaluated with more resources
+    
+Tpe_search:
+    sequential model-based search by tree-structured parzen estimator, 
+    candidates are proposed in batches where good observations are more 
+    likely than bad ones
+
+Path_search:
+    grid search of ensembles where the n_estimators path is evaluated from
+    one fit of the largest ensemble per fold (staged predictions, 
+    ntree_limit, first k trees or warm_start growth)
+"""
+import numpy as np
+import pandas as pd
+import time
+
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.model_selection import ParameterGrid, check_cv, cross_validate
+from sklearn.model_selection import _split
+from sklearn.metrics import check_scoring
+from sklearn.utils import resample, check_random_state
+from sklearn.utils.validation import _num_samples
+
+
+class Halving_search(BaseEstimator):
+    '''successive halving search of param_grid
+
+    all candidates are cross validated on a small resource first, only the
+    best 1/factor of them (ranked by refit metric) go on to the next rung
+    with factor times more resources, the last rung uses full resources
+
+    parameters
+    ----
+    estimator
+        - sklearn estimator or pipeline instance
+    param_grid
+        - dict or list of dicts, see GridSearchCV
+    scoring
+        - scorer callable or dict of scorers {name: scorer}
+    cv
+        - int, cross-validation generator or an iterable
+    refit
+        - str, scorer name to rank candidates & refit best estimator, 
+        ignored for single metric scoring
+    factor
+        - int > 1, 1/factor candidates survive each rung
+    resource
+        - 'n_samples', an estimator param name (eg. 'XGBClassifier__
+        n_estimators') or 'auto'
+        - 'auto': n_estimators of final estimator if it is not searched in
+        param_grid, else 'n_samples'
+    min_resources
+        - resources of the first rung, default None:
+            - 'n_samples', the least samples to keep 2 minority class
+            samples per fold
+            - param, 1/factor**2 of estimator's current param value
+    n_jobs
+        - number of (candidate, fold) fits run in parallel
+    random_state
+        - seed to subsample n_samples
+    return_train_score
+        - bool, see GridSearchCV
+    verbose
+        - if > 0, print progress of rungs
+
+    attributes
+    ----
+    cv_results_
+        - DataFrame, 1 row per candidate at the last rung it reached,
+        with 'iter' & 'n_resources' columns
+    best_params_
+    best_score_
+    best_estimator_
+    n_candidates_
+        - number of candidates in param_grid
+    n_evaluated_
+        - number of candidates evaluated at full resources
+    n_skipped_
+        - number of candidates eliminated before full resources
+    n_fits_
+        - number of (candidate, fold) fits performed
+    cost_ratio_
+        - resources consumed (sum of n_resources of each fit) relative to an
+        exhaustive grid search on full resources
+    '''
+
+    def __init__(self,
+                 estimator,
+                 param_grid,
+                 scoring=None,
+                 cv=3,
+                 refit='roc_auc',
+                 factor=3,
+                 resource='auto',
+                 min_resources=None,
+                 n_jobs=2,
+                 random_state=0,
+                 return_train_score=True,
+                 verbose=1):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.refit = refit
+        self.factor = factor
+        self.resource = resource
+        self.min_resources = min_resources
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.return_train_score = return_train_score
+        self.verbose = verbose
+
+    def fit(self, X, y, **fit_params):
+        '''run successive halving and refit best estimator on (X, y)
+        '''
+        if self.factor <= 1:
+            raise ValueError('factor must be > 1, got {}'.format(self.factor))
+        candidates = list(ParameterGrid(self.param_grid))
+        resource = self._get_resource(candidates)
+        max_r = self._max_resources(resource, X, y)
+        min_r = self._min_resources(resource, max_r, y)
+        n_iter = _n_rungs(len(candidates), max_r, min_r, self.factor)
+        names = _get_names(self.scoring)
+        # single metric is named 'score' by cross_validate
+        refit = 'score' if names == ['score'] else self.refit
+
+        remaining = list(range(len(candidates)))
+        results = {}
+        n_fits = 0
+        cost = 0
+        for i in range(n_iter):
+            n_r = max(min_r, max_r // self.factor**(n_iter - 1 - i))
+            if i == n_iter - 1:
+                n_r = max_r
+            X_r, y_r = self._take_resource(resource, n_r, max_r, X, y)
+            params = [
+                _add_resource(candidates[c], resource, n_r) for c in remaining
+            ]
+            scores = _evaluate_candidates(self.estimator, X_r, y_r, params,
+                                          self.scoring, self.cv, self.n_jobs,
+                                          self.return_train_score, fit_params)
+            n_fit = sum(len(s['fit_time']) for s in scores)
+            n_fits += n_fit
+            cost += n_fit * n_r
+            for c, s in zip(remaining, scores):
+                results[c] = dict(_summary(s), iter=i, n_resources=n_r)
+            if self.verbose > 0:
+                print('rung {}: {} candidates evaluated with {} {}'.format(
+                    i, len(remaining), n_r, resource))
+            # keep best 1/factor candidates for next rung
+            if i < n_iter - 1:
+                mean = np.array([results[c]['mean_test_' + refit]
+                                 for c in remaining])
+                mean[np.isnan(mean)] = -np.inf
+                n_keep = int(np.ceil(len(remaining) / self.factor))
+                order = np.argsort(-mean, kind='mergesort')
+                remaining = [remaining[k] for k in order[:n_keep]]
+
+        self.cv_results_ = _cv_results(candidates, results, names)
+        best = self.cv_results_['rank_test_' + refit].idxmin()
+        self.best_params_ = candidates[best]
+        self.best_score_ = self.cv_results_.loc[best,
+                                                'mean_test_' + refit]
+        self.best_estimator_ = clone(self.estimator).set_params(
+            **self.best_params_)
+        t0 = time.time()
+        self.best_estimator_.fit(X, y, **fit_params)
+        self.refit_time_ = time.time() - t0
+
+        self.n_candidates_ = len(candidates)
+        self.n_evaluated_ = len(remaining)
+        self.n_skipped_ = len(candidates) - len(remaining)
+        self.n_fits_ = n_fits
+        self.cost_ratio_ = cost / (max_r * len(candidates) *
+                                   _n_splits(self.cv, X, y))
+        if self.verbose > 0:
+            print('{} of {} candidates evaluated at full {}, {} skipped, '
+                  '{} fits using {:.0%} resources of grid search\n'.format(
+                      self.n_evaluated_, self.n_candidates_, resource,
+                      self.n_skipped_, n_fits, self.cost_ratio_))
+        return self
+
+    def _get_resource(self, candidates):
+        '''return resource name, 'n_samples' or estimator parameter
+        '''
+        resource = self.resource
+        searched = set(k for c in candidates for k in c)
+        if resource == 'auto':
+            key = _final_param(self.estimator, 'n_estimators')
+            if key is None or key in searched:
+                return 'n_samples'
+            return key
+        if resource == 'n_samples':
+            return resource
+        key = _final_param(self.estimator, resource)
+        if key is None:
+            raise ValueError("resource '{}' is not a parameter of {}".format(
+                resource, self.estimator.__class__.__name__))
+        if key in searched:
+            raise ValueError(
+                "resource '{}' can not be searched in param_grid".format(key))
+        return key
+
+    def _max_resources(self, resource, X, y):
+        if resource == 'n_samples':
+            return _num_samples(X)
+        return int(self.estimator.get_params()[resource])
+
+    def _min_resources(self, resource, max_r, y):
+        if self.min_resources is not None:
+            return min(int(self.min_resources), max_r)
+        if resource == 'n_samples':
+            _, counts = np.unique(np.asarray(y), return_counts=True)
+            min_ratio = counts.min() / counts.sum()
+            n = 2 * _n_splits(self.cv) / min_ratio
+        else:
+            n = max_r / self.factor**2
+        return int(min(max(np.ceil(n), 1), max_r))
+
+    def _take_resource(self, resource, n_r, max_r, X, y):
+        '''return stratified subsample of (X, y) if resource is n_samples
+        '''
+        if resource != 'n_samples' or n_r >= max_r:
+            return X, y
+        index = resample(np.arange(max_r),
+                         n_samples=n_r,
+                         replace=False,
+                         stratify=y,
+                         random_state=self.random_state)
+        index.sort()
+        return _split.safe_indexing(X, index), _split.safe_indexing(y, index)
+
+
+class Tpe_search(BaseEstimator):
+    '''tree-structured parzen estimator search of param_distributions
+    
+    after n_initial random candidates, observations are split into good 
+    (top gamma quantile of refit metric) and bad ones; each dimension is 
+    modeled by a parzen density l(x) of good and g(x) of bad observations,
+    candidates drawn from l(x) with max l(x)/g(x) are evaluated next
+    
+    parameters
+    ----
+    estimator
+        - sklearn estimator or pipeline instance
+    param_distributions
+        - dict {name: values}, see RandomizedSearchCV
+        - list of values are treated as categories
+        - distributions with 'rvs' method (eg. scipy.stats.uniform) are 
+        treated as numbers, in log space if ratio of bounds > 100, 
+        discrete distributions (eg. randint) give integers
+    scoring
+        - scorer callable or dict of scorers {name: scorer}
+    cv
+        - int, cross-validation generator or an iterable
+    refit
+        - str, scorer name to optimize & refit best estimator, ignored for 
+        single metric scoring
+    n_iter
+        - max number of candidates to evaluate
+    batch_size
+        - number of candidates proposed & evaluated in parallel each step
+    n_initial
+        - number of random candidates before model-based proposals
+    time_budget
+        - seconds, no new batch is started after time_budget, default None
+    gamma
+        - quantile of good observations
+    n_ei_candidates
+        - number of draws from l(x) per proposed candidate
+    n_jobs
+        - number of (candidate, fold) fits run in parallel
+    random_state
+        - seed of random draws
+    return_train_score
+        - bool, see GridSearchCV
+    verbose
+        - if > 0, print progress of batches
+    
+    attributes
+    ----
+    cv_results_
+        - DataFrame, 1 row per evaluated candidate, with 'iter' (batch) & 
+        'elapsed' (seconds since start) columns
+    best_params_
+    best_score_
+    best_estimator_
+    n_fits_
+        - number of (candidate, fold) fits performed
+    '''
+
+    def __init__(self,
+                 estimator,
+                 param_distributions,
+                 scoring=None,
+                 cv=3,
+                 refit='roc_auc',
+                 n_iter=30,
+                 batch_size=2,
+                 n_initial=10,
+                 time_budget=None,
+                 gamma=0.25,
+                 n_ei_candidates=24,
+                 n_jobs=2,
+                 random_state=0,
+                 return_train_score=True,
+                 verbose=1):
+        self.estimator = estimator
+        self.param_distributions = param_distributions
+        self.scoring = scoring
+        self.cv = cv
+        self.refit = refit
+        self.n_iter = n_iter
+        self.batch_size = batch_size
+        self.n_initial = n_initial
+        self.time_budget = time_budget
+        self.gamma = gamma
+        self.n_ei_candidates = n_ei_candidates
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.return_train_score = return_train_score
+        self.verbose = verbose
+
+    def fit(self, X, y, **fit_params):
+        '''run tpe search and refit best estimator on (X, y)
+        '''
+        rng = check_random_state(self.random_state)
+        dims = [_Dimension(k, v) for k, v in
+                sorted(self.param_distributions.items())]
+        names = _get_names(self.scoring)
+        refit = 'score' if names == ['score'] else self.refit
+        n_initial = max(min(self.n_initial, self.n_iter), 1)
+
+        t0 = time.time()
+        obs = np.empty((0, len(dims)))
+        losses = np.empty(0)
+        candidates = []
+        results = {}
+        n_fits = 0
+        i = 0
+        while len(candidates) < self.n_iter:
+            if (self.time_budget is not None
+                    and time.time() - t0 > self.time_budget):
+                print('time budget {}s exhausted after {} candidates'.format(
+                    self.time_budget, len(candidates)))
+                break
+            n = min(self.batch_size, self.n_iter - len(candidates))
+            if len(candidates) < n_initial:
+                n = min(n, n_initial - len(candidates))
+                u = _sample_prior(dims, n, rng)
+            else:
+                u = _suggest(dims, obs, losses, n, rng, self.gamma,
+                             self.n_ei_candidates)
+            params = [_to_params(dims, row) for row in u]
+            scores = _evaluate_candidates(self.estimator, X, y, params,
+                                          self.scoring, self.cv, self.n_jobs,
+                                          self.return_train_score, fit_params)
+            for p, sc in zip(params, scores):
+                n_fits += len(sc['fit_time'])
+                results[len(candidates)] = dict(_summary(sc), iter=i,
+                                                elapsed=time.time() - t0)
+                candidates.append(p)
+            loss = [-results[k]['mean_test_' + refit]
+                    for k in range(len(obs), len(candidates))]
+            obs = np.vstack([obs, u])
+            losses = np.append(losses, np.where(np.isnan(loss), np.inf, loss))
+            if self.verbose > 0:
+                print('batch {}: best {} = {:.4f} of {} candidates'.format(
+                    i, refit, -losses.min(), len(candidates)))
+            i += 1
+
+        self.cv_results_ = _cv_results(candidates, results, names,
+                                       by_iter=False)
+        best = self.cv_results_['rank_test_' + refit].idxmin()
+        self.best_params_ = candidates[best]
+        self.best_score_ = self.cv_results_.loc[best, 'mean_test_' + refit]
+        self.best_estimator_ = clone(self.estimator).set_params(
+            **self.best_params_)
+        t1 = time.time()
+        self.best_estimator_.fit(X, y, **fit_params)
+        self.refit_time_ = time.time() - t1
+        self.n_fits_ = n_fits
+        return self
+
+
+class Path_search(BaseEstimator):
+    '''grid search of param_grid where path_param (n_estimators) of final 
+    estimator is evaluated along its path
+    
+    for each of the other params & fold, the pre-final steps and the largest
+    ensemble are fitted once, ensembles of smaller size are scored by
+    truncation of the fitted one:
+        - staged_xxx methods for boosting (GradientBoosting, AdaBoost, 
+        RUSBoost)
+        - ntree_limit/iteration_range for xgboost
+        - first k estimators_ for forests
+        - otherwise warm_start growth of final estimator in ascending order
+    truncated ensembles give the same predictions as ensembles fitted with
+    smaller n_estimators, so cv_results_ is the same as GridSearchCV's
+    
+    parameters
+    ----
+    estimator
+        - sklearn estimator or pipeline instance
+    param_grid
+        - dict or list of dicts, each searching path_param
+    scoring
+        - scorer callable or dict of scorers {name: scorer}
+    cv
+        - int, cross-validation generator or an iterable
+    refit
+        - str, scorer name to rank candidates & refit best estimator, 
+        ignored for single metric scoring
+    path_param
+        - parameter of final estimator to evaluate along path
+    n_jobs
+        - number of (params, fold) fits run in parallel
+    return_train_score
+        - bool, see GridSearchCV
+    verbose
+        - if > 0, print number of fits
+    
+    attributes
+    ----
+    cv_results_
+        - DataFrame, 1 row per candidate
+    best_params_
+    best_score_
+    best_estimator_
+    n_fits_
+        - number of (params, fold) fits performed
+    '''
+
+    def __init__(self,
+                 estimator,
+                 param_grid,
+                 scoring=None,
+                 cv=3,
+                 refit='roc_auc',
+                 path_param='n_estimators',
+                 n_jobs=2,
+                 return_train_score=True,
+                 verbose=1):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.refit = refit
+        self.path_param = path_param
+        self.n_jobs = n_jobs
+        self.return_train_score = return_train_score
+        self.verbose = verbose
+
+    @staticmethod
+    def applicable(estimator, param_grid, path_param='n_estimators'):
+        '''return True if param_grid can be searched by Path_search, i.e. 
+        every grid searches path_param of a supported final estimator
+        '''
+        key = _final_param(estimator, path_param)
+        if key is None or _path_mode(_final_estimator(estimator)) is None:
+            return False
+        grids = param_grid if isinstance(param_grid, list) else [param_grid]
+        return all(key in g for g in grids)
+
+    def fit(self, X, y, **fit_params):
+        '''evaluate param_grid along path and refit best estimator
+        '''
+        if not self.applicable(self.estimator, self.param_grid,
+                               self.path_param):
+            raise ValueError("path_param '{}' of {} can not be evaluated "
+                             "along path".format(
+                                 self.path_param,
+                                 self.estimator.__class__.__name__))
+        key = _final_param(self.estimator, self.path_param)
+        names = _get_names(self.scoring)
+        refit = 'score' if names == ['score'] else self.refit
+        # group candidates by params other than path_param
+        candidates = list(ParameterGrid(self.param_grid))
+        groups = {}
+        for i, c in enumerate(candidates):
+            other = {k: v for k, v in c.items() if k != key}
+            groups.setdefault(repr(sorted(other.items())),
+                              (other, {}))[1][int(c[key])] = i
+        groups = list(groups.values())
+
+        splits = list(check_cv(self.cv, y, classifier=True).split(X, y))
+        tasks = [(g, j) for g in range(len(groups)) for j in range(len(splits))]
+        out = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_path)(self.estimator, X, y, groups[g][0], key,
+                               sorted(groups[g][1]), splits[j], self.scoring,
+                               self.return_train_score, fit_params)
+            for g, j in tasks)
+
+        scores = [{} for _ in candidates]
+        for (g, _), path in zip(tasks, out):
+            for n, sc in path.items():
+                for k, v in sc.items():
+                    scores[groups[g][1][n]].setdefault(k, []).append(v)
+        results = {i: _summary(sc) for i, sc in enumerate(scores)}
+        self.cv_results_ = _cv_results(candidates, results, names,
+                                       by_iter=False)
+        best = self.cv_results_['rank_test_' + refit].idxmin()
+        self.best_params_ = candidates[best]
+        self.best_score_ = self.cv_results_.loc[best, 'mean_test_' + refit]
+        self.best_estimator_ = clone(self.estimator).set_params(
+            **self.best_params_)
+        t0 = time.time()
+        self.best_estimator_.fit(X, y, **fit_params)
+        self.refit_time_ = time.time() - t0
+        self.n_fits_ = len(tasks)
+        if self.verbose > 0:
+            print('{} candidates evaluated along {} path by {} fits instead '
+                  'of {}\n'.format(len(candidates), key, len(tasks),
+                                    len(candidates) * len(splits)))
+        return self
+
+
+class _Path_proxy(ClassifierMixin, BaseEstimator):
+    '''fitted classifier of one point on the path, returning outputs 
+    computed by _fit_path for datasets identified by id
+    '''
+
+    def __init__(self, classes, outputs):
+        self.classes_ = classes
+        self.outputs = outputs
+
+    def __getattr__(self, name):
+        # only methods of the fitted final estimator are exposed
+        outputs = self.__dict__.get('outputs', {})
+        if name in ('predict', 'predict_proba', 'decision_function') \
+                and name in outputs:
+            def method(X):
+                return outputs[name][id(X)]
+            method.__name__ = name
+            return method
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            self.__class__.__name__, name))
+
+
+def _final_estimator(estimator):
+    if hasattr(estimator, 'steps'):
+        return estimator.steps[-1][1]
+    return estimator
+
+
+def _path_mode(final):
+    '''return how to evaluate ensembles of smaller size of final estimator
+    '''
+    try:
+        from sklearn.ensemble.forest import ForestClassifier
+    except ImportError:
+        from sklearn.ensemble._forest import ForestClassifier
+    if hasattr(final, 'staged_predict'):
+        return 'staged'
+    if hasattr(final, 'get_booster'):
+        return 'xgb'
+    if isinstance(final, ForestClassifier):
+        return 'forest'
+    if 'warm_start' in final.get_params():
+        return 'warm_start'
+    return None
+
+
+def _fit_path(estimator, X, y, params, key, path, split, scoring,
+              return_train_score, fit_params):
+    '''fit estimator with params & max of path on train split, return 
+    {n: scores} of each n of path, scores in the form of cross_validate
+    '''
+    train, test = split
+    X_train, y_train = (_split.safe_indexing(X, train),
+                        _split.safe_indexing(y, train))
+    X_test, y_test = (_split.safe_indexing(X, test),
+                      _split.safe_indexing(y, test))
+    est = clone(estimator).set_params(**params, **{key: max(path)})
+    final = _final_estimator(est)
+    mode = _path_mode(final)
+
+    # fit pre-final steps once, samplers only resample train data
+    t0 = time.time()
+    Xt, yt = X_train, y_train
+    X_sets = {'test': X_test}
+    if return_train_score:
+        X_sets['train'] = X_train
+    if hasattr(est, 'steps'):
+        for name, step in est.steps[:-1]:
+            if step is None or step == 'passthrough':
+                continue
+            kw = _step_params(fit_params, name)
+            if hasattr(step, 'fit_resample'):
+                Xt, yt = step.fit_resample(Xt, yt, **kw)
+            elif hasattr(step, 'fit_sample'):
+                Xt, yt = step.fit_sample(Xt, yt, **kw)
+            else:
+                Xt = step.fit_transform(Xt, yt, **kw)
+                X_sets = {k: step.transform(v) for k, v in X_sets.items()}
+        final_params = _step_params(fit_params, est.steps[-1][0])
+    else:
+        final_params = fit_params
+    methods = [
+        m for m in ('predict', 'predict_proba', 'decision_function')
+        if hasattr(final, m)
+    ]
+
+    outputs = {n: {m: {} for m in methods} for n in path}
+    if mode == 'warm_start':
+        # grow final estimator in ascending order of path
+        fit_time = 0
+        final.set_params(warm_start=True)
+        for n in path:
+            final.set_params(**{key.split('__')[-1]: n})
+            final.fit(Xt, yt, **final_params)
+            fit_time = time.time() - t0
+            for v in X_sets.values():
+                for m in methods:
+                    outputs[n][m][id(v)] = getattr(final, m)(v)
+    else:
+        final.fit(Xt, yt, **final_params)
+        fit_time = time.time() - t0
+        for v in X_sets.values():
+            for m in methods:
+                for n, o in _truncated_outputs(final, mode, m, v, path):
+                    outputs[n][m][id(v)] = o
+
+    if not isinstance(scoring, dict):
+        scoring = {'score': check_scoring(est, scoring or 'accuracy')}
+    ret = {}
+    for n in path:
+        t1 = time.time()
+        proxy = _Path_proxy(final.classes_, outputs[n])
+        sc = {}
+        for kind, v, y_v in (('test', X_sets['test'], y_test),
+                             ('train', X_sets.get('train'), y_train)):
+            if v is None:
+                continue
+            sc.update({'_'.join([kind, k]): scorer(proxy, v, y_v)
+                       for k, scorer in scoring.items()})
+        sc['fit_time'] = fit_time
+        sc['score_time'] = time.time() - t1
+        ret[n] = sc
+    return ret
+
+
+def _truncated_outputs(final, mode, method, X, path):
+    '''yield (n, output of method on X) of final estimator truncated to n 
+    estimators, for each n of path (ascending)
+    '''
+    if mode == 'staged':
+        stages = getattr(final, 'staged_' + method)(X)
+        k = 0
+        for i, o in enumerate(stages, 1):
+            while k < len(path) and path[k] == i:
+                yield path[k], o
+                k += 1
+            if k == len(path):
+                break
+        # boosting stopped early, larger ensembles stop at the same stage
+        for n in path[k:]:
+            yield n, o
+    elif mode == 'xgb':
+        for n in path:
+            try:
+                yield n, getattr(final, method)(X, iteration_range=(0, n))
+            except TypeError:
+                yield n, getattr(final, method)(X, ntree_limit=n)
+    elif mode == 'forest':
+        # accumulate mean of tree probabilities as forest predict_proba
+        total = 0
+        k = 0
+        for i, tree in enumerate(final.estimators_, 1):
+            total = total + tree.predict_proba(X)
+            while k < len(path) and path[k] == i:
+                proba = total / i
+                if method == 'predict':
+                    yield path[k], final.classes_.take(np.argmax(proba, 1))
+                else:
+                    yield path[k], proba
+                k += 1
+
+
+def _step_params(fit_params, name):
+    '''return fit params of pipeline step name
+    '''
+    prefix = name + '__'
+    return {
+        k[len(prefix):]: v
+        for k, v in fit_params.items() if k.startswith(prefix)
+    }
+
+
+class _Dimension():
+    '''search dimension of Tpe_search, numbers are modeled in unit interval
+    [0, 1] (of log values if ratio of bounds > 100), categories by index
+    '''
+
+    def __init__(self, name, values):
+        self.name = name
+        if hasattr(values, 'rvs'):
+            self.dist = values
+            self.categories = None
+            low, high = _bounds(values)
+            self.is_int = hasattr(getattr(values, 'dist', None), 'pmf')
+            self.log = low > 0 and high / low > 100
+            if self.log:
+                low, high = np.log(low), np.log(high)
+            self.low, self.high = low, high
+        else:
+            self.categories = list(values)
+            if len(self.categories) == 0:
+                raise ValueError("no values to search for '{}'".format(name))
+
+    def sample(self, n, rng):
+        '''return n internal values drawn from prior
+        '''
+        if self.categories is not None:
+            return rng.randint(len(self.categories), size=n)
+        x = np.asarray(self.dist.rvs(size=n, random_state=rng), dtype=float)
+        if self.log:
+            x = np.log(np.maximum(x, np.exp(self.low)))
+        return np.clip((x - self.low) / max(self.high - self.low, 1e-12), 0,
+                       1)
+
+    def value(self, u):
+        '''return parameter value of internal value u
+        '''
+        if self.categories is not None:
+            return self.categories[int(u)]
+        x = self.low + u * (self.high - self.low)
+        if self.log:
+            x = np.exp(x)
+        if self.is_int:
+            return int(np.round(x))
+        return float(x)
+
+
+def _bounds(dist):
+    '''return finite (low, high) of scipy distribution
+    '''
+    low, high = dist.support()
+    if not np.isfinite(low):
+        low = dist.ppf(0.001)
+    if not np.isfinite(high):
+        high = dist.ppf(0.999)
+    return float(low), float(high)
+
+
+def _sample_prior(dims, n, rng):
+    return np.column_stack([d.sample(n, rng) for d in dims])
+
+
+def _to_params(dims, row):
+    return {d.name: d.value(u) for d, u in zip(dims, row)}
+
+
+def _suggest(dims, obs, losses, n, rng, gamma, n_ei_candidates):
+    '''return n new candidates (internal values) maximizing l(x)/g(x)
+    '''
+    n_good = max(int(np.ceil(gamma * len(losses))), 1)
+    order = np.argsort(losses, kind='mergesort')
+    good, bad = obs[order[:n_good]], obs[order[n_good:]]
+    draws = _parzen_sample(dims, good, n * n_ei_candidates, rng)
+    log_ratio = (_parzen_logpdf(dims, draws, good) - 
+                 _parzen_logpdf(dims, draws, bad))
+
+    # each candidate is the best of its own n_ei_candidates draws, not 
+    # evaluated yet, so that a batch does not collapse to one point
+    seen = set(repr(_to_params(dims, row)) for row in obs)
+    picked = []
+    for pool in np.arange(len(draws)).reshape(n, n_ei_candidates):
+        for i in pool[np.argsort(-log_ratio[pool], kind='mergesort')]:
+            key = repr(_to_params(dims, draws[i]))
+            if key not in seen:
+                seen.add(key)
+                picked.append(draws[i])
+                break
+    if len(picked) < n:
+        picked.extend(_sample_prior(dims, n - len(picked), rng))
+    return np.array(picked)
+
+
+def _parzen_bandwidth(dims, mu):
+    '''return bandwidth of each dimension, gaussian sigma of numbers 
+    (scott's rule, not narrower than 0.5/sqrt(n + 1) of prior width) and 
+    probability to change category of categories
+    '''
+    n = len(mu)
+    bw = np.empty(len(dims))
+    for k, d in enumerate(dims):
+        if d.categories is None:
+            sigma = 1.06 * np.std(mu[:, k]) * n**(-0.2) if n > 1 else 0
+            bw[k] = np.clip(sigma, 0.5 / np.sqrt(n + 1), 1.0)
+        else:
+            K = len(d.categories)
+            bw[k] = min(0.5 / np.sqrt(n + 1), (K - 1) / K)
+            bw[k] = bw[k] if K > 1 else 0
+    return bw
+
+
+def _parzen_sample(dims, mu, m, rng):
+    '''draw m samples from mixture of uniform prior & product kernels 
+    centered at each row of mu
+    '''
+    n = len(mu)
+    bw = _parzen_bandwidth(dims, mu)
+    k = rng.randint(n + 1, size=m)
+    kernel = k < n
+    x = np.empty((m, len(dims)))
+    for j, d in enumerate(dims):
+        if d.categories is None:
+            x[:, j] = rng.uniform(size=m)
+            x[kernel, j] = rng.normal(mu[k[kernel], j], bw[j])
+            # reflect at bounds rather than clip, not to pile up on bounds
+            x[:, j] = np.clip(1 - np.abs(1 - np.abs(x[:, j])), 0, 1)
+        elif len(d.categories) == 1:
+            x[:, j] = 0
+        else:
+            K = len(d.categories)
+            x[:, j] = rng.randint(K, size=m)
+            # keep category of kernel center with probability 1 - bw
+            keep = kernel & (rng.uniform(size=m) < 1 - bw[j] * K / (K - 1))
+            x[keep, j] = mu[k[keep], j]
+    return x
+
+
+def _parzen_logpdf(dims, x, mu):
+    '''return log density of mixture of uniform prior & product kernels 
+    centered at each row of mu
+    '''
+    n = len(mu)
+    if n == 0:
+        return np.zeros(len(x))
+    bw = _parzen_bandwidth(dims, mu)
+    log_kernel = np.zeros((len(x), n))
+    log_prior = 0
+    for j, d in enumerate(dims):
+        if d.categories is None:
+            z = (x[:, j, None] - mu[None, :, j]) / bw[j]
+            log_kernel += -0.5 * z**2 - np.log(bw[j] * np.sqrt(2 * np.pi))
+        elif len(d.categories) > 1:
+            K = len(d.categories)
+            same = x[:, j, None] == mu[None, :, j]
+            log_kernel += np.where(same, np.log(1 - bw[j]),
+                                   np.log(bw[j] / (K - 1)))
+            log_prior -= np.log(K)
+    log_all = np.column_stack([np.full(len(x), log_prior), log_kernel])
+    top = log_all.max(1)
+    return top + np.log(np.exp(log_all - top[:, None]).sum(1) / (n + 1))
+
+
+def _evaluate_candidates(estimator, X, y, params, scoring, cv, n_jobs,
+                         return_train_score, fit_params):
+    '''cross validate each of params in parallel by (candidate, fold)
+
+    return
+    ----
+    list of cross_validate results of each params, in the order of params
+    '''
+    splits = list(check_cv(cv, y, classifier=True).split(X, y))
+    tasks = [(i, j) for i in range(len(params)) for j in range(len(splits))]
+    kwargs = {'fit_params': fit_params} if fit_params else {}
+    out = Parallel(n_jobs=n_jobs)(
+        delayed(cross_validate)(clone(estimator).set_params(**params[i]),
+                                X,
+                                y,
+                                scoring=scoring,
+                                cv=[splits[j]],
+                                return_train_score=return_train_score,
+                                **kwargs)
+        for i, j in tasks)
+    scores = [{} for _ in params]
+    for (i, _), s in zip(tasks, out):
+        for k, v in s.items():
+            scores[i].setdefault(k, []).extend(v)
+    return scores
+
+
+def _summary(scores):
+    '''return mean & std of cross_validate results
+    '''
+    d = {}
+    for k, v in scores.items():
+        if k in ('fit_time', 'score_time'):
+            d['mean_' + k] = np.mean(v)
+            d['std_' + k] = np.std(v)
+        else:
+            kind, name = k.split('_', 1)
+            d['mean_{}_{}'.format(kind, name)] = np.mean(v)
+            d['std_{}_{}'.format(kind, name)] = np.std(v)
+    return d
+
+
+def _cv_results(candidates, results, names, by_iter=True):
+    '''return cv_results DataFrame, rank by (last rung reached, score) if 
+    by_iter else by score
+    '''
+    index = sorted(results)
+    df = pd.DataFrame([results[i] for i in index], index=index)
+    df['params'] = [candidates[i] for i in index]
+    for k in sorted(set(k for c in candidates for k in c)):
+        df['param_' + k] = [candidates[i].get(k) for i in index]
+    n_iter = df['iter'].values if by_iter else np.zeros(len(df))
+    for name in names:
+        df['rank_test_' + name] = _rank(n_iter, df['mean_test_' + name].values)
+    return df
+
+
+def _rank(n_iter, score):
+    '''return rank of candidates, by last rung reached then by score, 
+    ties get the minimum rank
+    '''
+    score = np.where(np.isnan(score), -np.inf, score)
+    order = np.lexsort((-score, -n_iter))
+    rank = np.empty(len(order), dtype=int)
+    for k, i in enumerate(order):
+        j = order[k - 1]
+        if k > 0 and n_iter[i] == n_iter[j] and score[i] == score[j]:
+            rank[i] = rank[j]
+        else:
+            rank[i] = k + 1
+    return rank
+
+
+def _get_names(scoring):
+    '''return scorer names of scoring
+    '''
+    if callable(scoring) or scoring is None or isinstance(scoring, str):
+        return ['score']
+    if isinstance(scoring, dict):
+        return list(scoring)
+    return list(np.ravel(scoring))
+
+
+def _final_param(estimator, param):
+    '''return full name of param of final estimator of (pipeline) estimator,
+    None if not found
+    '''
+    params = estimator.get_params()
+    if param in params and not hasattr(estimator, 'steps'):
+        return param
+    if hasattr(estimator, 'steps'):
+        name = estimator.steps[-1][0]
+        key = param if param.startswith(name + '__') else '__'.join(
+            [name, param])
+        if key in params:
+            return key
+    return None
+
+
+def _add_resource(params, resource, n_r):
+    '''add resource param to candidate params
+    '''
+    if resource == 'n_samples':
+        return params
+    return dict(params, **{resource: n_r})
+
+
+def _n_rungs(n_candidates, max_r, min_r, factor):
+    '''return number of rungs, limited by candidates and resources
+    '''
+    n_c = 1 + int(np.floor(np.log(max(n_candidates, 1)) / np.log(factor)))
+    n_r = 1 + int(np.floor(np.log(max_r / min_r) / np.log(factor)))
+    return max(min(n_c, n_r), 1)
+
+
+def _n_splits(cv, X=None, y=None):
+    return check_cv(cv, y, classifier=True).get_n_splits(X, y)
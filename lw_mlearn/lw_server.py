@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+local http server scoring json records with a saved estimator, concurrent
+requests are coalesced into micro-batches for vectorized predictions
+
+@author: roger luo
+
+function
+-----
+
+load_estimator:
+    return fitted estimator read from '.pipe' or '.instance' file of a model
+    folder saved by ML_model.save
+
+make_server:
+    return http server (not started) bound to localhost, serving
+        - POST /predict, json {"records": [{col: value, ...}, ...]}, a list
+          of records or a single record; return {"scores": [...]}
+        - GET /metrics, json of throughput counters & latency histograms
+
+serve:
+    make_server and serve until interrupted
+
+class
+-----
+
+Batch_scorer:
+    score queued requests in micro-batches on a worker thread
+
+Server_metrics:
+    thread safe counters & histograms of requests and batches
+
+usage
+-----
+python -m lw_mlearn.lw_server model_path [--port 8000] [--max-batch 256]
+    [--max-wait-us 2000]
+
+.. note::
+    the server binds loopback addresses only and has no authentication,
+    put it behind a proxy for remote clients
+"""
+import os
+import json
+import socket
+import time
+import bisect
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+from queue import Queue, Empty
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from lw_mlearn.utilis.read_write import Reader
+
+_LOCALHOST = ('127.0.0.1', 'localhost', '::1')
+# upper bounds of histogram buckets, last bucket is unbounded
+_LATENCY_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+_BATCH_SIZE = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def load_estimator(path, suffix=('.pipe', '.instance')):
+    '''return fitted estimator saved in path folder
+
+    path
+        - model folder of ML_model, or path of a '.pipe'/'.instance' file
+    suffix
+        - file suffixes to try in order, estimator of '.instance' is taken
+        from ML_model.estimator
+    '''
+    if not os.path.exists(path):
+        raise FileNotFoundError("'{}' not found".format(path))
+    if os.path.isfile(path):
+        reader = Reader(os.path.dirname(path) or '.')
+        obj = reader.read(path)
+    else:
+        reader = Reader(path)
+        obj = None
+        for s in suffix:
+            obj = reader.read_all(suffix=s, lazy=True, cache_size=0).first()
+            if obj is not None:
+                break
+    if obj is not None:
+        if hasattr(obj, 'save'):
+            # ML_model instance reads its estimator from its folder
+            obj.path = path if os.path.isdir(path) else reader.path_
+            return obj.estimator
+        return obj
+    raise FileNotFoundError("no file of suffix {} found in '{}'".format(
+        list(suffix), path))
+
+
+def _input_labels(estimator):
+    '''return input column labels of the first step of estimator having
+    'input_labels' (Split_cls, encoders), None if not found
+    '''
+    steps = [i[1] for i in getattr(estimator, 'steps', [])] or [estimator]
+    for step in steps:
+        labels = getattr(step, 'input_labels', None)
+        if labels is not None:
+            return list(labels)
+    return None
+
+
+class Server_metrics():
+    '''thread safe throughput counters, latency & batch size histograms
+
+    method
+    ----
+    record_request:
+        count a request of n records and its latency in seconds
+    record_batch:
+        count a scored batch of n records
+    record_error:
+        count a failed request
+    to_dict:
+        return json serializable dict of metrics
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+        self.n_requests = 0
+        self.n_records = 0
+        self.n_batches = 0
+        self.n_errors = 0
+        self.latency_counts = [0] * (len(_LATENCY_MS) + 1)
+        self.batch_counts = [0] * (len(_BATCH_SIZE) + 1)
+        self._latency_sum = 0.0
+
+    def record_request(self, n, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            self.n_requests += 1
+            self.n_records += n
+            self._latency_sum += ms
+            self.latency_counts[bisect.bisect_left(_LATENCY_MS, ms)] += 1
+
+    def record_batch(self, n):
+        with self._lock:
+            self.n_batches += 1
+            self.batch_counts[bisect.bisect_left(_BATCH_SIZE, n)] += 1
+
+    def record_error(self):
+        with self._lock:
+            self.n_errors += 1
+
+    def to_dict(self):
+        with self._lock:
+            uptime = time.time() - self.start_time
+            n_req = max(self.n_requests, 1)
+            return {
+                'uptime_s': uptime,
+                'requests': self.n_requests,
+                'records': self.n_records,
+                'batches': self.n_batches,
+                'errors': self.n_errors,
+                'requests_per_s': self.n_requests / uptime,
+                'records_per_s': self.n_records / uptime,
+                'mean_batch_size': self.n_records / max(self.n_batches, 1),
+                'latency_ms': {
+                    'mean': self._latency_sum / n_req,
+                    'p50': _quantile(self.latency_counts, _LATENCY_MS, 0.5),
+                    'p99': _quantile(self.latency_counts, _LATENCY_MS, 0.99),
+                    'buckets': _buckets(self.latency_counts, _LATENCY_MS)
+                },
+                'batch_size': _buckets(self.batch_counts, _BATCH_SIZE)
+            }
+
+
+def _buckets(counts, bounds):
+    '''return list of {'le': upper bound, 'count': n} of histogram
+    '''
+    les = list(bounds) + ['inf']
+    return [{'le': le, 'count': n} for le, n in zip(les, counts)]
+
+
+def _quantile(counts, bounds, q):
+    '''return upper bound of bucket containing q quantile, None if empty
+    '''
+    total = sum(counts)
+    if total == 0:
+        return None
+    acc = 0
+    for i, n in enumerate(counts):
+        acc += n
+        if acc >= q * total:
+            return bounds[i] if i < len(bounds) else 'inf'
+
+
+class Batch_scorer():
+    '''score requests of json records in micro-batches
+
+    requests submitted by concurrent threads are queued, a worker thread
+    takes the first waiting request and keeps collecting requests until
+    max_batch records or max_wait_us microseconds, then scores them by one
+    vectorized call of the estimator
+
+    parameters
+    ----
+    estimator
+        - fitted estimator or pipeline accepting DataFrame
+    max_batch
+        - max number of records of a batch, a single request larger than
+        max_batch is scored as one batch
+    max_wait_us
+        - max microseconds to wait for more requests after the first one
+    pre_method
+        - 'predict_proba', 'decision_function' or 'predict'
+    pos_label
+        - column of 2d predictions to return
+    metrics
+        - Server_metrics instance, default a new one
+
+    method
+    ----
+    submit:
+        queue list of records, return Future of list of scores
+    score:
+        submit and wait for scores
+    close:
+        stop the worker thread
+    '''
+
+    def __init__(self, estimator, max_batch=256, max_wait_us=2000,
+                 pre_method='predict_proba', pos_label=1, metrics=None):
+        self.estimator = estimator
+        self.max_batch = max_batch
+        self.max_wait_us = max_wait_us
+        self.pre_method = pre_method
+        self.pos_label = pos_label
+        self.metrics = Server_metrics() if metrics is None else metrics
+        self.columns = _input_labels(estimator)
+        self._queue = Queue()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, records):
+        '''return Future of scores of records, list of dict
+        '''
+        future = Future()
+        if self._stop.is_set():
+            future.set_exception(RuntimeError('Batch_scorer closed'))
+        else:
+            self._queue.put((records, future))
+        return future
+
+    def score(self, records, timeout=None):
+        return self.submit(records).result(timeout)
+
+    def close(self):
+        self._stop.set()
+        self._worker.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except Empty:
+                continue
+            n = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait_us / 1e6
+            while n < self.max_batch:
+                wait = deadline - time.perf_counter()
+                if wait <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=wait)
+                except Empty:
+                    break
+                batch.append(item)
+                n += len(item[0])
+            self._score_batch(batch)
+        # fail requests left in queue
+        while not self._queue.empty():
+            self._queue.get()[1].set_exception(
+                RuntimeError('Batch_scorer closed'))
+
+    def _score_batch(self, batch):
+        '''score batch of (records, future) by one call, if it fails score
+        each request alone so that bad records fail only their own request
+        '''
+        records = [r for i in batch for r in i[0]]
+        try:
+            scores = self._predict(records)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+            else:
+                for item in batch:
+                    self._score_batch([item])
+            return
+        self.metrics.record_batch(len(records))
+        start = 0
+        for item, future in batch:
+            future.set_result(scores[start:start + len(item)])
+            start += len(item)
+
+    def _predict(self, records):
+        X = pd.DataFrame.from_records(records)
+        if self.columns is not None:
+            # json keys are str, map them back to labels fitted on
+            names = {str(i): i for i in self.columns}
+            X = X.rename(columns=names).reindex(columns=self.columns)
+        y_pre = getattr(self.estimator, self.pre_method)(X)
+        if np.ndim(y_pre) > 1:
+            y_pre = y_pre[:, self.pos_label]
+        return np.asarray(y_pre).tolist()
+
+
+class _Server(ThreadingHTTPServer):
+    '''http server with a deeper listen backlog for concurrent clients
+    '''
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _Server6(_Server):
+    '''_Server bound to IPv6 loopback address '::1'
+    '''
+    address_family = socket.AF_INET6
+
+
+class _Handler(BaseHTTPRequestHandler):
+    '''request handler, self.server.scorer is the Batch_scorer
+    '''
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/predict':
+            return self._reply(404, {'error': 'not found'})
+        t0 = time.perf_counter()
+        metrics = self.server.scorer.metrics
+        try:
+            size = int(self.headers.get('Content-Length', 0))
+            records = _parse_records(json.loads(self.rfile.read(size)))
+            scores = self.server.scorer.score(records)
+        except Exception as e:
+            metrics.record_error()
+            return self._reply(400, {'error': repr(e)})
+        metrics.record_request(len(records), time.perf_counter() - t0)
+        self._reply(200, {'scores': scores})
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            return self._reply(404, {'error': 'not found'})
+        self._reply(200, self.server.scorer.metrics.to_dict())
+
+    def _reply(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose > 0:
+            super().log_message(format, *args)
+
+
+def _parse_records(obj):
+    '''return list of records from parsed json body
+    '''
+    if isinstance(obj, dict):
+        obj = obj['records'] if 'records' in obj else [obj]
+    if not isinstance(obj, list) or not all(isinstance(i, dict)
+                                            for i in obj):
+        raise ValueError('json body must be a record, list of records or '
+                         '{"records": [...]}')
+    return obj
+
+
+def make_server(path_or_estimator, host='127.0.0.1', port=8000,
+                max_batch=256, max_wait_us=2000, pre_method='predict_proba',
+                pos_label=1, verbose=0):
+    '''return ThreadingHTTPServer scoring records, call serve_forever() to
+    start, and shutdown() & server_close() to stop; the Batch_scorer is
+    server.scorer
+
+    path_or_estimator
+        - model folder, '.pipe'/'.instance' file or fitted estimator
+    host
+        - loopback address to bind
+    port
+        - 0 to bind a free port, see server.server_address
+    max_batch, max_wait_us, pre_method, pos_label
+        - see Batch_scorer
+    verbose
+        - 1 to log each request to stderr
+    '''
+    if host not in _LOCALHOST:
+        raise ValueError("host must be one of {}, got '{}'".format(
+            _LOCALHOST, host))
+    if isinstance(path_or_estimator, str):
+        estimator = load_estimator(path_or_estimator)
+    else:
+        estimator = path_or_estimator
+    server_class = _Server6 if ':' in host else _Server
+    server = server_class((host, port), _Handler)
+    server.verbose = verbose
+    server.scorer = Batch_scorer(estimator, max_batch, max_wait_us,
+                                 pre_method, pos_label)
+    return server
+
+
+def serve(path_or_estimator, host='127.0.0.1', port=8000, **kwargs):
+    '''make_server and serve until KeyboardInterrupt, see make_server
+    '''
+    server = make_server(path_or_estimator, host, port, **kwargs)
+    host, port = server.server_address[:2]
+    print('serving {} on http://{}:{} ...\n'.format(
+        server.scorer.estimator.__class__.__name__,
+        '[{}]'.format(host) if ':' in host else host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.scorer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='lw_mlearn model server')
+    parser.add_argument('path', help="model folder or '.pipe' file")
+    parser.add_argument('--host', default='127.0.0.1', choices=_LOCALHOST)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-wait-us', type=int, default=2000)
+    parser.add_argument('--pre-method', default='predict_proba')
+    parser.add_argument('--verbose', type=int, default=0)
+    args = parser.parse_args(argv)
+    serve(args.path, args.host, args.port, max_batch=args.max_batch,
+          max_wait_us=args.max_wait_us, pre_method=args.pre_method,
+          verbose=args.verbose)
+
+
+if __name__ == '__main__':
+    main()
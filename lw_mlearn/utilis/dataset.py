@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+memory-mapped store of (X, y) data sets, to share one physical copy of data
+among worker processes through the page cache
+
+@author: roger luo
+
+layout of a store folder
+-----
+block<i>.npy:
+    numeric/bool/datetime columns of the same dtype, shape (n_cols, n_rows)
+    so that each column is contiguous
+codes.npy:
+    integer codes of object & categorical columns, shape (n_cols, n_rows)
+y.npy:
+    target, if not None
+meta.pkl:
+    sidecar of column labels & positions, categories, index, y name and
+    columns of other dtypes (pickled as they are)
+
+function
+-----
+
+dump_dataset:
+    write X, y into a store folder
+
+load_dataset:
+    return X, y of a store folder, .npy files opened by np.load with
+    mmap_mode
+
+class
+-----
+
+Dataset_ref:
+    picklable reference to a store folder, loaded in worker processes
+
+.. note::
+    data loaded with mmap_mode='r' are read-only, steps modifying input in
+    place fail on them, use mmap_mode='c' (copy on write) for such steps;
+    when a loaded DataFrame is passed to joblib workers (egg. n_jobs of
+    cross validation or searches), memory-mapped arrays are sent by
+    reference instead of being pickled
+"""
+import os
+import shutil
+import pickle
+import numpy as np
+import pandas as pd
+
+# numpy dtype kinds stored as blocks
+_BLOCK_KINDS = 'biufcmM'
+
+
+def dump_dataset(X, y=None, path='dataset'):
+    '''write X, y into store folder path, existing store is replaced
+
+    X
+        - DataFrame or 2d ndarray
+    y
+        - Series, 1d ndarray or None
+    return
+    ----
+    path
+    '''
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    meta = {'n_rows': len(X), 'y': None}
+    if isinstance(X, np.ndarray) and X.dtype.kind in _BLOCK_KINDS:
+        # stored as is, loaded as memory-mapped ndarray
+        meta['x_type'] = 'ndarray'
+        np.save(os.path.join(path, 'X.npy'), np.ascontiguousarray(X))
+    else:
+        X = pd.DataFrame(X)
+        meta.update(x_type='DataFrame', **_dump_frame(X, path))
+    if y is not None:
+        meta['y'] = {'name': getattr(y, 'name', None),
+                     'series': isinstance(y, pd.Series)}
+        np.save(os.path.join(path, 'y.npy'), np.asarray(y))
+    with open(os.path.join(path, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f)
+    return path
+
+
+def _dump_frame(X, path):
+    '''write columns of X into block & codes files, return meta of frame
+    '''
+    blocks = {}
+    cats = []
+    others = {}
+    for i, (name, col) in enumerate(X.items()):
+        dtype = col.dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in _BLOCK_KINDS:
+            blocks.setdefault(dtype.str, []).append(i)
+        elif dtype == object or isinstance(dtype, pd.CategoricalDtype):
+            cats.append(i)
+        else:
+            others[i] = col
+    block_meta = []
+    for n, (dtype, positions) in enumerate(blocks.items()):
+        values = np.empty((len(positions), len(X)), dtype=dtype)
+        for j, p in enumerate(positions):
+            values[j] = X.iloc[:, p].values
+        np.save(os.path.join(path, 'block{}.npy'.format(n)), values)
+        block_meta.append(positions)
+    cat_meta = []
+    if len(cats) > 0:
+        codes = []
+        for p in cats:
+            col = X.iloc[:, p]
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                codes.append(col.cat.codes.values)
+                cat_meta.append((p, col.cat.categories, col.cat.ordered,
+                                 None))
+            else:
+                code, categories = pd.factorize(col)
+                codes.append(code)
+                # missing values of object column are restored as None if
+                # all of them are None, else as NaN
+                na = col[code == -1]
+                na = None if len(na) > 0 and all(na.map(
+                    lambda v: v is None)) else np.nan
+                cat_meta.append((p, categories, None, na))
+        n = max(len(i[1]) for i in cat_meta)
+        dtype = np.int8 if n < 2**7 else np.int16 if n < 2**15 \
+            else np.int32
+        codes = np.vstack(codes).astype(dtype)
+        np.save(os.path.join(path, 'codes.npy'), codes)
+    return {
+        'columns': X.columns,
+        'index': X.index,
+        'blocks': block_meta,
+        'cats': cat_meta,
+        'others': others
+    }
+
+
+def load_dataset(path, mmap_mode='r'):
+    '''return (X, y) of store folder path
+
+    mmap_mode
+        - 'r' read-only, 'c' copy on write, None to read into memory, see
+        numpy.load
+    '''
+    with open(os.path.join(path, 'meta.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+    if meta['x_type'] == 'ndarray':
+        X = np.load(os.path.join(path, 'X.npy'), mmap_mode=mmap_mode)
+    else:
+        X = _load_frame(meta, path, mmap_mode)
+    y = meta['y']
+    if y is not None:
+        values = np.load(os.path.join(path, 'y.npy'), mmap_mode=mmap_mode)
+        if y['series']:
+            index = X.index if isinstance(X, pd.DataFrame) else None
+            y = pd.Series(values, index=index, name=y['name'], copy=False)
+        else:
+            y = values
+    return X, y
+
+
+def _load_frame(meta, path, mmap_mode):
+    '''return DataFrame of blocks, codes & other columns
+    '''
+    items = []
+    for n, positions in enumerate(meta['blocks']):
+        values = np.load(os.path.join(path, 'block{}.npy'.format(n)),
+                         mmap_mode=mmap_mode)
+        items.append((values, positions))
+    if len(meta['cats']) > 0:
+        codes = np.load(os.path.join(path, 'codes.npy'), mmap_mode=mmap_mode)
+        obj, obj_pos = [], []
+        for code, (p, categories, ordered, na) in zip(codes, meta['cats']):
+            col = pd.Categorical.from_codes(code, categories, ordered)
+            if ordered is None:
+                col = np.asarray(col, dtype=object)
+                if na is None:
+                    col[code == -1] = None
+                obj.append(col)
+                obj_pos.append(p)
+            else:
+                items.append((col, [p]))
+        if len(obj) > 0:
+            items.append((np.vstack(obj), obj_pos))
+    for p, col in meta['others'].items():
+        items.append((col.values, [p]))
+    return _block_frame(items, meta['columns'], meta['index'])
+
+
+def _block_frame(items, columns, index):
+    '''return DataFrame of (values, positions) items without copying 
+    values, values are 2d arrays of shape (len(positions), n_rows) or 1d
+    extension arrays of one position; columns are copied into a new frame if
+    pandas block manager is not usable
+    '''
+    try:
+        from pandas.core.internals import BlockManager, make_block
+        mgr = BlockManager([make_block(values, placement=positions, ndim=2)
+                            for values, positions in items],
+                           [columns, index])
+        return pd.DataFrame(mgr)
+    except (ImportError, TypeError, ValueError, AssertionError):
+        cols = {}
+        for values, positions in items:
+            for j, p in enumerate(positions):
+                cols[p] = values[j] if np.ndim(values) == 2 else values
+        X = pd.DataFrame({i: cols[i] for i in range(len(columns))},
+                         index=index)
+        X.columns = columns
+        return X
+
+
+class Dataset_ref():
+    '''picklable reference to a store folder written by dump_dataset, pass
+    it to worker processes instead of data
+
+    method
+    ----
+    load:
+        return (X, y) of store, memory-mapped
+    '''
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        self.mmap_mode = mmap_mode
+
+    def load(self):
+        return load_dataset(self.path, self.mmap_mode)
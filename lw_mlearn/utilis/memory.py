@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+in-memory cache of fitted pipeline steps
+
+@author: roger luo
+
+class
+-----
+
+Memory_cache:
+    joblib.Memory like object, to be used as Pipeline(memory=...), fitted
+    transformers & transformed data are kept in process memory with least
+    recently used eviction bounded by bytes & entries
+
+function
+-----
+
+get_memory_cache:
+    return the process-wide Memory_cache instance
+"""
+import sys
+import copy
+import threading
+import numpy as np
+import pandas as pd
+
+from collections import OrderedDict
+from functools import wraps
+from joblib import hash as joblib_hash
+
+from lw_mlearn.utilis.utilis import get_fingerprint
+
+# keyword arguments of cached functions only for logging/callbacks
+_LOG_KWARGS = ('message_clsname', 'message', 'caller', 'callback_ctx')
+
+
+class Memory_cache():
+    '''least recently used cache of pipeline steps fitted in this process,
+    keyed by (function, step class & params, fingerprint of input data,
+    other arguments), so that identical prefixes of pipelines on the same
+    data (fold) are fitted once across grid searches, models & run_analy
+
+    parameters
+    ----
+    max_bytes
+        - bound of estimated size of cached results, default 1 GB
+    max_entries
+        - bound of number of cached results
+
+    method
+    ----
+    cache:
+        decorate func to memoize its results, see joblib.Memory.cache
+    stats:
+        return dict of hits, misses, evictions, entries, bytes
+    clear:
+        remove all cached results
+
+    .. note::
+        pickled instances are restored as the process-wide instance of
+        get_memory_cache() rather than carrying cached data, so each worker
+        process (egg. loky workers of n_jobs) keeps its own separate cache
+        and steps are only shared among fits run in the same process
+    '''
+
+    # not None, so that pipelines clone steps before fitting them through
+    # cache, as they do for joblib.Memory with a location
+    location = 'memory'
+
+    def __init__(self, max_bytes=2**30, max_entries=256):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self.clear()
+
+    def __reduce__(self):
+        return (get_memory_cache, ())
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # clone(pipeline) deep copies memory, cache must still be shared
+        return self
+
+    def __repr__(self):
+        return '{}(entries={entries}, bytes={bytes}, hits={hits}, ' \
+            'misses={misses})'.format(self.__class__.__name__, **self.stats())
+
+    def cache(self, func, **kwargs):
+        '''return func memoized in self, other keywords of joblib.Memory.cache
+        are ignored
+        '''
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = self._key(func, args, kwargs)
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    cached = self._data[key][0]
+                else:
+                    cached = None
+                    self._misses += 1
+            # results are copied once, as next steps may modify them in 
+            # place: cached results on hit, stored results on miss
+            if cached is not None:
+                return copy.deepcopy(cached)
+            result = func(*args, **kwargs)
+            self._store(key, result)
+            return result
+
+        return wrapper
+
+    def stats(self):
+        '''return dict of cache statistics
+        '''
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'entries': len(self._data),
+                'bytes': self._bytes
+            }
+
+    def clear(self):
+        '''remove all cached results and reset statistics
+        '''
+        with self._lock:
+            self._data = OrderedDict()
+            self._bytes = 0
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def _key(self, func, args, kwargs):
+        '''return key of func call, estimators are hashed by class & params,
+        data by content fingerprint (index included)
+        '''
+        parts = [func.__module__, func.__name__]
+        parts.extend(_hash_arg(i) for i in args)
+        parts.extend((k, _hash_arg(v)) for k, v in sorted(kwargs.items())
+                     if k not in _LOG_KWARGS)
+        return tuple(parts)
+
+    def _store(self, key, result):
+        nbytes = _nbytes(result)
+        if nbytes > self.max_bytes:
+            return
+        result = copy.deepcopy(result)
+        with self._lock:
+            if key in self._data:
+                return
+            self._data[key] = (result, nbytes)
+            self._bytes += nbytes
+            while (self._bytes > self.max_bytes
+                   or len(self._data) > self.max_entries):
+                _, (_, n) = self._data.popitem(last=False)
+                self._bytes -= n
+                self._evictions += 1
+
+
+def _hash_arg(obj):
+    if hasattr(obj, 'get_params'):
+        return joblib_hash(obj)
+    return get_fingerprint(obj, index=True)
+
+
+def _nbytes(obj, depth=0):
+    '''return estimated memory size of obj in bytes, from arrays & frames
+    it holds, attributes of objects (egg. fitted transformers) are visited 
+    down to a few levels instead of pickling obj
+    '''
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(index=True, deep=False)))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if hasattr(obj, 'data') and hasattr(obj, 'indices'):
+        # scipy sparse matrix
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes
+    size = sys.getsizeof(obj, 64)
+    if depth >= 4:
+        return size
+    if isinstance(obj, (list, tuple, set)):
+        return size + sum(_nbytes(i, depth + 1) for i in obj)
+    if isinstance(obj, dict):
+        return size + sum(_nbytes(i, depth + 1) for i in obj.values())
+    if hasattr(obj, '__dict__'):
+        return size + _nbytes(vars(obj), depth + 1)
+    return size
+
+
+_MEMORY = Memory_cache()
+
+
+def get_memory_cache(max_bytes=None, max_entries=None):
+    '''return the process-wide Memory_cache instance, optionally resetting
+    its bounds
+    '''
+    if max_bytes is not None:
+        _MEMORY.max_bytes = max_bytes
+    if max_entries is not None:
+        _MEMORY.max_entries = max_entries
+    return _MEMORY
@@ -17,6 +17,7 @@ import matplotlib.ticker as ticker
 import seaborn as sns
 
 from collections import OrderedDict
+from contextlib import contextmanager
 
 from functools import reduce
 from seaborn.categorical import *
@@ -856,6 +857,21 @@ def _save_fig(fig, file, **kwargs):
     else:
         getattr(fig, 'get_figure')().savefig(file, **kwargs)    
         
+@contextmanager
+def non_interactive():
+    '''context manager to draw figures with interactive mode off, so that
+    no window is rendered while figures are only written to files; backend
+    & open figures are left as they are, interactive state restored on exit
+    '''
+    interactive = plt.isinteractive()
+    plt.ioff()
+    try:
+        yield
+    finally:
+        if interactive:
+            plt.ion()
+
+        
 def color_reference(keys=None):
     '''
     '''   
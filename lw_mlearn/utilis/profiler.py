@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+per-step timing & memory instrumentation of pipelines
+
+@author: roger luo
+
+class
+-----
+
+Profiled_pipeline:
+    Pipeline recording calls of its steps into registry with wall time,
+    cpu time, rows/cols in & out and peak allocation, steps themselves are
+    left untouched
+
+function
+-----
+
+profile_steps:
+    return Profiled_pipeline of a pipeline (or a single estimator)
+
+profile_context:
+    context manager to label records, egg. model & stage; peak allocation
+    is traced within context
+
+profile_records:
+    return DataFrame of recorded calls
+
+.. note::
+    only calls in this process are recorded, use n_jobs=1 for cross
+    validation & searches to record them; peak allocation is measured by
+    tracemalloc, which slows down steps allocating many python objects
+"""
+import time
+import threading
+import tracemalloc
+import pandas as pd
+
+from contextlib import contextmanager
+from functools import wraps
+from imblearn.pipeline import Pipeline
+from sklearn.utils.validation import check_memory
+
+_METHODS = ('fit', 'fit_transform', 'transform', 'fit_resample',
+            'predict', 'predict_proba', 'decision_function')
+# methods starting a new fit (fold) of a pipeline
+_FIT_METHODS = ('fit', 'fit_transform', 'fit_resample')
+
+_RECORDS = []
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_N_FIT = [0]
+# number of open profile_context & whether tracemalloc was started by them
+_TRACE = {'n': 0, 'started': False}
+
+
+def profile_steps(estimator):
+    '''return Profiled_pipeline of steps of estimator, a single estimator
+    is wrapped as one step named by its class name, as pipe_grid() does
+
+    return
+    ----
+    Profiled_pipeline
+    '''
+    if isinstance(estimator, Profiled_pipeline):
+        return estimator
+    if isinstance(estimator, Pipeline):
+        return Profiled_pipeline(estimator.steps, memory=estimator.memory,
+                                 verbose=estimator.verbose)
+    return Profiled_pipeline([(estimator.__class__.__name__, estimator)])
+
+
+@contextmanager
+def profile_context(**labels):
+    '''label records of calls within context by labels, egg.
+    profile_context(model='path', stage='train')
+
+    .. note::
+        tracemalloc is started by the outermost context if it is not
+        tracing yet and stopped when that context exits, tracing started
+        elsewhere is left running; outside of any context peak_mb is only
+        recorded if tracing
+    '''
+    old = getattr(_LOCAL, 'labels', {})
+    _LOCAL.labels = dict(old, **labels)
+    with _LOCK:
+        if _TRACE['n'] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _TRACE['started'] = True
+        _TRACE['n'] += 1
+    try:
+        yield
+    finally:
+        with _LOCK:
+            _TRACE['n'] -= 1
+            if _TRACE['n'] == 0 and _TRACE['started']:
+                tracemalloc.stop()
+                _TRACE['started'] = False
+        _LOCAL.labels = old
+
+
+def profile_records(clear=False, **labels):
+    '''return DataFrame of recorded calls matching labels, columns:
+    labels, 'fit_id', 'step', 'estimator', 'method', 'wall_time',
+    'cpu_time', 'rows_in', 'cols_in', 'rows_out', 'cols_out', 'peak_mb'
+
+    clear
+        - if True, remove returned records from registry
+    '''
+    with _LOCK:
+        match = [i for i in _RECORDS
+                 if all(i.get(k) == v for k, v in labels.items())]
+        if clear:
+            ids = set(id(i) for i in match)
+            _RECORDS[:] = [i for i in _RECORDS if id(i) not in ids]
+    return pd.DataFrame(match)
+
+
+class Profiled_pipeline(Pipeline):
+    '''Pipeline recording calls of its steps by fit (fold) of the pipeline,
+    steps are plain estimators, so clone, pickle & isinstance checks of
+    them behave as usual
+
+    .. note::
+        transformers/samplers fitted by the pipeline are recorded through
+        its memory.cache, fit of final estimator is recorded as the rest of
+        the pipeline fit time
+    '''
+
+    def _fit_call(self, method, func, X, *args, **kwargs):
+        '''call fit method of Pipeline, recording fit of each step
+        '''
+        with _LOCK:
+            _N_FIT[0] += 1
+            self._profile_fit = _N_FIT[0]
+        names = [k for k, v in self.steps[:-1]
+                 if v is not None and not _is_passthrough(v)]
+        memory = self.memory
+        self.memory = _Profile_memory(memory, names, self._profile_fit, X)
+        try:
+            rst, wall, cpu, peak = _timed(func, X, *args, **kwargs)
+            recorder = self.memory
+        finally:
+            self.memory = memory
+
+        name, final = self.steps[-1]
+        if final is not None and not _is_passthrough(final):
+            out = None if method == 'fit' else rst
+            _append(self._profile_fit, name, final, method, recorder.X, out,
+                    wall - recorder.wall, cpu - recorder.cpu, peak)
+        return rst
+
+    def _step_call(self, method, func, X, *args, **kwargs):
+        '''call method of each step as Pipeline does, recording them; 
+        samplers are skipped as they only apply in fit
+        '''
+        fit_id = getattr(self, '_profile_fit', -1)
+        Xt = X
+        for name, transform in self.steps[:-1]:
+            if transform is None or _is_passthrough(transform) or \
+                    hasattr(transform, 'fit_resample') or \
+                    hasattr(transform, 'fit_sample'):
+                continue
+            Xt = _record(fit_id, name, transform, 'transform', Xt)
+        name, final = self.steps[-1]
+        if method == 'transform' and \
+                (final is None or _is_passthrough(final)):
+            return Xt
+        return _record(fit_id, name, final, method, Xt, *args, **kwargs)
+
+
+def _profiled(method):
+    '''return property of instrumented method of Profiled_pipeline,
+    AttributeError of Pipeline method is kept (egg. predict_proba delegated
+    to final estimator), so hasattr behaves as Pipeline
+    '''
+
+    def getter(self):
+        func = getattr(super(Profiled_pipeline, self), method)
+        if method in _FIT_METHODS:
+            call = self._fit_call
+        else:
+            call = self._step_call
+
+        @wraps(func)
+        def wrapper(X, *args, **kwargs):
+            return call(method, func, X, *args, **kwargs)
+
+        return wrapper
+
+    return property(getter)
+
+
+# set after class creation, __init_subclass__ of Pipeline may wrap methods
+# defined in class body
+for _method in _METHODS:
+    setattr(Profiled_pipeline, _method, _profiled(_method))
+
+
+class _Profile_memory():
+    '''memory of Profiled_pipeline during fit, calls of cached fit of steps
+    are recorded in order of names; X is output of the last step recorded,
+    wall & cpu the total time recorded
+    '''
+
+    def __init__(self, memory, names, fit_id, X):
+        self.memory = check_memory(memory)
+        self.location = getattr(self.memory, 'location', None)
+        self.names = list(names)
+        self.fit_id = fit_id
+        self.X = X
+        self.wall = 0
+        self.cpu = 0
+
+    def cache(self, func, **kwargs):
+        cached = self.memory.cache(func, **kwargs)
+        # _fit_transform_one / _fit_resample_one
+        method = func.__name__.strip('_').replace('_one', '')
+
+        @wraps(func)
+        def wrapper(step, X, *args, **kwargs):
+            rst, wall, cpu, peak = _timed(cached, step, X, *args, **kwargs)
+            name = self.names.pop(0) if self.names else None
+            _append(self.fit_id, name, step, method, X, rst[0], wall, cpu,
+                    peak)
+            self.X = rst[0]
+            self.wall += wall
+            self.cpu += cpu
+            return rst
+
+        return wrapper
+
+
+def _record(fit_id, name, step, method, X, *args, **kwargs):
+    '''call method of step on X & record it
+    '''
+    rst, wall, cpu, peak = _timed(getattr(step, method), X, *args, **kwargs)
+    _append(fit_id, name, step, method, X, rst, wall, cpu, peak)
+    return rst
+
+
+def _timed(func, *args, **kwargs):
+    '''return result, wall time, cpu time & peak allocation (MB) of call,
+    peak is None if tracemalloc is not tracing
+    '''
+    tracing = tracemalloc.is_tracing()
+    if tracing and hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    t0, c0 = time.time(), time.process_time()
+    rst = func(*args, **kwargs)
+    wall, cpu = time.time() - t0, time.process_time() - c0
+    peak = None
+    if tracing and tracemalloc.is_tracing():
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+    return rst, wall, cpu, peak
+
+
+def _append(fit_id, name, step, method, X, out, wall, cpu, peak):
+    '''append record of a call to registry
+    '''
+    out = out[0] if isinstance(out, tuple) else out
+    record = dict(getattr(_LOCAL, 'labels', {}))
+    record.update({
+        'fit_id': fit_id,
+        'step': name,
+        'estimator': step.__class__.__name__,
+        'method': method,
+        'wall_time': wall,
+        'cpu_time': cpu,
+        'rows_in': _shape(X)[0],
+        'cols_in': _shape(X)[1],
+        'rows_out': _shape(out)[0],
+        'cols_out': _shape(out)[1],
+        'peak_mb': peak
+    })
+    with _LOCK:
+        _RECORDS.append(record)
+
+
+def _is_passthrough(step):
+    return isinstance(step, str) and step == 'passthrough'
+
+
+def _shape(X):
+    '''return (rows, cols) of array like X, None if not array like
+    '''
+    shape = getattr(X, 'shape', None)
+    if shape is None or len(shape) == 0:
+        return (None, None)
+    return (shape[0], shape[1] if len(shape) > 1 else 1)
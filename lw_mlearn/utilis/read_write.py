@@ -5,10 +5,20 @@ Created on Tue Dec 18 14:36:20 2018
 @author: roger luo
 """
 import pandas as pd
+import numpy as np
 import os
+import io
+import copy
 import pickle
 import shutil
 import json
+import hashlib
+import tempfile
+import threading
+
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from sklearn.utils import check_consistent_length
 
@@ -60,10 +70,8 @@ class NewFile(File):
     def __set__(self, instance, file):
 
         try:
-            if os.path.isfile(file):
-                os.remove(file)
-                print("info: old file '{}' deleted...\n ".format(file))
-
+            # old file is kept until replaced by the new one, see 
+            # _atomic_write
             dirs, filename = os.path.split(file)
             if not os.path.exists(dirs) and len(dirs) > 0:
                 os.makedirs(dirs, exist_ok=True)
@@ -149,10 +157,8 @@ class Path_File():
     @newfile_.setter 
     def newfile_(self, file):
         try:
-            if os.path.isfile(file):
-                os.remove(file)
-                print("info: old file '{}' deleted...\n ".format(file))
-
+            # old file is kept until replaced by the new one, see 
+            # _atomic_write
             dirs, filename = os.path.split(file)
             if not os.path.exists(dirs) and len(dirs) > 0:
                 os.makedirs(dirs, exist_ok=True)
@@ -171,14 +177,15 @@ class Path_File():
 class Reader(Path_File):
     '''read in python objects contained in files, 
     supported suffix of file are
-        - ['.xlsx', '.csv', '.pkl', '.txt', '.sql']
+        - ['.xlsx', '.csv', '.pkl', '.txt', '.sql', '.json', '.parquet',
+        '.feather', '.traindata', '.testdata', '.pipe']
     
     method
     ----
     read: 
         return obj read from file
     read_all:
-        return generator of read in objs
+        return list of read in objs, or lazy mapping of them
     '''
 
     def __init__(self, path):
@@ -190,28 +197,42 @@ class Reader(Path_File):
         '''return obj from file
         
         supported suffix of file are
-        - ['.xlsx', '.csv', '.pkl', '.txt', '.sql']       
+        - ['.xlsx', '.csv', '.pkl', '.txt', '.sql', '.json', '.parquet',
+        '.feather', '.traindata', '.testdata', '.pipe'], see _rd_apis
         file - str or file object
             - file to read
+        **kwargs
+            - key arguments of suffix specified api, egg. columns & filters
+            for '.parquet'
         '''
         self.file_ = file
-        read_api = _rd_apis(self.file_)
-        try:
-            kw = get_kwargs(read_api, **kwargs)
-            rst = read_api(self.file_, **kw)
-            print("<obj>: '{}' read from '{}\n".format(rst.__class__.__name__,
-                                                       self.file_))
-            return rst
-        except Exception as e:
-            print("<failure>: file '{}' read failed".format(self.file_))
-            print(repr(e), '\n')
+        obj, error = _read_obj(self.file_, kwargs)
+        if error is not None:
+            self.read_errors.append(error)
+        return obj
+
+    @property
+    def read_errors(self):
+        '''list of (file, repr(exception)) of failed reads
+        '''
+        if not hasattr(self, '_read_errors'):
+            self._read_errors = []
+        return self._read_errors
 
-    def read_all(self, suffix=None, path=None, subfolder=False, **kwargs):
+    def read_all(self, suffix=None, path=None, subfolder=False, lazy=False,
+                 cache_size=None, n_jobs=None, **kwargs):
         '''return list of read in objs, and obj that collects them 
-        as attributes
+        as attributes, both in order of files
         
         suffix: file suffix to read
         path: relative path to read from, default current self.path_
+        lazy: if True, return Lazy_files mapping {filename: obj} instead, 
+            files are read on first access
+        cache_size: max number of objs kept by lazy mapping, least recently
+            used dropped, default None to keep all
+        n_jobs: number of threads to read files concurrently, -1 to use
+            all cpus, default None to read one by one; failed files are 
+            skipped and reported together, see read_errors
         '''
         if path is None:
             path = self.path_
@@ -219,17 +240,105 @@ class Reader(Path_File):
             path = os.path.join(self.path_, path)
 
         file_dict = _get_files(path, suffix, subfolder)
+        if lazy:
+            return Lazy_files(self, file_dict, cache_size, **kwargs)
+
+        n_errors = len(self.read_errors)
+        if n_jobs in (None, 1) or len(file_dict) < 2:
+            loads = [self.read(v, **kwargs) for v in file_dict.values()]
+        else:
+            n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+            with ThreadPoolExecutor(n_jobs) as pool:
+                rst = list(pool.map(
+                    lambda v: _read_obj(os.path.relpath(v), kwargs), 
+                    file_dict.values()))
+            loads = [i[0] for i in rst]
+            self.read_errors.extend(i[1] for i in rst if i[1] is not None)
+        errors = self.read_errors[n_errors:]
+        if len(errors) > 0:
+            print("<failure>: {} files read failed: {}".format(
+                len(errors), [i[0] for i in errors]))
 
         obj = _Obj()
         gen = []
-        for k, v in file_dict.items():
-            load = self.read(v, **kwargs)
+        for k, load in zip(file_dict, loads):
             if load is not None:
                 setattr(obj, k.replace('.', '_'), load)
                 gen.append(load)
         return gen, obj
 
 
+def _read_obj(file, kwargs):
+    '''return (obj read from file, None), or (None, (file, repr(exception)))
+    if read failed
+    '''
+    read_api = _rd_apis(file)
+    try:
+        kw = get_kwargs(read_api, **kwargs)
+        rst = read_api(file, **kw)
+        print("<obj>: '{}' read from '{}\n".format(rst.__class__.__name__,
+                                                   file))
+        return rst, None
+    except Exception as e:
+        print("<failure>: file '{}' read failed".format(file))
+        print(repr(e), '\n')
+        return None, (file, repr(e))
+
+
+class Lazy_files(Mapping):
+    '''read-only mapping {filename: obj} of files, obj is read from file
+    on first access, None if read fails
+    
+    reader
+        - Reader to read files
+    file_dict
+        - {filename: file}
+    cache_size
+        - max number of objs kept, least recently used dropped, None to
+        keep all, 0 to read on every access
+    **kwargs
+        - key arguments of Reader.read
+    
+    method
+    ----
+    first:
+        return first obj read successfully, None if there's no such obj
+    '''
+
+    def __init__(self, reader, file_dict, cache_size=None, **kwargs):
+        self.reader = reader
+        self.files = OrderedDict(file_dict)
+        self.cache_size = cache_size
+        self.kwargs = kwargs
+        self._cache = OrderedDict()
+
+    def __getitem__(self, name):
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return self._cache[name]
+        obj = self.reader.read(self.files[name], **self.kwargs)
+        if self.cache_size != 0:
+            self._cache[name] = obj
+            while self.cache_size and len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return obj
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, list(self.files))
+
+    def first(self):
+        for obj in self.values():
+            if obj is not None:
+                return obj
+        return None
+
+
 def _load_pkl(file):
     '''return unpickled obj from 'pkl' file
     '''
@@ -239,6 +348,17 @@ def _load_pkl(file):
     return obj
 
 
+def _load_joblib(file, mmap_mode=None):
+    '''return obj from file dumped by joblib or pickle
+    
+    mmap_mode
+        - egg. 'r' to memory map numpy arrays of file dumped by joblib 
+        uncompressed
+    '''
+    import joblib
+    return joblib.load(file, mmap_mode=mmap_mode)
+
+
 def _read_file(file):
     ''' return 'str' obj from file by calling f.read() method
     '''
@@ -265,10 +385,16 @@ def _get_files(dirpath, suffix=None, subfolder=False):
     rst = {
         k: v
         for k, v in get_dirs(dirpath).items()
-        if os.path.splitext(v)[1] in get_flat_list(suffix) or not suffix
+        if (os.path.splitext(v)[1] in get_flat_list(suffix) or not suffix)
+        and not k.startswith(_HIDDEN)
     }
     return rst
 
+# manifest file of Writer & prefix of temporary files, hidden from reading
+_HIDDEN = '.lw_'
+_MANIFEST = _HIDDEN + 'manifest.json'
+
+
 def _read_json(file):
     '''return dict obj from 'json' file
     '''
@@ -292,6 +418,11 @@ def _rd_apis(file):
         '.txt': _read_file,
         '.sql': _read_file,
         '.json' : _read_json ,
+        '.parquet': _read_parquet,
+        '.feather': _read_feather,
+        '.traindata': _read_dataset,
+        '.testdata': _read_dataset,
+        '.pipe': _load_joblib,
     }
 
     suffix = os.path.splitext(file)[1]
@@ -302,37 +433,332 @@ def _rd_apis(file):
 class Writer(Path_File):
     '''write objects into file
     
+    files are written into a temporary file first and renamed to file when
+    complete, so that an interrupted write never leaves a partial file
+    
     method
     -----
     write:
         write obj into file
+    set_manifest:
+        keep content hash of written files in manifest file under path, an
+        obj identical to what was written into file is not written again
+    save_manifest:
+        dump manifest of written files
+    set_async:
+        hand writes off to a bounded thread pool, write returns immediately
+    flush:
+        wait for pending writes, return collected errors
+    close:
+        flush and shut down thread pool
+        
+    attributes
+    -----
+    write_errors
+        - list of (file, repr(exception)) of failed writes
+    write_status
+        - dict {file : 'new', 'changed' or 'unchanged'} of writes checked
+        against manifest
+    manifest_
+        - dict {file : {'hash', 'size', 'mtime', 'config'}} of files written
+        under current path, relative to path, None if manifest is not used
     '''
     def __init__(self, path):
         ''' init path variable '''
         self.path_ = path
 
-    def write(self, obj, file, **kwargs):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def write_errors(self):
+        if not hasattr(self, '_write_errors'):
+            self._write_errors = []
+        return self._write_errors
+
+    @property
+    def write_status(self):
+        if not hasattr(self, '_write_status'):
+            self._write_status = {}
+        return self._write_status
+
+    def set_manifest(self, manifest=True):
+        '''use manifest file '.lw_manifest.json' under path to record
+        content hash, size & producing config of written files
+        
+        manifest
+            - bool, if False, every write is done and nothing recorded
+            
+        .. note::
+            a write is skipped if the hash of obj & write options equals 
+            that recorded for file and file still has the recorded size & 
+            modified time; figures are not hashed and always written.
+            manifest file is dumped by save_manifest, flush or close, files
+            written after that are written again by a new Writer
+        '''
+        self._use_manifest = manifest
+        if not hasattr(self, '_manifest_lock'):
+            self._manifest_lock = threading.Lock()
+            self._manifests = {}
+            self._manifest_dirty = set()
+        return self
+
+    def save_manifest(self):
+        '''dump manifests changed since last dumped, writes still pending 
+        are recorded when done
+        '''
+        if not hasattr(self, '_manifest_lock'):
+            return
+        with self._manifest_lock:
+            for path in self._manifest_dirty:
+                _atomic_write(_dump_json, self._manifests[path],
+                              os.path.join(path, _MANIFEST), {})
+            self._manifest_dirty.clear()
+
+    @property
+    def manifest_(self):
+        if not getattr(self, '_use_manifest', False):
+            return None
+        return self._manifest(self.path_)
+
+    def _manifest(self, path):
+        '''return manifest dict of path, read from manifest file once
+        '''
+        if path not in self._manifests:
+            file = os.path.join(path, _MANIFEST)
+            try:
+                with open(file, 'r') as f:
+                    self._manifests[path] = json.load(f)
+            except (OSError, ValueError):
+                self._manifests[path] = {}
+        return self._manifests[path]
+
+    def _check_manifest(self, obj, file, config, kwargs, plot=False):
+        '''return (bool, entry), False if file need not be written, entry
+        to record in manifest after obj is written, None if manifest is not
+        used; plot True if obj is a rendered figure, which is not hashed
+        '''
+        if self.manifest_ is None:
+            return True, None
+        try:
+            key = None if plot else _content_key(obj, kwargs)
+        except Exception:
+            key = None
+        # stored as read back from manifest file
+        config = json.loads(json.dumps(config, default=repr))
+        old = self.manifest_.get(os.path.relpath(file, self.path_))
+        entry = {'hash': key, 'config': config, 'path': self.path_}
+        if key is None or old is None or old['hash'] != key:
+            self.write_status[file] = 'changed' if old else 'new'
+            return True, entry
+        try:
+            stat = os.stat(file)
+            unchanged = (stat.st_size == old['size'] and 
+                         stat.st_mtime_ns == old.get('mtime'))
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            self.write_status[file] = 'changed'
+            return True, entry
+        self.write_status[file] = 'unchanged'
+        if old.get('config') != config:
+            self._record(file, dict(old, config=config, path=self.path_))
+        print("<skip>: '{}' unchanged, not written again\n".format(file))
+        return False, None
+
+    def _record(self, file, entry):
+        '''record entry of written file in manifest of entry['path'], see
+        save_manifest
+        '''
+        entry = dict(entry)
+        path = entry.pop('path')
+        if entry.get('size') is None:
+            stat = os.stat(file)
+            entry.update(size=stat.st_size, mtime=stat.st_mtime_ns)
+        with self._manifest_lock:
+            self._manifest(path)[os.path.relpath(file, path)] = entry
+            self._manifest_dirty.add(path)
+
+    def set_async(self, max_workers=2, max_queue=8):
+        '''write in background threads
+        
+        max_workers
+            - number of writer threads, if 0 or None, write synchronously
+        max_queue
+            - max number of pending writes, write blocks when queue is full
+            
+        .. note::
+            write takes a snapshot of obj before it returns (see _snapshot),
+            figures are rendered in calling thread since pyplot is not 
+            thread safe, so obj may be changed or closed afterwards
+        '''
+        self.close()
+        if max_workers:
+            self._pool = ThreadPoolExecutor(max_workers)
+            self._queue = threading.BoundedSemaphore(max_workers + max_queue)
+            self._lock = threading.Lock()
+            self._pending = set()
+        return self
+
+    def write(self, obj, file, config=None, **kwargs):
         '''dump obj into file under self.path_
 
         file
             - filename + suffix egg 'filename.pkl'
-            - supported suffix are [.pkl, .xlsx, .csv, .pdf, .png], 
-            see _wr_apis
-        
+            - supported suffix are [.pkl, .xlsx, .csv, .pdf, .png, .json,
+            .parquet, .feather, .traindata, .testdata, .pipe], see _wr_apis
+        config
+            - json serializable settings that produced obj, recorded in
+            manifest, see set_manifest
         **kwargs
             - other keys arguments for suffix specified api
         '''
         file = os.path.join(self.path_, file)
         file = os.path.relpath(file)
+        wr_api = _wr_apis(file)
+        name = obj.__class__.__name__
+        plot = wr_api is _save_plot
+        pool = getattr(self, '_pool', None)
+        if pool is not None or (self.manifest_ is not None and 
+                                wr_api in (_dump_joblib, _dump_pkl)):
+            # snapshot obj before handing it off, serialized objs are 
+            # hashed by manifest as they are, not pickled again
+            try:
+                obj, wr_api = _snapshot(obj, wr_api, file, kwargs)
+            except Exception as e:
+                print(repr(e))
+                print("<failure>: '{}' written failed ...".format(file))
+                self.write_errors.append((file, repr(e)))
+                return
+        to_write, entry = self._check_manifest(obj, file, config, kwargs, 
+                                               plot)
+        if not to_write:
+            return
         self.newfile_ = file
-        wr_api = _wr_apis(self.newfile_)
+        if pool is None:
+            try:
+                _atomic_write(wr_api, obj, self.newfile_, kwargs)
+                print("<obj>: '{}' dumped into '{}...\n".format(name, file))
+                if entry is not None:
+                    self._record(file, entry)
+            except Exception as e:
+                print(repr(e))
+                print("<failure>: '{}' written failed ...".format(file))
+                self.write_errors.append((file, repr(e)))
+            return
+
+        self._queue.acquire()
+        future = pool.submit(_write_task, wr_api, obj, file, name, kwargs)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(
+            lambda future: self._write_done(future, file, entry))
+
+    def _write_done(self, future, file=None, entry=None):
+        '''release queue slot & collect error of a finished write, record
+        written file in manifest
+        '''
+        error = future.result()
+        if error is None and entry is not None:
+            try:
+                self._record(file, entry)
+            except Exception as e:
+                error = (file, repr(e))
+        if error is not None:
+            self.write_errors.append(error)
+        with self._lock:
+            self._pending.discard(future)
+        self._queue.release()
+
+    def flush(self):
+        '''wait for pending writes to finish
+        
+        return
+        ----
+        list of (file, repr(exception)) of failed writes
+        '''
+        if getattr(self, '_pool', None) is not None:
+            with self._lock:
+                pending = list(self._pending)
+            wait(pending)
         try:
-            wr_api(obj, self.newfile_, **kwargs)
-            print("<obj>: '{}' dumped into '{}...\n".format(
-                obj.__class__.__name__, file))
+            self.save_manifest()
         except Exception as e:
-            print(repr(e))
-            print("<failure>: '{}' written failed ...".format(file))
+            self.write_errors.append((_MANIFEST, repr(e)))
+        if self.write_errors:
+            print("<failure>: {} files written failed: {}".format(
+                len(self.write_errors), [i[0] for i in self.write_errors]))
+        return self.write_errors
+
+    def close(self):
+        '''flush pending writes and shut down thread pool
+        '''
+        errors = self.flush()
+        pool = getattr(self, '_pool', None)
+        if pool is not None:
+            pool.shutdown()
+            self._pool = None
+        return errors
+
+
+def _write_task(wr_api, obj, file, name, kwargs):
+    '''run wr_api in writer thread
+    
+    name
+        - class name of written obj
+    return
+    ----
+    None, or (file, repr(exception)) if failed
+    '''
+    try:
+        _atomic_write(wr_api, obj, file, kwargs)
+        print("<obj>: '{}' dumped into '{}...\n".format(name, file))
+    except Exception as e:
+        return (file, repr(e))
+
+
+def _atomic_write(wr_api, obj, file, kwargs):
+    '''write obj by wr_api into temporary file under the same folder as
+    file, then rename it to file; temporary file keeps suffix of file for
+    suffix dependent apis & is removed if write failed
+    '''
+    dirs, name = os.path.split(file)
+    root, suffix = os.path.splitext(name)
+    fd, tmp = tempfile.mkstemp(suffix=suffix, prefix=_HIDDEN + root + '.',
+                               dir=dirs or '.')
+    os.close(fd)
+    try:
+        wr_api(obj, tmp, **kwargs)
+        if os.path.getsize(tmp) == 0:
+            # apis printing their errors leave file empty
+            raise IOError("nothing written into '{}'".format(file))
+        os.replace(tmp, file)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _content_key(obj, kwargs=None):
+    '''return hash of pickled obj & write options kwargs, bytes are hashed 
+    as they are, numpy buffers are hashed in place instead of being copied 
+    into pickle if protocol 5 is available; None for figures, which are 
+    always written
+    '''
+    if hasattr(obj, 'savefig') or hasattr(obj, 'get_figure'):
+        return None
+    h = hashlib.md5(repr(sorted((kwargs or {}).items())).encode())
+    if isinstance(obj, bytes):
+        h.update(obj)
+    elif pickle.HIGHEST_PROTOCOL >= 5:
+        h.update(pickle.dumps(obj, 5,
+                              buffer_callback=lambda b: h.update(b.raw())))
+    else:
+        h.update(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+    return h.hexdigest()
 
 
 def _wr_apis(file):
@@ -350,7 +776,13 @@ def _wr_apis(file):
         '.xlsx': _dump_df_excel,
         '.csv': _dump_df_csv,
         '.pdf': _save_plot,
-        '.png': _save_plot
+        '.png': _save_plot,
+        '.json': _dump_json,
+        '.parquet': _dump_parquet,
+        '.feather': _dump_feather,
+        '.traindata': _dump_dataset,
+        '.testdata': _dump_dataset,
+        '.pipe': _dump_joblib,
     }
 
     suffix = os.path.splitext(file)[1]
@@ -368,6 +800,241 @@ def _dump_pkl(obj, file, **kwargs):
         pkl.dump(obj)
 
 
+def _dump_joblib(obj, file, compress=None, **kwargs):
+    '''
+    obj - python objects, egg. estimators holding large numpy arrays
+    file - file or file object to dump obj into
+    compress 
+        - None, pickled by highest protocol, fastest to dump & load
+        - 0, dumped by joblib uncompressed, numpy arrays can be memory 
+        mapped on load
+        - 1 to 9 or (method, level), dumped by joblib compressed, see 
+        joblib.dump
+    '''
+    if compress is None:
+        if isinstance(file, str):
+            with open(file, 'wb') as f:
+                pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        else:
+            pickle.dump(obj, file, pickle.HIGHEST_PROTOCOL)
+        return
+    import joblib
+    joblib.dump(obj, file, compress=compress)
+
+
+def _dump_bytes(obj, file, **kwargs):
+    '''
+    obj - bytes, egg. pickled python objects
+    file - file to write bytes into
+    '''
+    with open(file, 'wb') as f:
+        f.write(obj)
+
+
+def _snapshot(obj, wr_api, file, kwargs=None):
+    '''return (snapshot of obj, write api of it) for background write, so 
+    that obj can be changed or closed once write returns; figures are 
+    rendered into bytes in calling thread, data frames & json objects copied,
+    data sets converted to arrow table, estimators dumped by joblib into 
+    bytes, other objects pickled
+    '''
+    if wr_api is _save_plot:
+        fig = obj if hasattr(obj, 'savefig') else obj.get_figure()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=os.path.splitext(file)[1][1:],
+                    **(kwargs or {}))
+        return buffer.getvalue(), _dump_bytes
+    if wr_api in (_dump_df_csv, _dump_parquet, _dump_feather):
+        return pd.DataFrame(obj).copy(), wr_api
+    if wr_api is _dump_df_excel:
+        return [pd.DataFrame(i).copy() for i in get_flat_list(obj)], wr_api
+    if wr_api is _dump_json:
+        return copy.deepcopy(obj), wr_api
+    if wr_api is _dump_joblib:
+        buffer = io.BytesIO()
+        _dump_joblib(obj, buffer, **(kwargs or {}))
+        return buffer.getvalue(), _dump_bytes
+    if wr_api is _dump_dataset:
+        try:
+            return _dataset_table(obj, file), _dump_table
+        except (ImportError, TypeError, ValueError, NotImplementedError):
+            pass
+    return pickle.dumps(obj), _dump_bytes
+
+
+def _to_arrow(obj):
+    '''return pyarrow Table of DataFrame obj, column labels which are not 
+    str are stored as str and restored by _from_arrow
+    '''
+    import pyarrow as pa
+    data = pd.DataFrame(obj)
+    labels = data.columns.tolist()
+    if all(isinstance(i, str) for i in labels):
+        return pa.Table.from_pandas(data)
+    names = [str(i) for i in labels]
+    if len(set(names)) < len(names):
+        raise ValueError('column labels are not unique as str')
+    table = pa.Table.from_pandas(data.set_axis(names, axis=1))
+    meta = dict(table.schema.metadata or {})
+    meta[b'lw_columns'] = json.dumps(labels).encode()
+    return table.replace_schema_metadata(meta)
+
+
+def _from_arrow(table):
+    '''return DataFrame of pyarrow Table, with column labels restored
+    '''
+    data = table.to_pandas()
+    labels = (table.schema.metadata or {}).get(b'lw_columns')
+    if labels is not None:
+        names = {str(i): i for i in json.loads(labels)}
+        data.columns = [names.get(i, i) for i in data.columns]
+    return data
+
+
+def _arrow_columns(columns):
+    '''return column labels as str names stored in arrow file
+    '''
+    return None if columns is None else [str(i) for i in columns]
+
+
+def _read_parquet(file, columns=None, filters=None, **kwargs):
+    '''return DataFrame from 'parquet' file
+    
+    columns
+        - list of columns to read, default all
+    filters
+        - pyarrow filters egg. [('age', '>', 30)], row groups excluded by 
+        statistics are skipped
+    '''
+    import pyarrow.parquet as pq
+    table = pq.read_table(file, columns=_arrow_columns(columns),
+                          filters=filters, use_pandas_metadata=True)
+    return _from_arrow(table)
+
+
+def _read_feather(file, columns=None, **kwargs):
+    '''return DataFrame from 'feather' file, reading only columns if given
+    '''
+    import pyarrow.feather as feather
+    return _from_arrow(feather.read_table(file,
+                                          columns=_arrow_columns(columns)))
+
+
+def _dump_parquet(obj, file, compression='snappy', row_group_size=None,
+                  **kwargs):
+    '''dump DataFrame to 'parquet' file
+    
+    row_group_size
+        - max number of rows of each row group, smaller groups let filters
+        skip more rows on read
+    '''
+    import pyarrow.parquet as pq
+    pq.write_table(_to_arrow(obj), file, compression=compression,
+                   row_group_size=row_group_size)
+
+
+def _dump_feather(obj, file, compression=None, **kwargs):
+    '''dump DataFrame to 'feather' file, uncompressed by default for
+    fastest read
+    '''
+    import pyarrow.feather as feather
+    feather.write_feather(_to_arrow(obj), file,
+                          compression=compression or 'uncompressed')
+
+
+def _dataset_table(obj, file):
+    '''return pyarrow Table of data sets, all sets are stacked with y as
+    '_lw_y' column, titles & rows of each set are stored in metadata
+    
+    obj
+        - (X, y) for '.traindata' file
+        - [list of (X, y), titles] for '.testdata' file
+    '''
+    if os.path.splitext(file)[1] == '.testdata':
+        sets, titles = obj
+    else:
+        sets, titles = [obj], None
+    frames = []
+    for X, y in sets:
+        data = pd.DataFrame(X)
+        if len(frames) > 0 and not data.columns.equals(frames[0].columns):
+            raise ValueError('columns of data sets are not the same')
+        frames.append(data)
+    y0 = sets[0][1]
+    data = pd.concat(frames) if len(frames) > 1 else frames[0]
+    y = np.concatenate([np.asarray(i[1]) for i in sets])
+    table = _to_arrow(data.assign(_lw_y=y))
+    meta = dict(table.schema.metadata)
+    meta[b'lw_dataset'] = json.dumps({
+        'titles': titles,
+        'n_rows': [len(i) for i in frames],
+        'x_ndarray': isinstance(sets[0][0], np.ndarray),
+        'y_name': getattr(y0, 'name', None),
+        'y_ndarray': isinstance(y0, np.ndarray)
+    }).encode()
+    return table.replace_schema_metadata(meta)
+
+
+def _dump_table(obj, file, **kwargs):
+    '''
+    obj - pyarrow Table
+    file - file to write table into, in uncompressed feather format
+    '''
+    import pyarrow.feather as feather
+    feather.write_feather(obj, file, compression='uncompressed')
+
+
+def _dump_dataset(obj, file, **kwargs):
+    '''dump train or test data sets of ML_model into feather file, see
+    _dataset_table; pickled if pyarrow is not installed or data is not
+    arrow convertible
+    '''
+    try:
+        table = _dataset_table(obj, file)
+    except (ImportError, TypeError, ValueError, NotImplementedError):
+        return _dump_pkl(obj, file)
+    _dump_table(table, file)
+
+
+def _read_dataset(file, **kwargs):
+    '''return (X, y) from '.traindata' file or [list of (X, y), titles]
+    from '.testdata' file, dumped by _dump_dataset
+    '''
+    with open(file, 'rb') as f:
+        if f.read(6) != b'ARROW1':
+            return _load_pkl(file)
+    import pyarrow.feather as feather
+    table = feather.read_table(file, memory_map=True)
+    meta = json.loads(table.schema.metadata[b'lw_dataset'])
+    sets = []
+    start = 0
+    for n in meta['n_rows']:
+        part = table.slice(start, n)
+        start += n
+        X = _from_arrow(part.drop(['_lw_y']))
+        y = part.column('_lw_y').to_pandas()
+        if meta['y_ndarray']:
+            y = y.values
+        else:
+            y.index = X.index
+            y.name = meta['y_name']
+        if meta['x_ndarray']:
+            X = X.values
+        sets.append((X, y))
+    if os.path.splitext(file)[1] == '.testdata':
+        return [sets, meta['titles']]
+    return sets[0]
+
+
+def _dump_json(obj, file, **kwargs):
+    '''
+    obj - json serializable python objects, egg. dict
+    file - file to dump obj into
+    '''
+    with open(file, 'w') as f:
+        json.dump(obj, f, indent=kwargs.get('indent', 1))
+
+
 def _dump_df_excel(obj, file, **kwargs):
     '''dump df to excel
     
@@ -422,10 +1089,19 @@ def _save_plot(fig, file, **kwargs):
             
 
 class Objs_management(Reader, Writer):
-    def __init__(self, path):
+    def __init__(self, path, max_workers=None, max_queue=8, manifest=False):
         '''manage read & write of objects from/into file
+        
+        max_workers
+            - if not None, write in background threads, see set_async
+        manifest
+            - bool, if True, identical objs are not written again into the
+            same file, see set_manifest, default False
         '''
         super().__init__(path)
+        self.set_manifest(manifest)
+        if max_workers:
+            self.set_async(max_workers, max_queue)
 
     def _remove_path(self):
         '''remove path and all files within
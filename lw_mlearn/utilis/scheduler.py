@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+run tasks in worker processes under a global cpu budget
+
+@author: roger luo
+
+class
+-----
+
+Process_scheduler:
+    start each task in its own process once enough cpus of the budget are
+    free, inner thread pools (BLAS/OpenMP) of the task are limited to its
+    cpus, stdout/stderr of each task can be redirected to its own log file,
+    tasks exceeding wall-clock or resident memory limits are killed
+
+function
+-----
+
+limit_n_jobs:
+    cap n_jobs parameters of an estimator (pipeline steps, searches, xgboost
+    n_jobs/nthread) to avoid oversubscription
+"""
+import os
+import sys
+import time
+import traceback
+import multiprocessing as mp
+
+from collections import OrderedDict
+from multiprocessing.connection import wait
+
+# env variables read by BLAS/OpenMP thread pools at start of a process
+_THREAD_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+               'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+class Process_scheduler():
+    '''run submitted tasks concurrently in worker processes, each task takes
+    n_cpu tokens of cpu_budget while running
+
+    parameters
+    ----
+    cpu_budget
+        - total cpus of concurrently running tasks, default os.cpu_count()
+    max_workers
+        - max number of concurrently running tasks, default no limit
+    poll
+        - seconds between checks of running tasks
+    time_limit
+        - default wall-clock limit of each task in seconds, None no limit
+    mem_limit
+        - default resident memory limit of each task (including its child
+        processes) in MB, None no limit; measured by psutil if installed,
+        else by /proc on linux
+
+    method
+    ----
+    submit:
+        add a task
+    run:
+        run all submitted tasks, return OrderedDict {name: outcome} in
+        order of submission, outcome is dict of 'status' ('ok', 'error', 
+        'timeout' or 'memory'), 'result', 'error', 'n_cpu', 'elapsed'
+    '''
+
+    def __init__(self, cpu_budget=None, max_workers=None, poll=0.5,
+                 time_limit=None, mem_limit=None):
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.poll = poll
+        self.time_limit = time_limit
+        self.mem_limit = mem_limit
+        self._tasks = OrderedDict()
+
+    def submit(self, name, func, args=(), kwargs=None, n_cpu=1,
+               log_file=None, time_limit=None, mem_limit=None):
+        '''add task func(*args, **kwargs) named name
+
+        n_cpu
+            - cpus taken by the task, capped to cpu_budget
+        log_file
+            - file to redirect stdout/stderr of the task, default None
+        time_limit, mem_limit
+            - limits of the task, default those of scheduler
+        '''
+        if name in self._tasks:
+            raise ValueError("task '{}' already submitted".format(name))
+        self._tasks[name] = {
+            'func': func,
+            'args': args,
+            'kwargs': kwargs or {},
+            'n_cpu': max(min(int(n_cpu), self.cpu_budget), 1),
+            'log_file': log_file,
+            'time_limit': time_limit or self.time_limit,
+            'mem_limit': mem_limit or self.mem_limit
+        }
+
+    def run(self):
+        '''run submitted tasks, return outcomes in order of submission
+        '''
+        pending = list(self._tasks)
+        running = {}
+        outcomes = OrderedDict((k, None) for k in self._tasks)
+        free = self.cpu_budget
+        while pending or running:
+            # start tasks while budget allows, in order of submission
+            while pending:
+                task = self._tasks[pending[0]]
+                n_max = self.max_workers or len(self._tasks)
+                if task['n_cpu'] > free or len(running) >= n_max:
+                    break
+                name = pending.pop(0)
+                running[name] = self._start(name, task)
+                free -= task['n_cpu']
+
+            conns = {v['conn']: k for k, v in running.items()}
+            finished = [conns[i] for i in wait(list(conns), 
+                                               timeout=self.poll)]
+            for name in finished:
+                outcomes[name] = self._finish(running.pop(name))
+            for name in list(running):
+                status = _check_limits(running[name])
+                if status is not None:
+                    outcomes[name] = self._kill(running.pop(name), status)
+                    finished.append(name)
+            for name in finished:
+                free += outcomes[name]['n_cpu']
+                print("task '{}' {} in {:.1f}s".format(
+                    name, outcomes[name]['status'],
+                    outcomes[name]['elapsed']))
+
+        self._tasks = OrderedDict()
+        return outcomes
+
+    def _start(self, name, task):
+        parent, child = mp.Pipe(duplex=False)
+        process = mp.Process(target=_run_task,
+                             args=(child, task['func'], task['args'],
+                                   task['kwargs'], task['n_cpu'],
+                                   task['log_file']),
+                             name=str(name),
+                             daemon=False)
+        # thread pools of the worker are sized when it imports numpy
+        env = {k: os.environ.get(k) for k in _THREAD_ENV}
+        os.environ.update({k: str(task['n_cpu']) for k in _THREAD_ENV})
+        try:
+            process.start()
+        finally:
+            for k, v in env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+        child.close()
+        return {
+            'process': process,
+            'conn': parent,
+            'n_cpu': task['n_cpu'],
+            'time_limit': task['time_limit'],
+            'mem_limit': task['mem_limit'],
+            't0': time.time()
+        }
+
+    def _finish(self, run):
+        '''collect outcome of a finished task
+        '''
+        try:
+            status, value = run['conn'].recv()
+        except EOFError:
+            status = 'error'
+            value = 'worker exited without result'
+        run['conn'].close()
+        run['process'].join()
+        if status == 'error' and run['process'].exitcode:
+            value = '{} (exitcode {})'.format(value, run['process'].exitcode)
+        return _outcome(run, status, value)
+
+    def _kill(self, run, status):
+        '''kill a task exceeding its limits, with its child processes
+        '''
+        _kill_children(run['process'].pid)
+        run['process'].kill()
+        run['process'].join()
+        run['conn'].close()
+        if status == 'timeout':
+            msg = 'time limit of {}s exceeded'.format(run['time_limit'])
+        else:
+            msg = 'memory limit of {} MB exceeded'.format(run['mem_limit'])
+        return _outcome(run, status, msg)
+
+
+def _outcome(run, status, value):
+    return {
+        'status': status,
+        'result': value if status == 'ok' else None,
+        'error': value if status != 'ok' else None,
+        'n_cpu': run['n_cpu'],
+        'elapsed': time.time() - run['t0']
+    }
+
+
+def _check_limits(run):
+    '''return 'timeout' or 'memory' if running task exceeds its limits, else
+    None
+    '''
+    if run['time_limit'] and time.time() - run['t0'] > run['time_limit']:
+        return 'timeout'
+    if run['mem_limit']:
+        rss = _rss(run['process'].pid)
+        if rss is not None and rss > run['mem_limit'] * 2**20:
+            return 'memory'
+    return None
+
+
+def _rss(pid):
+    '''return resident memory in bytes of process pid and its children, None
+    if not available
+    '''
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            p = psutil.Process(pid)
+            return sum(i.memory_info().rss 
+                       for i in [p] + p.children(recursive=True))
+        except psutil.Error:
+            return None
+    try:
+        # linux, main process only
+        with open('/proc/{}/statm'.format(pid)) as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _kill_children(pid):
+    '''kill child processes (eg. joblib workers) of pid, if psutil is 
+    installed
+    '''
+    try:
+        import psutil
+        children = psutil.Process(pid).children(recursive=True)
+    except Exception:
+        return
+    for i in children:
+        try:
+            i.kill()
+        except Exception:
+            continue
+
+
+def _run_task(conn, func, args, kwargs, n_cpu, log_file):
+    '''worker process target, send ('ok', result), ('memory', msg) or 
+    ('error', last line of traceback)
+    '''
+    log = None
+    if log_file is not None:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        log = open(log_file, 'w', buffering=1)
+        sys.stdout = sys.stderr = log
+    try:
+        _limit_threads(n_cpu)
+        result = func(*args, **kwargs)
+        conn.send(('ok', result))
+    except MemoryError:
+        print(traceback.format_exc())
+        conn.send(('memory', 'MemoryError'))
+    except BaseException:
+        msg = traceback.format_exc()
+        print(msg)
+        conn.send(('error', msg.strip().splitlines()[-1]))
+    finally:
+        conn.close()
+        if log is not None:
+            log.close()
+
+
+def _limit_threads(n_cpu):
+    '''limit BLAS/OpenMP thread pools already loaded in this process (eg. by
+    fork), if threadpoolctl is installed
+    '''
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(n_cpu)
+
+
+def limit_n_jobs(estimator, n_jobs=1):
+    '''set n_jobs (and xgboost nthread) parameters of estimator and its
+    nested estimators to n_jobs where they are None, -1 or larger
+
+    return
+    ----
+    dict of changed parameters {name: old value}
+    '''
+    if not hasattr(estimator, 'get_params'):
+        return {}
+    changed = {}
+    for k, v in estimator.get_params(deep=True).items():
+        if k.split('__')[-1] not in ('n_jobs', 'nthread'):
+            continue
+        if v is None or v < 0 or v > n_jobs:
+            changed[k] = v
+    # set deepest parameters last, outer set_params may replace objects
+    for k in sorted(changed, key=lambda x: x.count('__')):
+        estimator.set_params(**{k: n_jobs})
+    return changed
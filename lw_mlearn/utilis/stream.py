@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+read & write data in row chunks, to process data larger than memory
+
+@author: roger luo
+
+function
+-----
+
+iter_chunks:
+    return iterator of DataFrame chunks from csv/parquet file, SQL_engine
+    query, DataFrame or iterable of DataFrames
+
+class
+-----
+
+Chunk_writer:
+    write DataFrame chunks to csv/parquet file, database table or callable,
+    or collect them in memory
+"""
+import os
+import pandas as pd
+
+
+def iter_chunks(source, chunksize=100000):
+    '''return iterator of DataFrame chunks of source
+
+    source
+        - str, '.csv' or '.parquet' file
+        - (SQL_engine, sql) tuple, query result read by chunks
+        - DataFrame, sliced by chunksize rows
+        - iterable of DataFrames, returned as is
+    chunksize
+        - number of rows of each chunk
+    '''
+    if isinstance(source, str):
+        suffix = os.path.splitext(source)[1]
+        if suffix == '.csv':
+            return pd.read_csv(source, chunksize=chunksize)
+        if suffix == '.parquet':
+            return _iter_parquet(source, chunksize)
+        raise ValueError("unsupported file suffix '{}', use '.csv' or "
+                         "'.parquet'".format(suffix))
+    if isinstance(source, tuple) and len(source) == 2:
+        engine, sql = source
+        if hasattr(engine, 'getengine'):
+            engine = engine.getengine()
+        return pd.read_sql_query(sql, engine, chunksize=chunksize)
+    if isinstance(source, pd.DataFrame):
+        return (source.iloc[i:i + chunksize]
+                for i in range(0, len(source), chunksize))
+    return iter(source)
+
+
+def _iter_parquet(file, chunksize):
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(file).iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+class Chunk_writer():
+    '''write DataFrame chunks to sink one by one
+
+    sink
+        - None, chunks are collected and concatenated on close
+        - str, '.csv' or '.parquet' file, overwritten
+        - (SQL_engine, table name) tuple, chunks appended to table
+        - callable, called with each chunk
+
+    method
+    ----
+    write:
+        write a chunk
+    close:
+        finish writing, return concatenated DataFrame if sink is None,
+        else number of rows written
+    '''
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.n_rows = 0
+        self._chunks = []
+        self._writer = None
+        self._engine = None
+
+    def write(self, chunk):
+        sink = self.sink
+        if sink is None:
+            self._chunks.append(chunk)
+        elif callable(sink):
+            sink(chunk)
+        elif isinstance(sink, str):
+            suffix = os.path.splitext(sink)[1]
+            if suffix == '.csv':
+                chunk.to_csv(sink, index=False, header=self.n_rows == 0,
+                             mode='w' if self.n_rows == 0 else 'a')
+            elif suffix == '.parquet':
+                self._write_parquet(chunk)
+            else:
+                raise ValueError("unsupported file suffix '{}', use '.csv' "
+                                 "or '.parquet'".format(suffix))
+        elif isinstance(sink, tuple) and len(sink) == 2:
+            engine, table = sink
+            if self._engine is None:
+                self._engine = engine.getengine() \
+                    if hasattr(engine, 'getengine') else engine
+            chunk.to_sql(table, self._engine, if_exists='append',
+                         index=False)
+        else:
+            raise ValueError('invalid sink type: {}'.format(
+                sink.__class__.__name__))
+        self.n_rows += len(chunk)
+
+    def _write_parquet(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.sink, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.sink is None:
+            if len(self._chunks) == 0:
+                return pd.DataFrame()
+            return pd.concat(self._chunks, ignore_index=True)
+        return self.n_rows
@@ -5,7 +5,10 @@ Created on Fri Nov  9 11:55:15 2018
 @author: roger
 """
 import pandas as pd
+import numpy as np
 import inspect
+import hashlib
+import pickle
 
 from pandas.core.dtypes import api
 from functools import wraps, reduce
@@ -67,6 +70,44 @@ def get_flat_list(x):
         return [x]
 
 
+def get_fingerprint(data, index=False):
+    '''return fast content hash of data, used as key to memoize results
+    computed on the same dataset
+    
+    data
+        - DataFrame, Series, ndarray, or list/tuple of them; other objects
+        are hashed by their pickled bytes
+    index
+        - bool, if True index of pandas objects is included in hash
+        
+    return
+    ----
+    hex digest str
+    '''
+    h = hashlib.md5()
+    for i in (data if isinstance(data, (list, tuple)) else [data]):
+        try:
+            if isinstance(i, (pd.DataFrame, pd.Series)):
+                names = i.columns if isinstance(i, pd.DataFrame) else [i.name]
+                h.update(repr((i.shape, list(names),
+                               [str(d) for d in np.atleast_1d(i.dtypes)]))
+                         .encode())
+                h.update(pd.util.hash_pandas_object(i, index=index).values)
+            elif isinstance(i, np.ndarray) and i.dtype.kind in 'biufcmM':
+                h.update(repr((i.shape, str(i.dtype))).encode())
+                h.update(np.ascontiguousarray(i).view(np.uint8))
+            elif isinstance(i, np.ndarray) and i.ndim > 0:
+                h.update(repr((i.shape, str(i.dtype))).encode())
+                h.update(pd.util.hash_pandas_object(
+                    pd.DataFrame(i.reshape(len(i), -1)), index=False).values)
+            else:
+                h.update(pickle.dumps(i))
+        except TypeError:
+            # unhashable elements
+            h.update(pickle.dumps(i))
+    return h.hexdigest()
+
+
 def default_func(func, new_funcname=None, **kwargs_outer):
     '''return function with default keyword arguments specified in
     kwargs_outer where a new_funcname is given to newly initialized func
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+performance benchmark of lw_mlearn on synthetic credit-like data
+
+@author: roger luo
+
+usage
+-----
+python tests/benchmark/run_benchmark.py [--preset small] [--cases woe_fit ...]
+    [--output results.json] [--baseline baseline.json] [--save-baseline]
+    [--tolerance 0.25] [--repeat 3]
+
+- results (min & median seconds of repeated runs, data shape, environment)
+  are dumped to --output as json
+- if --baseline file exists, cases slower than baseline min * (1 + tolerance)
+  are reported as regressions and exit code is 1
+- --save-baseline writes current results as baseline; no baseline is
+  shipped, it must be recorded on the machine used for comparison
+
+presets (rows x columns, mixed numeric/object/NaN)
+-----
+small:  1e4 x 50
+medium: 1e5 x 200
+large:  1e6 x 500
+xlarge: 1e7 x 2000, needs > 100 GB memory
+
+expensive cases are run on a row/column subset of the data, see _CASES
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+
+from lw_mlearn.lw_preprocess import (Split_cls, Woe_encoder, Oht_encoder,
+                                     to_num_datetime_df, _binning, ks_score)
+from lw_mlearn.lw_model import ML_model, run_CVscores
+from lw_mlearn.utilis.read_write import Objs_management
+
+PRESETS = {
+    'small': (10**4, 50),
+    'medium': (10**5, 200),
+    'large': (10**6, 500),
+    'xlarge': (10**7, 2000),
+}
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_credit_data(n_rows, n_cols, seed=0):
+    '''return X DataFrame, y Series of synthetic credit-like data
+
+    columns
+    ----
+    - 60% continuous (amounts, ratios) with 5% NaN
+    - 20% counts (int)
+    - 15% categorical object with NaN
+    - 5% numeric values stored as strings, with some invalid entries
+
+    y
+    ----
+    binary default flag by a logistic function of some of columns, event
+    rate around 10%
+    '''
+    rng = np.random.RandomState(seed)
+    n_num = max(int(n_cols * 0.6), 1)
+    n_cnt = int(n_cols * 0.2)
+    n_cat = int(n_cols * 0.15)
+    n_str = n_cols - n_num - n_cnt - n_cat
+    data = {}
+    num = rng.lognormal(8, 1, (n_rows, n_num)).astype(np.float32)
+    num[rng.rand(n_rows, n_num) < 0.05] = np.nan
+    for i in range(n_num):
+        data['amt_{}'.format(i)] = num[:, i]
+    for i in range(n_cnt):
+        data['cnt_{}'.format(i)] = rng.poisson(2, n_rows)
+    levels = np.array(['A', 'B', 'C', 'D', 'E', 'F', None], dtype=object)
+    for i in range(n_cat):
+        data['cat_{}'.format(i)] = levels[rng.randint(0, 7, n_rows)]
+    for i in range(n_str):
+        col = rng.randint(0, 1000, n_rows).astype(str).astype(object)
+        col[rng.rand(n_rows) < 0.01] = 'unknown'
+        data['str_{}'.format(i)] = col
+    X = pd.DataFrame(data)
+
+    z = -2.5 + 0.8 * np.nan_to_num(np.log(num[:, 0]) - 8)
+    if n_cnt > 0:
+        z = z + 0.3 * (X['cnt_0'].values - 2)
+    if n_cat > 0:
+        z = z + 0.5 * (X['cat_0'] == 'A').values
+    y = pd.Series(rng.rand(n_rows) < 1 / (1 + np.exp(-z)), name='y')
+    return X, y.astype(int)
+
+
+def _subset(data, max_rows=None, max_cols=None):
+    X, y = data
+    if max_rows is not None and len(X) > max_rows:
+        X, y = X.iloc[:max_rows], y.iloc[:max_rows]
+    if max_cols is not None and X.shape[1] > max_cols:
+        X = X.iloc[:, :max_cols]
+    return X, y
+
+
+def _clean(X, y):
+    return Split_cls(na1='null', na2=-999).fit_transform(X), y
+
+
+def _woe(X, y):
+    X, y = _clean(X, y)
+    return Woe_encoder(max_leaf_nodes=5).fit(X, y), X
+
+
+def _score(X, y):
+    score = np.log1p(X.iloc[:, 0].values.astype(float))
+    return np.nan_to_num(score), y
+
+
+def _bench_split_cls(X, y):
+    Split_cls(na1='null', na2=-999).fit_transform(X)
+
+
+def _bench_to_num(X, y):
+    to_num_datetime_df(X)
+
+
+def _bench_woe_fit(X, y):
+    Woe_encoder(max_leaf_nodes=5).fit(X, y)
+
+
+def _bench_woe_transform(woe, X):
+    woe.transform(X)
+
+
+def _bench_oht(X, y):
+    Oht_encoder().fit_transform(X)
+
+
+def _bench_binning(score, y):
+    _binning(score, q=10)
+
+
+def _bench_ks(score, y):
+    ks_score(y, score)
+
+
+def _bench_run_train(X, y):
+    model = ML_model('cleanNA_woe5_LogisticRegression', path=_TMP[0],
+                     verbose=0, artifacts='none')
+    model.run_train((X, y), cv=3, q=10)
+
+
+def _bench_run_cvscores(X, y):
+    run_CVscores(X, y, cv=3, estimator_lis=[
+        'cleanNA_woe5_LogisticRegression', 'clean_oht_XGBClassifier'])
+
+
+def _bench_write(X, y):
+    folder = Objs_management(_TMP[0], manifest=False)
+    folder.write(X, 'bench.csv')
+    folder.write(X, 'bench.pkl')
+    folder.write(X.iloc[:10**5], 'bench.xlsx')
+
+
+_TMP = [None]
+
+# name: (setup, function, max_rows, max_cols), setup(X, y) returns 
+# arguments of function & is not timed
+_CASES = {
+    'split_cls': (None, _bench_split_cls, None, None),
+    'to_num_datetime_df': (None, _bench_to_num, 10**6, 200),
+    'woe_fit': (_clean, _bench_woe_fit, 10**6, 200),
+    'woe_transform': (_woe, _bench_woe_transform, 10**6, 200),
+    'oht_encoder': (_clean, _bench_oht, 10**6, 200),
+    'binning': (_score, _bench_binning, None, None),
+    'ks_score': (_score, _bench_ks, None, None),
+    'run_train': (None, _bench_run_train, 10**5, 100),
+    'run_CVscores': (None, _bench_run_cvscores, 10**5, 100),
+    'artifact_write': (None, _bench_write, 10**6, 100),
+}
+
+
+def run_benchmark(preset='small', cases=None, repeat=3, seed=0):
+    '''run benchmark cases on data of preset size
+
+    return
+    ----
+    dict of 'meta' (environment) & 'results' {case: timing}
+    '''
+    n_rows, n_cols = PRESETS[preset]
+    data = make_credit_data(n_rows, n_cols, seed)
+    cases = list(_CASES) if cases is None else cases
+    results = {}
+    _TMP[0] = tempfile.mkdtemp(prefix='lw_bench_')
+    try:
+        for name in cases:
+            setup, func, max_rows, max_cols = _CASES[name]
+            X, y = _subset(data, max_rows, max_cols)
+            args = (X, y) if setup is None else setup(X, y)
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                func(*args)
+                times.append(time.perf_counter() - t0)
+            results[name] = {
+                'min': min(times),
+                'median': float(np.median(times)),
+                'repeat': repeat,
+                'rows': X.shape[0],
+                'cols': X.shape[1]
+            }
+            print('{:<20} {:>10.4f}s  ({} x {})'.format(name, min(times),
+                                                       *X.shape))
+    finally:
+        shutil.rmtree(_TMP[0], ignore_errors=True)
+    return {'meta': _environment(preset, seed), 'results': results}
+
+
+def compare(results, baseline, tolerance=0.25):
+    '''return list of (case, baseline min, current min) of cases slower than
+    baseline min * (1 + tolerance), only cases of the same data shape are
+    compared
+    '''
+    regressions = []
+    base = baseline.get('results', {})
+    for name, v in results['results'].items():
+        b = base.get(name)
+        if b is None or (b['rows'], b['cols']) != (v['rows'], v['cols']):
+            continue
+        if v['min'] > b['min'] * (1 + tolerance):
+            regressions.append((name, b['min'], v['min']))
+    return regressions
+
+
+def _environment(preset, seed):
+    import sklearn
+    return {
+        'preset': preset,
+        'seed': seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='lw_mlearn benchmark')
+    parser.add_argument('--preset', default='small', choices=list(PRESETS))
+    parser.add_argument('--cases', nargs='*', choices=list(_CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='json file of results, default '
+                        'benchmark_<preset>.json in current directory')
+    parser.add_argument('--baseline', default=None,
+                        help='json file of baseline, default '
+                        'baseline_<preset>.json next to this script')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    output = args.output or 'benchmark_{}.json'.format(args.preset)
+    baseline = args.baseline or os.path.join(
+        _HERE, 'baseline_{}.json'.format(args.preset))
+
+    results = run_benchmark(args.preset, args.cases, args.repeat, args.seed)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print("results dumped into '{}'".format(output))
+
+    if args.save_baseline:
+        with open(baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print("baseline saved into '{}'".format(baseline))
+        return 0
+
+    if not os.path.isfile(baseline):
+        print("no baseline '{}', run with --save-baseline to record one"
+              .format(baseline))
+        return 0
+    with open(baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for name, b, v in regressions:
+        print('<regression>: {} {:.4f}s -> {:.4f}s (+{:.0%})'.format(
+            name, b, v, v / b - 1))
+    if len(regressions) == 0:
+        print('no regression against baseline')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,10 +4,35 @@ Created on Thu Mar 28 15:26:59 2019
 
 @author: rogerluo
 """
+import os
+import sys
+import json
+import time
+import subprocess
+import math
 import pytest
+import pickle
+import sqlite3
+import threading
+import tracemalloc
+import urllib.request
+import pandas as pd
 import numpy as np
-from lw_mlearn import pipe_main, ML_model
+from lw_mlearn import pipe_main, ML_model, run_CVscores, run_analy
+from lw_mlearn.lw_preprocess import (binary_metrics, ks_score,
+                                     get_custom_scorer)
+from lw_mlearn.lw_search import Halving_search, Path_search, Tpe_search
+from lw_mlearn.lw_inference import compile_pipeline, scorecard_sql
+from lw_mlearn.lw_server import make_server
+from lw_mlearn.utilis.profiler import profile_context, profile_records
+from lw_mlearn.utilis.read_write import Objs_management
+from lw_mlearn.utilis.dataset import dump_dataset, load_dataset
+from lw_mlearn.utilis.memory import Memory_cache
+from lw_mlearn.utilis.scheduler import Process_scheduler
+from sklearn.model_selection import GridSearchCV
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.datasets import make_classification
+from sklearn.metrics import roc_auc_score, average_precision_score
 
 
 @pytest.fixture
@@ -46,6 +71,648 @@ def test_ml_model(data, pipe='clean_oht_XGBClassifier'):
     assert check == 0
 
 
+@pytest.mark.fast
+def test_artifacts_modes(data, tmp_path):
+    '''test 'scores' mode skips figures & spreadsheets, 'none' mode writes
+    no files, and figures opened by user are kept
+    '''
+    import matplotlib.pyplot as plt
+    X, y = data
+    fig = plt.figure()
+    suffixes = {}
+    for mode in ['full', 'scores', 'none']:
+        path = str(tmp_path / mode)
+        E = ML_model('clean_oht_LogisticRegression', path=path,
+                     artifacts=mode)
+        E.run_analysis((X, y), (X, y), max_leaf_nodes=5)
+        E.flush()
+        suffixes[mode] = {os.path.splitext(f)[1]
+                          for _, _, files in os.walk(path) for f in files}
+        assert {'train', 'test'} <= set(E.analysis_results)
+    assert {'.pdf', '.xlsx'} <= suffixes['full']
+    assert not {'.pdf', '.xlsx'} & suffixes['scores']
+    assert len(suffixes['scores']) > 0 and len(suffixes['none']) == 0
+    assert plt.fignum_exists(fig.number)
+    plt.close(fig)
+
+
+@pytest.mark.fast
+def test_predict_cache(tmp_path, monkeypatch):
+    '''test cached predictions are reused for the same fitted estimator and
+    invalidated by fit, search & replacement of estimator; test scores 
+    fingerprint X once
+    '''
+    X, y = make_classification(200, random_state=0)
+    E = ML_model('clean_LogisticRegression', path=str(tmp_path))
+    E.fit(X, y)
+    proba = E._predict_cached(X, 'predict_proba')
+    assert E._predict_cached(X.copy(), 'predict_proba') is proba
+    assert np.array_equal(proba, E.estimator.predict_proba(X))
+    E.fit(X[:100], y[:100])
+    refit = E._predict_cached(X, 'predict_proba')
+    assert refit is not proba
+    assert np.array_equal(refit, E.estimator.predict_proba(X))
+    E.grid_searchcv(X, y, {'LogisticRegression__C': [0.01, 0.1]}, n_jobs=1)
+    searched = E._predict_cached(X, 'predict_proba')
+    assert searched is not refit
+    assert np.array_equal(searched, E.estimator.predict_proba(X))
+    E.__dict__['estimator'] = pipe_main('clean_LogisticRegression').fit(
+        X[:50], y[:50])
+    assert np.array_equal(E._predict_cached(X, 'predict_proba'),
+                          E.estimator.predict_proba(X))
+    from lw_mlearn import lw_model
+    calls = []
+    fingerprint = lw_model.get_fingerprint
+    monkeypatch.setattr(lw_model, 'get_fingerprint', 
+                        lambda X: calls.append(1) or fingerprint(X))
+    scores = E.test_score(X, y, cv=3, scoring=['roc_auc', 'KS', 'accuracy'])
+    assert scores.shape[0] == 3 and len(calls) == 1
+
+
+@pytest.mark.fast
+def test_binary_metrics():
+    '''test one-pass metrics against sklearn metrics
+    '''
+    rng = np.random.RandomState(0)
+    y = rng.randint(0, 2, 1000)
+    y_score = np.round(rng.randn(1000) + y, 1)
+    scores = binary_metrics(y, y_score)
+    assert np.isclose(scores['roc_auc'], roc_auc_score(y, y_score))
+    assert np.isclose(scores['average_precision'],
+                      average_precision_score(y, y_score))
+    assert np.isclose(scores['KS'], ks_score(y, y_score))
+    assert np.isclose(scores['gini'], 2 * scores['roc_auc'] - 1)
+
+
+@pytest.mark.fast
+def test_custom_scorer():
+    '''test custom scorers honor pos_label & sample_weight, and fall back
+    to sklearn scorers for multiclass target
+    '''
+    X, y = make_classification(500, random_state=0)
+    weight = np.random.RandomState(0).rand(500)
+    estimator = pipe_main('LogisticRegression').fit(X, y)
+    proba = estimator.predict_proba(X)
+    scorer = get_custom_scorer()
+    assert np.isclose(scorer['roc_auc'](estimator, X, y, weight),
+                      roc_auc_score(y, proba[:, 1], sample_weight=weight))
+    scorer = get_custom_scorer(pos_label=0)
+    assert np.isclose(scorer['average_precision'](estimator, X, y),
+                      average_precision_score(y == 0, proba[:, 0]))
+    X, y = make_classification(300, n_classes=3, n_informative=4,
+                               random_state=0)
+    estimator = pipe_main('LogisticRegression').fit(X, y)
+    with pytest.raises(ValueError):
+        scorer['KS'](estimator, X, y)
+    scorer = get_custom_scorer()['roc_auc']
+    assert scorer.fallback is not None
+    assert not scorer.engine.applicable(estimator, y)
+
+
+@pytest.mark.fast
+def test_halving_search():
+    '''test successive halving keeps best candidate of full resources
+    '''
+    X, y = make_classification(600, random_state=0)
+    grid = {'C': np.logspace(-3, 0, 9)}
+    search = Halving_search(pipe_main('LogisticRegression'), grid,
+                            scoring='roc_auc', n_jobs=1)
+    search.fit(X, y)
+    results = search.cv_results_
+    assert search.n_evaluated_ + search.n_skipped_ == 9
+    assert search.n_skipped_ > 0
+    best = results.loc[results['rank_test_score'] == 1]
+    assert (best['n_resources'] == len(y)).all()
+    assert best['mean_test_score'].iloc[0] == search.best_score_
+
+
+@pytest.mark.fast
+def test_tpe_search():
+    '''test tpe search evaluates n_iter candidates within the space, and is
+    reproducible under random_state
+    '''
+    from scipy.stats import uniform, randint
+    X, y = make_classification(300, random_state=0)
+    space = {'C': uniform(1e-3, 10), 'max_iter': randint(50, 200),
+             'fit_intercept': [True, False]}
+    results = []
+    for i in range(2):
+        search = Tpe_search(pipe_main('LogisticRegression'), space,
+                            scoring='roc_auc', n_iter=8, n_initial=4,
+                            n_jobs=1, random_state=1, verbose=0)
+        search.fit(X, y)
+        assert len(search.cv_results_) == 8
+        assert search.n_fits_ == 8 * 3
+        best = search.best_params_
+        assert 1e-3 <= best['C'] <= 1e-3 + 10
+        assert 50 <= best['max_iter'] < 200
+        assert best['fit_intercept'] in space['fit_intercept']
+        results.append(search.cv_results_)
+    assert results[0]['params'].tolist() == results[1]['params'].tolist()
+    assert np.allclose(results[0]['mean_test_score'],
+                       results[1]['mean_test_score'])
+
+
+@pytest.mark.fast
+def test_path_search():
+    '''test n_estimators path evaluated from one fit equals grid search
+    '''
+    X, y = make_classification(300, random_state=0)
+    estimator = pipe_main('clean_GradientBoostingClassifier')
+    estimator.set_params(GradientBoostingClassifier__random_state=0)
+    grid = {'GradientBoostingClassifier__n_estimators': [5, 10, 20]}
+    assert Path_search.applicable(estimator, grid)
+    path = Path_search(estimator, grid, scoring='roc_auc', n_jobs=1)
+    path.fit(X, y)
+    search = GridSearchCV(estimator, grid, scoring='roc_auc', cv=3)
+    search.fit(X, y)
+    assert np.allclose(path.cv_results_['mean_test_score'],
+                       search.cv_results_['mean_test_score'])
+    assert path.n_fits_ == 3
+
+
+@pytest.mark.fast
+def test_memory_cache(tmp_path):
+    '''test fitted steps are served from memory cache on refit of the same
+    prefix, with copies of cached results, and stats of hits & evictions
+    '''
+    from sklearn.base import clone
+    from joblib import Memory
+    X, y = make_classification(300, random_state=0)
+    memory = Memory_cache(max_entries=2)
+    pipe = pipe_main('clean_stdscale_LogisticRegression')
+    pipe.set_params(memory=memory)
+    proba = clone(pipe).fit(X, y).predict_proba(X)
+    assert memory.stats()['misses'] == 2 and memory.stats()['hits'] == 0
+    refit = clone(pipe).set_params(LogisticRegression__C=0.5).fit(X, y)
+    assert memory.stats()['hits'] == 2 and memory.stats()['bytes'] > 0
+    assert refit.named_steps['stdscale'] is not \
+        clone(pipe).fit(X, y).named_steps['stdscale']
+    assert np.allclose(clone(pipe).fit(X, y).predict_proba(X), proba)
+    clone(pipe).fit(X[:200], y[:200])
+    stats = memory.stats()
+    assert stats['evictions'] == 2 and stats['entries'] == 2
+    # joblib.Memory of user has no stats
+    E = ML_model(pipe_main('clean_LogisticRegression'), path=str(tmp_path),
+                 verbose=1)
+    E.estimator.memory = Memory(None, verbose=0)
+    E._shut_temp_folder()
+    assert E.estimator.memory is None
+
+
+@pytest.mark.fast
+def test_shared_prefix():
+    '''test cv scores of shared-prefix executor equal independent pipelines
+    '''
+    X, y = make_classification(300, random_state=0)
+    pipes = ['clean_stdscale_LogisticRegression', 
+             'clean_stdscale_SVC', 
+             'clean_maxscale_LogisticRegression']
+    kw = dict(cv=3, scoring=['roc_auc'], estimator_lis=pipes)
+    shared = run_CVscores(X, y, shared_prefix=True, **kw)
+    single = run_CVscores(X, y, **kw)
+    assert list(shared.columns) == list(single.columns)
+    assert np.allclose(shared['test_roc_auc'].astype(float),
+                       single['test_roc_auc'].astype(float))
+
+
+@pytest.mark.fast
+def test_profile_steps():
+    '''test calls of profiled steps are recorded, steps are left as they are
+    and pickling & clone keep profiling; tracing is stopped by the context
+    '''
+    from sklearn.base import clone
+    from sklearn.linear_model import LogisticRegression
+    X, y = make_classification(200, random_state=0)
+    pipe = pipe_main('clean_stdscale_LogisticRegression', profile=True)
+    tracing = tracemalloc.is_tracing()
+    with profile_context(model='test_profile_steps'):
+        pipe.fit(X, y)
+        pipe.predict_proba(X)
+    assert tracemalloc.is_tracing() == tracing
+    records = profile_records(clear=True, model='test_profile_steps')
+    assert set(records['step']) == {'clean', 'stdscale', 'LogisticRegression'}
+    assert (records['rows_in'] == 200).all()
+    assert records['fit_id'].nunique() == 1
+    assert records['peak_mb'].notna().all()
+    assert type(pipe.steps[-1][1]) is LogisticRegression
+    cloned = clone(pipe).set_params(LogisticRegression__C=0.5)
+    assert type(cloned) is type(pipe)
+    with profile_context(model='test_profile_steps'):
+        cloned.fit(X, y)
+    assert len(profile_records(clear=True, model='test_profile_steps')) == 3
+    pipe = pickle.loads(pickle.dumps(pipe))
+    with profile_context(model='test_profile_steps'):
+        pipe.predict_proba(X)
+    assert len(profile_records(clear=True, model='test_profile_steps')) == 3
+    # samplers are recorded in fit only
+    X, y = make_classification(200, weights=[0.7], random_state=0)
+    pipes = [pipe_main('clean_stdscale_runder_LogisticRegression', profile=p)
+             .set_params(runder__random_state=0) for p in [True, False]]
+    with profile_context(model='test_profile_steps'):
+        pipes[0].fit(X, y)
+        proba = pipes[0].predict_proba(X)
+    assert np.allclose(proba, pipes[1].fit(X, y).predict_proba(X))
+    records = profile_records(clear=True, model='test_profile_steps')
+    fit = records[records['method'] != 'predict_proba'].set_index('step')
+    assert fit.loc['runder', 'method'] == 'fit_resample'
+    assert fit.loc['LogisticRegression', 'rows_in'] < 200
+    assert 'runder' not in records.loc[
+        records['method'].isin(['transform', 'predict_proba']), 'step'].values
+
+
+@pytest.mark.fast
+def test_inference_plan(data):
+    '''test compiled inference plan against predict_proba of pipeline, for
+    batch & single dict records
+    '''
+    X, y = data
+    for pipe in ['cleanNA_woe5_LogisticRegression',
+                 'clean_oht_stdscale_DecisionTreeClassifier']:
+        estimator = pipe_main(pipe).fit(X, y)
+        plan = compile_pipeline(estimator)
+        # repeated predictions must not change woe_map
+        estimator.predict_proba(X)
+        proba = estimator.predict_proba(X)
+        assert np.allclose(plan.predict_proba(X), proba)
+        scores = [plan.score_record(dict(enumerate(i))) for i in X]
+        assert np.allclose(scores, proba[:, 1])
+    estimator = pipe_main('clean_stdscale_SVC').fit(X, y)
+    with pytest.raises(ValueError, match="final estimator 'SVC'"):
+        compile_pipeline(estimator)
+
+
+@pytest.mark.fast
+def test_scorecard_sql(data):
+    '''test scores of woe scorecard SQL in sqlite against predict_proba
+    '''
+    X, y = data
+    X = pd.DataFrame(X).add_prefix('x')
+    X['id'] = range(len(X))
+    estimator = pipe_main('clean_woe5_LogisticRegression').fit(X, y)
+    conn = sqlite3.connect(':memory:')
+    conn.create_function('EXP', 1, math.exp)
+    X.to_sql('applicant', conn, index=False)
+    sql = scorecard_sql(estimator, 'applicant', dialect='sqlite',
+                        id_cols=['id'])
+    scores = pd.read_sql_query(sql, conn).sort_values('id')
+    conn.close()
+    assert np.allclose(scores['score'], estimator.predict_proba(X)[:, 1])
+
+
+@pytest.mark.fast
+def test_model_server(data, tmp_path):
+    '''test scores of concurrent requests to server of saved model against
+    predict_proba, and metrics counters
+    '''
+    X, y = data
+    E = ML_model('cleanNA_woe5_LogisticRegression', path=str(tmp_path))
+    E.fit(X, y)
+    E.save()
+    server = make_server(str(tmp_path), port=0, max_wait_us=5000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    def post(i):
+        body = json.dumps({'records': [dict(enumerate(X[i].tolist()))]})
+        req = urllib.request.Request(url + '/predict', body.encode())
+        return json.loads(urllib.request.urlopen(req).read())['scores'][0]
+
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            scores = list(pool.map(post, range(len(X))))
+        metrics = json.loads(urllib.request.urlopen(url + '/metrics').read())
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.scorer.close()
+    assert np.allclose(scores, E.estimator.predict_proba(X)[:, 1])
+    assert metrics['records'] == len(X)
+    assert metrics['batches'] <= len(X)
+
+
+@pytest.mark.fast
+def test_model_server_ipv6(data):
+    '''test server bound to IPv6 loopback address
+    '''
+    import socket
+    try:
+        with socket.socket(socket.AF_INET6) as s:
+            s.bind(('::1', 0))
+    except (AttributeError, OSError):
+        pytest.skip('IPv6 loopback not available')
+    X, y = data
+    estimator = pipe_main('cleanNA_woe5_LogisticRegression').fit(X, y)
+    server = make_server(estimator, host='::1', port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://[::1]:{}/predict'.format(server.server_address[1])
+    body = json.dumps({'records': [dict(enumerate(X[0].tolist()))]})
+    try:
+        req = urllib.request.Request(url, body.encode())
+        score = json.loads(urllib.request.urlopen(req).read())['scores'][0]
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.scorer.close()
+    assert np.isclose(score, estimator.predict_proba(X[:1])[0, 1])
+
+
+@pytest.mark.fast
+def test_columnar_io(data, tmp_path):
+    '''test dtype preserving parquet/feather round trips with column
+    projection, and arrow persisted train data
+    '''
+    pytest.importorskip('pyarrow')
+    X, y = data
+    df = pd.DataFrame(X).assign(cat=pd.Categorical(['a', 'b'] * 50 + ['a']))
+    folder = Objs_management(str(tmp_path))
+    for file in ['df.parquet', 'df.feather']:
+        folder.write(df, file)
+        read = folder.read(str(tmp_path / file))
+        assert read.equals(df) and read.dtypes.equals(df.dtypes)
+        assert folder.read(str(tmp_path / file), 
+                           columns=[0, 'cat']).equals(df[[0, 'cat']])
+    folder.write((df, pd.Series(y)), 'data/0.traindata')
+    X1, y1 = folder.read(str(tmp_path / 'data/0.traindata'))
+    assert X1.equals(df) and np.array_equal(y1, y)
+
+
+@pytest.mark.fast
+def test_score_stream(data, tmp_path):
+    '''test scores of chunked csv/parquet files against predict_proba, in
+    this process and in worker pools called one after another
+    '''
+    pytest.importorskip('pyarrow')
+    X, y = data
+    df = pd.DataFrame(X).add_prefix('x')
+    E = ML_model(pipe_main('clean_LogisticRegression').fit(df, y),
+                 path=str(tmp_path / 'model'))
+    proba = E.estimator.predict_proba(df)[:, 1]
+    df['id'] = range(len(df))
+    df.to_csv(str(tmp_path / 'df.csv'), index=False)
+    df.to_parquet(str(tmp_path / 'df.parquet'))
+    for file in ['df.csv', 'df.parquet']:
+        for n_jobs in [1, 2]:
+            rst = E.score_stream(str(tmp_path / file), chunksize=30,
+                                 n_jobs=n_jobs, id_cols='id')
+            assert rst['id'].tolist() == df['id'].tolist()
+            assert np.allclose(rst['score'], proba)
+
+
+@pytest.mark.fast
+def test_dataset_store(data, tmp_path):
+    '''test memory-mapped dataset store round trip, and cv scores of 
+    supervised workers reading shared data
+    '''
+    X, y = data
+    df = pd.DataFrame(X).assign(
+        obj=['a', None] * 50 + ['b'],
+        cat=pd.Categorical(['a', 'b'] * 50 + [np.nan]))
+    y = pd.Series(y, name='y')
+    X1, y1 = load_dataset(dump_dataset(df, y, str(tmp_path / 'store')))
+    assert X1.equals(df) and X1.dtypes.equals(df.dtypes) and y1.equals(y)
+    assert isinstance(X1[0].values.base, np.memmap)
+    kw = dict(cv=3, scoring=['roc_auc'], 
+              estimator_lis=['clean_oht_LogisticRegression'])
+    df = df.drop(columns='cat')
+    shared = run_CVscores(df, y, time_limit=300, **kw)
+    single = run_CVscores(df, y, **kw)
+    assert np.allclose(shared['test_roc_auc'].astype(float),
+                       single['test_roc_auc'].astype(float))
+
+
+def _sleep_task(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def _memory_task(pid_file):
+    '''start a child process, then allocate memory until killed
+    '''
+    child = subprocess.Popen([sys.executable, '-c',
+                              'import time; time.sleep(60)'])
+    with open(pid_file, 'w') as f:
+        f.write(str(child.pid))
+    blocks = []
+    for i in range(40):
+        blocks.append(np.ones(2**20))
+        time.sleep(0.05)
+    time.sleep(60)
+
+
+def _fail_task():
+    raise ValueError('task failed')
+
+
+@pytest.mark.fast
+def test_scheduler_limits(tmp_path):
+    '''test tasks exceeding time or memory limits are killed with child
+    processes, and exceptions of tasks are reported
+    '''
+    psutil = pytest.importorskip('psutil')
+    pid_file = str(tmp_path / 'child.pid')
+    scheduler = Process_scheduler(cpu_budget=3, poll=0.1)
+    scheduler.submit('ok', _sleep_task, args=(0,))
+    scheduler.submit('timeout', _sleep_task, args=(60,), time_limit=1)
+    # forked worker starts with resident memory of this process
+    rss = psutil.Process().memory_info().rss / 2**20
+    scheduler.submit('memory', _memory_task, args=(pid_file,),
+                     mem_limit=rss + 150)
+    scheduler.submit('error', _fail_task)
+    t0 = time.time()
+    outcomes = scheduler.run()
+    assert time.time() - t0 < 30
+    assert {k: v['status'] for k, v in outcomes.items()} == \
+        {'ok': 'ok', 'timeout': 'timeout', 'memory': 'memory',
+         'error': 'error'}
+    assert outcomes['ok']['result'] == 0
+    assert 'task failed' in outcomes['error']['error']
+    with open(pid_file) as f:
+        pid = int(f.read())
+    assert not psutil.pid_exists(pid) or \
+        psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+
+
+@pytest.mark.fast
+def test_supervised_status(data, tmp_path):
+    '''test supervised run_analy adds status & error of each model
+    '''
+    X, y = data
+    train, test = run_analy(X, y, (X, y),
+                            model_list=['clean_LogisticRegression', 'nopipe'],
+                            dirs=str(tmp_path), artifacts='none',
+                            time_limit=120, grid_search=False)
+    for score in (train, test):
+        assert score['status'].tolist() == ['ok', 'error']
+        assert score['error'].iloc[0] is None
+        assert isinstance(score['error'].iloc[1], str)
+
+
+@pytest.mark.fast
+def test_checkpoint_resume(data, tmp_path, monkeypatch):
+    '''test run_analy with checkpoint resumes from unfinished stages, 
+    loads completed models, and reruns all stages if data or spec changes
+    '''
+    X, y = data
+    run_stage = ML_model._run_stage
+    stages = []
+
+    def _run_stage(self, stage, *args):
+        if stage == fail:
+            raise RuntimeError('stage failed')
+        stages.append(stage)
+        return run_stage(self, stage, *args)
+
+    monkeypatch.setattr(ML_model, '_run_stage', _run_stage)
+    kw = dict(model_list=['clean_LogisticRegression'], dirs=str(tmp_path),
+              artifacts='scores', checkpoint=True, grid_search=False)
+    fail = 'test'
+    with pytest.raises(RuntimeError):
+        run_analy(X, y, (X, y), **kw)
+    assert stages == ['train']
+    fail = None
+    train, test = run_analy(X, y, (X, y), **kw)
+    assert stages == ['train', 'test']
+    train1, test1 = run_analy(X, y, (X, y), **kw)
+    assert stages == ['train', 'test']
+    assert train1.equals(train) and test1.equals(test)
+    del stages[:]
+    run_analy(X * 2, y, (X, y), **kw)
+    assert stages == ['train', 'test']
+    run_analy(X * 2, y, (X, y), cv=2, **kw)
+    assert stages == ['train', 'test'] * 2
+    # not saved without data artifacts
+    run_analy(X, y, (X, y), **dict(kw, artifacts='none',
+                                   dirs=str(tmp_path / 'none')))
+    assert [f for _, _, f in os.walk(str(tmp_path / 'none')) if f] == []
+
+
+@pytest.mark.fast
+def test_model_save(data, tmp_path):
+    '''test estimator is saved once, not rewritten if unchanged, and read
+    back on first access of loaded instance
+    '''
+    X, y = data
+    E = ML_model('clean_oht_DecisionTreeClassifier', path=str(tmp_path))
+    E.fit(X, y)
+    E.save()
+    pipe = str(tmp_path / 'DecisionTreeClassifier.pipe')
+    mtime = os.stat(pipe).st_mtime_ns
+    E.save()
+    assert os.stat(pipe).st_mtime_ns == mtime
+    loaded = ML_model.load(str(tmp_path))
+    assert '_estimator_ref' in loaded.__dict__
+    assert np.allclose(loaded.estimator.predict_proba(X), 
+                       E.estimator.predict_proba(X))
+
+
+@pytest.mark.fast
+def test_lazy_read_all(tmp_path):
+    '''test lazy read_all reads files on access, keeping cache_size objs
+    '''
+    folder = Objs_management(str(tmp_path))
+    for i in range(3):
+        folder.write({'n': i}, '{}.pkl'.format(i))
+    files = folder.read_all(suffix='.pkl', lazy=True, cache_size=1)
+    assert len(files) == 3 and len(files._cache) == 0
+    assert [files[k]['n'] for k in sorted(files)] == [0, 1, 2]
+    assert list(files._cache) == ['2.pkl']
+
+
+@pytest.mark.fast
+def test_read_all_threads(tmp_path):
+    '''test read_all with n_jobs keeps file order and collects failures
+    '''
+    folder = Objs_management(str(tmp_path))
+    for i in range(6):
+        folder.write(pd.DataFrame({'n': [i] * 3}), '{}.pkl'.format(i))
+    with open(os.path.join(str(tmp_path), 'bad.pkl'), 'wb') as f:
+        f.write(b'not a pickle')
+    serial, _ = folder.read_all(suffix='.pkl')
+    gen, obj = folder.read_all(suffix='.pkl', n_jobs=4)
+    assert [i['n'][0] for i in gen] == [i['n'][0] for i in serial]
+    assert getattr(obj, '5_pkl')['n'][0] == 5
+    assert [os.path.basename(i[0]) for i in folder.read_errors] == \
+        ['bad.pkl'] * 2
+
+
+@pytest.mark.fast
+def test_async_write(tmp_path):
+    '''test background writes take snapshot of objs, flush waits for them
+    and collects errors
+    '''
+    import matplotlib.pyplot as plt
+    folder = Objs_management(str(tmp_path), max_workers=2)
+    data = pd.DataFrame({'a': range(100)})
+    folder.write(data, 'data.csv')
+    data['a'] = 0
+    fig = plt.figure()
+    plt.plot([1, 2])
+    folder.write(fig, 'fig.png')
+    plt.close(fig)
+    # fails in writer thread & before queued
+    folder.write({'a': {1, 2}}, 'bad.json')
+    folder.write(lambda x: x, 'bad.pkl')
+    errors = folder.flush()
+    assert sorted(os.path.basename(i[0]) for i in errors) == \
+        ['bad.json', 'bad.pkl']
+    folder.close()
+    assert pd.read_csv(os.path.join(str(tmp_path), 'data.csv'))['a'] \
+        .tolist() == list(range(100))
+    assert os.path.getsize(os.path.join(str(tmp_path), 'fig.png')) > 0
+    assert sorted(i for i in os.listdir(str(tmp_path))
+                  if not i.startswith('.')) == ['data.csv', 'fig.png']
+
+
+@pytest.mark.fast
+def test_write_manifest(tmp_path):
+    '''test identical objs are not written again, and changes are recorded
+    in manifest
+    '''
+    assert Objs_management(str(tmp_path)).manifest_ is None
+    folder = Objs_management(str(tmp_path), manifest=True)
+    data = pd.DataFrame({'a': [1, 2], 'b': ['x', None]})
+    file = os.path.relpath(os.path.join(str(tmp_path), 'data.csv'))
+    folder.write(data, 'data.csv', config={'seed': 0})
+    folder.write(data, 'data.pkl')
+    mtime = os.stat(file).st_mtime_ns
+    folder.close()
+    # a new writer reads manifest back from file
+    folder = Objs_management(str(tmp_path), manifest=True)
+    folder.write(data.copy(), 'data.csv', config={'seed': 0})
+    assert folder.write_status[file] == 'unchanged'
+    assert os.stat(file).st_mtime_ns == mtime
+    folder.write(data.copy(), 'data.pkl')
+    assert set(folder.write_status.values()) == {'unchanged'}
+    folder.write(data.assign(a=[1, 3]), 'data.csv', config={'seed': 1})
+    assert folder.write_status[file] == 'changed'
+    assert folder.manifest_['data.csv']['config'] == {'seed': 1}
+    # write options are part of content hash
+    folder.write(data.assign(a=[1, 3]), 'data.csv', index=True)
+    assert folder.write_status[file] == 'changed'
+    assert pd.read_csv(file).shape == (2, 3)
+    assert sorted(os.listdir(str(tmp_path))) == \
+        ['.lw_manifest.json', 'data.csv', 'data.pkl']
+    assert sorted(folder.read_all()[1].__dict__) == ['data_csv', 'data_pkl']
+
+
+@pytest.mark.fast
+def test_failed_write(tmp_path):
+    '''test a failed write leaves previous file intact and no temporary 
+    file, in sync & async mode
+    '''
+    file = str(tmp_path / 'obj.pkl')
+    for max_workers in [None, 2]:
+        folder = Objs_management(str(tmp_path), max_workers=max_workers)
+        folder.write({'a': 1}, 'obj.pkl')
+        folder.flush()
+        # lambda can not be pickled
+        folder.write(lambda x: x, 'obj.pkl')
+        assert len(folder.close()) == 1
+        assert folder.read(file) == {'a': 1}
+        assert os.listdir(str(tmp_path)) == ['obj.pkl']
+
+
 @pytest.mark.pipe
 def test_fit_transform(data):
     '''test  fit/fit_transform for all pipelines generated by pipe_main 